@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# coding: UTF-8
+""" Замеры производительности клиента на локальном FakeMobilVestServer
+
+    python benchmarks/run.py --latency 0.005 --output results.jsonl
+
+Для каждого сценария выводится (и дописывается в --output) строка JSON
+с коммитом, версией Python, числом запросов в секунду к серверу,
+задержками p50/p99 одного запроса основного метода сценария (send.php,
+status.php, phone.php) и пиком памяти, поэтому результаты
+разных коммитов можно сравнивать между собой.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mobilvest import MobilVestApi, StatusTracker  # noqa: E402
+from mobilvest.fakeserver import FakeMobilVestServer  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+    import resource
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class RequestLatencies(object):
+    """ Наблюдатель: длительность каждого запроса к url, с ожиданием
+    rate_limiter и синхронизацией часов
+    """
+
+    def __init__(self, mapi, url):
+        self.url = url
+        self.values = []
+        mapi.add_observer(self)
+
+    def after_response(self, url, params, response, result, timings):
+        if url == self.url:
+            self.values.append(timings['total'])
+
+
+def single_send(mapi, server, size):
+    latencies = RequestLatencies(mapi, 'send.php')
+    for i in range(size):
+        mapi.send_sms('7902%07d' % i, 'Hello', 'web.web')
+    return latencies.values
+
+
+def bulk_send(mapi, server, size):
+    latencies = RequestLatencies(mapi, 'send.php')
+    mapi.send_bulk(('7902%07d' % i for i in range(size)), 'Hello',
+                   'web.web', concurrency=8)
+    return latencies.values
+
+
+def status_polling(mapi, server, size):
+    result = mapi.send_bulk(('7902%07d' % i for i in range(size)),
+                            'Hello', 'web.web', concurrency=8)
+    tracker = StatusTracker(mapi, min_interval=0)
+    tracker.register_send_result(result)
+    for page in server.requests:
+        server.requests[page] = 0
+    latencies = RequestLatencies(mapi, 'status.php')
+    for _ in tracker.results():
+        pass
+    return latencies.values
+
+
+def base_export(mapi, server, size):
+    server.base_size = size
+    latencies = RequestLatencies(mapi, 'phone.php')
+    for _ in mapi.iter_phones('1', prefetch=8, concurrency=4):
+        pass
+    return latencies.values
+
+
+SCENARIOS = {
+    'single_send': single_send,
+    'bulk_send': bulk_send,
+    'status_polling': status_polling,
+    'base_export': base_export,
+}
+
+
+def run(name, size, latency):
+    with FakeMobilVestServer(latency=latency) as server:
+        mapi = MobilVestApi(server.login, server.api_key)
+        mapi.BASE_URL = server.url
+        mapi.sync_clock()
+        server.requests['timestamp.php'] = 0
+        if tracemalloc is not None:
+            tracemalloc.start()
+        started = time.time()
+        latencies = SCENARIOS[name](mapi, server, size)
+        elapsed = time.time() - started
+        if tracemalloc is not None:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            # ru_maxrss в Linux - в килобайтах, пик за всё время процесса
+            peak_memory = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss * 1024
+        mapi.close()
+        requests_count = sum(server.requests.values())
+    return {
+        'scenario': name,
+        'size': size,
+        'server_latency': latency,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'elapsed': round(elapsed, 4),
+        'requests': requests_count,
+        'requests_per_second': round(requests_count / elapsed, 1),
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'peak_memory': peak_memory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('scenarios', nargs='*', default=sorted(SCENARIOS),
+                        help='one or more of: ' + ', '.join(sorted(SCENARIOS)))
+    parser.add_argument('--size', type=int, default=1000,
+                        help='messages / contacts per scenario')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='fake server latency per request, seconds')
+    parser.add_argument('--output', help='append results to this file')
+    args = parser.parse_args()
+
+    for name in args.scenarios:
+        result = run(name, args.size, args.latency)
+        line = json.dumps(result, sort_keys=True)
+        print(line)
+        if args.output:
+            with open(args.output, 'a') as f:
+                f.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
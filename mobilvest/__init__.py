@@ -1 +1,26 @@
-from mobilvest import MobilVestApi, ServerResponsedWithError, CantGetStatus
+# coding: UTF-8
+import sys
+from .mobilvest import MobilVestApi, ServerResponsedWithError, CantGetStatus
+from .mobilvest import BulkSendResult, PageFetchError, StatusResult
+from .transport import HttpTransport
+from .cache import ResponseCache
+from .stoplist import StopList
+from .operators import OperatorIndex
+from .stats import MonthStatsCache, StatsColumns
+from .records import SendResult, PhoneRecord, StatusEntry
+from .metrics import MetricsCollector
+from .ratelimit import RateLimiter, TokenBucket, ConcurrencyController
+from .resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy
+from .tracker import StatusTracker
+from .spool import Spool
+from .incoming import IncomingPoller
+from .ledger import Ledger
+from .basesync import BaseSync, BaseChanges
+from .pool import MobilVestPool, NoAvailableAccount
+from .segments import CostEstimator, InsufficientFunds, count_parts
+from .campaign import Campaign
+from .phones import normalize_phone, normalize_phones
+
+if sys.version_info >= (3, 5):
+    # asyncio-клиент доступен только в Python 3
+    from .aio import AsyncMobilVestApi, AioHttpTransport
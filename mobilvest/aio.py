@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+# coding: UTF-8
+""" asyncio-клиент API mobilvest.ru (только Python 3.5+)
+Подпись запросов, разбор ответов и ошибок - общие с MobilVestApi,
+асинхронными сделаны только сетевые вызовы.
+"""
+
+import asyncio
+import collections
+import time
+from .mobilvest import (MobilVestApi, BulkSendResult, CantGetStatus,
+                        PageFetchError, ServerResponsedWithError,
+                        StatusResult, _add_timing)
+from .records import SendResult
+from .stats import StatsColumns, months_between
+from .utils import chunked, unique
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AioHttpTransport(object):
+    """ Неблокирующий HTTP-транспорт поверх aiohttp.ClientSession
+    limit - максимальное число одновременно открытых соединений
+    timeout - таймаут запроса по умолчанию, в секундах
+    Сессия создаётся при первом запросе, внутри работающего цикла событий.
+    """
+
+    def __init__(self, limit=100, timeout=30):
+        if aiohttp is None:
+            raise ImportError('AioHttpTransport requires aiohttp')
+        self.limit = limit
+        self.timeout = timeout
+        self.closed = False
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.limit)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def get(self, url, params=None, timeout=None):
+        """ GET-запрос, возвращает тело ответа (bytes) """
+        if self.closed:
+            raise RuntimeError('Transport is closed')
+        if timeout is None:
+            timeout = self.timeout
+        if params is not None:
+            params = {k: str(v) for k, v in params.items()}
+        async with self._get_session().get(
+                url, params=params,
+                timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            return await response.read()
+
+    async def close(self):
+        self.closed = True
+        if self._session is not None:
+            await self._session.close()
+
+
+class PhoneIterator(object):
+    """ Асинхронный итератор по номерам базы, см.
+    AsyncMobilVestApi.iter_phones (асинхронные генераторы появились
+    только в Python 3.6)
+    """
+
+    def __init__(self, api, base, prefetch, concurrency, start_page, pages,
+                 typed):
+        self.api = api
+        self.base = base
+        self.prefetch = prefetch
+        self.typed = typed
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._next_page = start_page
+        self._pages = pages
+        self._tasks = collections.deque()
+        self._items = collections.deque()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._items:
+            if self._pages is None:
+                bases = await self.api.get_base() or {}
+                if str(self.base) not in bases:
+                    raise ServerResponsedWithError(self.api.ERRORS[25])
+                self._pages = int(bases[str(self.base)]['pages'])
+            while (len(self._tasks) < self.prefetch and
+                   self._next_page <= self._pages):
+                self._tasks.append((self._next_page, asyncio.ensure_future(
+                    self._fetch(self._next_page))))
+                self._next_page += 1
+            if not self._tasks:
+                raise StopAsyncIteration
+            page, task = self._tasks.popleft()
+            try:
+                phones = await task
+            except Exception as e:
+                self.cancel()
+                raise PageFetchError(page, e)
+            if self.typed:
+                self._items.extend(phones or ())
+            else:
+                self._items.extend((phones or {}).items())
+        return self._items.popleft()
+
+    async def _fetch(self, page):
+        async with self._semaphore:
+            return await self.api.get_phone(self.base, page, self.typed)
+
+    def cancel(self):
+        """ Отмена загрузки страниц, если выгрузка прервана """
+        self._pages = 0
+        self._items.clear()
+        while self._tasks:
+            self._tasks.popleft()[1].cancel()
+
+
+class AsyncMobilVestApi(MobilVestApi):
+    """ Асинхронный вариант MobilVestApi
+    Все API-методы (get_balance, send_sms, get_status и т. д.)
+    возвращают корутины:
+
+        async with AsyncMobilVestApi(login, api_key) as mapi:
+            balance = await mapi.get_balance()
+
+    transport - объект с корутиной get(url, params, timeout) и
+    корутиной close(), по умолчанию AioHttpTransport
+    """
+
+    def __init__(self, login, api_key, transport=None, **kwargs):
+        super(AsyncMobilVestApi, self).__init__(
+            login, api_key, transport=transport or AioHttpTransport(),
+            **kwargs)
+        self._clock_sync_task = None
+
+    async def close(self):
+        await self.transport.close()
+
+    def __enter__(self):
+        raise TypeError('Use "async with" with AsyncMobilVestApi')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _get_server_timestamp(self):
+        return int(await self.transport.get(
+            self.BASE_URL + 'timestamp.php', None,
+            self._timeout('timestamp.php')))
+
+    async def sync_clock(self):
+        """ Синхронизация часов с сервером (см. MobilVestApi.sync_clock)
+        Одновременные вызовы ждут один и тот же запрос к timestamp.php
+        """
+        if self._clock_sync_task is None:
+            self._clock_sync_task = asyncio.ensure_future(self._sync_clock())
+        task = self._clock_sync_task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._clock_sync_task is task and task.done():
+                self._clock_sync_task = None
+
+    async def _sync_clock(self):
+        started = time.time()
+        server_timestamp = await self._get_server_timestamp()
+        finished = time.time()
+        self._clock_offset = server_timestamp - (started + finished) / 2.0
+        self._clock_synced_at = finished
+        return self._clock_offset
+
+    def _get_timestamp(self):
+        # свежесть часов проверяется в _request, до подписи запроса
+        return int(time.time() + self._clock_offset)
+
+    async def _call_api(self, url, params, convert=None):
+        if self.cache is not None:
+            found, result = self.cache.get(url, params)
+            if found:
+                return convert(result) if convert else result
+        timings = {}
+        started = time.time()
+        self._notify('before_request', url, params)
+        try:
+            response = await self._request(url, params, timings)
+            if self._is_clock_error(response):
+                await self.sync_clock()
+                response = await self._request(url, params, timings)
+            result = self._handle_result(url, params, response)
+        except Exception as e:
+            timings['total'] = time.time() - started
+            self._notify('on_error', url, params, e, timings)
+            raise
+        timings['total'] = time.time() - started
+        self._notify('after_response', url, params, response, result,
+                     timings)
+        return convert(result) if convert else result
+
+    async def _request(self, url, params, timings):
+        started = time.time()
+        if self._clock_is_stale():
+            await self.sync_clock()
+        started = _add_timing(timings, 'timestamp', started)
+        params = self._prepare_params(params)
+        started = _add_timing(timings, 'sign', started)
+        body = await self.transport.get(self.BASE_URL + url, params,
+                                        self._timeout(url))
+        started = _add_timing(timings, 'network', started)
+        response = self.json_loads(body)
+        _add_timing(timings, 'decode', started)
+        return response
+
+    async def send_sms(self, phone, text, sender, typed=False):
+        """ Отправка СМС (см. MobilVestApi.send_sms) """
+        allowed, stopped = self._split_stopped(phone)
+        if allowed:
+            response = await self._call_api(
+                'send.php', self._send_params(allowed, text, sender))
+            stopped = self._merge_stopped(response, stopped, phone)
+        elif self.normalize_phones:
+            stopped = self._merge_stopped({}, stopped, phone)
+        return SendResult.from_response(stopped) if typed else stopped
+
+    async def send_bulk(self, phones, text, sender, concurrency=4):
+        """ Массовая отправка СМС (см. MobilVestApi.send_bulk)
+        concurrency - сколько запросов выполнять одновременно
+        """
+        result = BulkSendResult()
+        chunks = chunked(self._drop_stopped(phones, result),
+                         self.MAX_PHONES_PER_SMS)
+
+        async def worker():
+            for chunk in chunks:
+                try:
+                    result.merge(await self.send_sms(chunk, text, sender))
+                except Exception as e:
+                    result.errors.append((chunk, e))
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return result
+
+    def iter_phones(self, base, prefetch=4, concurrency=2, start_page=1,
+                    pages=None, typed=False):
+        """ Асинхронный итератор по всем номерам базы (см.
+        MobilVestApi.iter_phones):
+
+            async for phone, record in mapi.iter_phones(base_id):
+                ...
+
+        Возвращает PhoneIterator; его метод cancel() отменяет загрузку
+        страниц, если перебор прерван раньше конца
+        """
+        return PhoneIterator(self, base, prefetch, concurrency, start_page,
+                             pages, typed)
+
+    async def resolve_operators(self, phones, concurrency=4):
+        """ Определение операторов для множества номеров (см.
+        MobilVestApi.resolve_operators)
+        concurrency - сколько запросов выполнять одновременно
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def resolve(phone):
+            try:
+                async with semaphore:
+                    response = await self.get_operator(phone)
+            except ServerResponsedWithError:
+                response = None
+            return phone, self._learn_operator(phone, response)
+
+        if self.normalize_phones:
+            phones = list(phones)
+        result, pending = self._known_operators(phones)
+        while pending:
+            keys, representatives = self._operator_ranges(pending)
+            result.update(await asyncio.gather(
+                *[resolve(phone) for phone in representatives.values()]))
+            pending = self._unresolved(pending, keys, representatives,
+                                       result)
+        return self._operators_by_raw(phones, result)
+
+    async def stats_range(self, start, end, concurrency=4):
+        """ Статистика за несколько месяцев (см.
+        MobilVestApi.stats_range)
+        concurrency - сколько месяцев запрашивать одновременно
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(month):
+            found, response = self.stats_cache.get(month)
+            if not found:
+                async with semaphore:
+                    response = await self.stat_by_month(month)
+                if self.stats_cache.is_closed(month):
+                    self.stats_cache.set(month, response)
+            return StatsColumns.from_response(response)
+
+        result = StatsColumns()
+        for columns in await asyncio.gather(
+                *[fetch(month) for month in months_between(start, end)]):
+            result.extend(columns)
+        return result
+
+    async def get_status_many(self, ids, concurrency=4):
+        """ Статусы любого количества СМС (см.
+        MobilVestApi.get_status_many)
+        concurrency - сколько запросов выполнять одновременно
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(chunk):
+            statuses, not_ready, errors = {}, [], []
+            parts = [chunk]
+            while parts:
+                part = parts.pop()
+                try:
+                    async with semaphore:
+                        response = await self.get_status(part) or {}
+                except CantGetStatus:
+                    if len(part) == 1:
+                        not_ready.extend(part)
+                    else:
+                        middle = len(part) // 2
+                        parts.append(part[middle:])
+                        parts.append(part[:middle])
+                    continue
+                except Exception as e:
+                    errors.append((part, e))
+                    continue
+                statuses.update(response)
+                not_ready.extend(i for i in part if str(i) not in response)
+            return statuses, not_ready, errors
+
+        result = StatusResult()
+        for statuses, not_ready, errors in await asyncio.gather(
+                *[fetch(chunk)
+                  for chunk in self._state_chunks(unique(ids))]):
+            result.update(statuses)
+            result.not_ready.extend(not_ready)
+            result.errors.extend(errors)
+        return result
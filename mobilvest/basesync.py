@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import json
+import time
+from hashlib import md5
+from .mobilvest import PageFetchError, ServerResponsedWithError
+from .records import PhoneRecord
+from .storage import SqliteStorage
+from .utils import parallel_map
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bases (
+    base TEXT PRIMARY KEY,
+    name TEXT,
+    count INTEGER,
+    pages INTEGER,
+    synced_at REAL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pages (
+    base TEXT,
+    page INTEGER,
+    hash TEXT,
+    PRIMARY KEY (base, page)
+) WITHOUT ROWID;
+-- record - JSON-массив значений полей FIELDS, без имён полей
+CREATE TABLE IF NOT EXISTS contacts (
+    base TEXT,
+    phone TEXT,
+    page INTEGER,
+    record TEXT,
+    PRIMARY KEY (base, phone)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS contacts_page ON contacts (base, page);
+
+-- изменившиеся страницы текущей синхронизации и их номера
+CREATE TEMP TABLE IF NOT EXISTS changed (
+    page INTEGER PRIMARY KEY,
+    hash TEXT
+);
+CREATE TEMP TABLE IF NOT EXISTS fetched (
+    phone TEXT PRIMARY KEY,
+    page INTEGER,
+    record TEXT
+);
+"""
+
+FIELDS = PhoneRecord.__slots__[1:]
+
+
+def _encode(record):
+    return json.dumps([record.get(name, '') for name in FIELDS],
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+def _decode(record):
+    return dict(zip(FIELDS, json.loads(record)))
+
+
+def _page_hash(phones):
+    data = json.dumps(phones, sort_keys=True, separators=(',', ':'))
+    return md5(data.encode('utf-8')).hexdigest()
+
+
+class BaseChanges(object):
+    """ Изменения базы номеров с прошлой синхронизации
+    added, removed - списки пар (номер, данные номера)
+    modified - список троек (номер, старые данные, новые данные)
+    skipped - база не загружалась: count и pages не изменились
+    pages_fetched, pages_changed - сколько страниц загружено и сколько
+    из них отличается от сохранённых
+    """
+
+    def __init__(self, base, skipped=False):
+        self.base = base
+        self.skipped = skipped
+        self.added = []
+        self.removed = []
+        self.modified = []
+        self.pages_fetched = 0
+        self.pages_changed = 0
+
+    @property
+    def changed(self):
+        return bool(self.added or self.removed or self.modified)
+
+    def __repr__(self):
+        return ('BaseChanges({!r}, added={}, removed={}, modified={}, '
+                'skipped={})'.format(self.base, len(self.added),
+                                     len(self.removed), len(self.modified),
+                                     self.skipped))
+
+
+class BaseSync(SqliteStorage):
+    """ Локальная копия баз номеров в файле SQLite
+    sync() загружает только базы, у которых по get_base изменились
+    count или pages. Страницы изменившейся базы загружаются параллельно,
+    хэш каждой страницы сравнивается с сохранённым, и с локальной копией
+    сравниваются только номера изменившихся страниц: поэтому номера,
+    сдвинувшиеся на соседнюю страницу, не считаются удалёнными
+    и добавленными заново.
+    Правка данных номера без изменения count и pages так не видна -
+    для полной сверки страниц есть параметр force.
+    Изменения базы записываются одной транзакцией после загрузки всех
+    страниц (в памяти остаются только изменившиеся страницы): при ошибке
+    загрузки страницы (PageFetchError) локальная копия остаётся прежней.
+    concurrency - сколько страниц загружать одновременно
+    prefetch - сколько загруженных страниц держать в памяти
+    """
+    # ошибки phone.php для страницы без номеров (пустой ответ, ошибку 19,
+    # get_phone возвращает как None)
+    EMPTY_ERRORS = (26,)
+    SCHEMA = SCHEMA
+
+    def __init__(self, api, path, concurrency=4, prefetch=8):
+        super(BaseSync, self).__init__(path)
+        self.api = api
+        self.concurrency = concurrency
+        self.prefetch = prefetch
+
+    def sync(self, bases=None, force=False):
+        """ Синхронизация баз
+        bases - ID баз (по умолчанию - все базы аккаунта; базы, которых
+        больше нет на сервере, удаляются, а их номера попадают в removed)
+        force - загрузить базы, даже если count и pages не изменились
+        Возвращает словарь {ID базы: BaseChanges}
+        """
+        info = self.api.get_base() or {}
+        result = {}
+        if bases is None:
+            bases = sorted(info)
+            for base in self.bases():
+                if base not in info:
+                    result[base] = self._drop(base)
+        for base in map(str, bases):
+            if base not in info:
+                raise ServerResponsedWithError(
+                    "Base {} not found".format(base), 25)
+            result[base] = self.sync_base(base, info[base], force)
+        return result
+
+    def sync_base(self, base, meta, force=False):
+        """ Синхронизация одной базы
+        meta - данные базы из ответа get_base (count, pages, name)
+        """
+        base = str(base)
+        count = int(meta.get('count') or 0)
+        pages = int(meta.get('pages') or 0)
+        with self._lock:
+            known = self._conn.execute(
+                'SELECT count, pages FROM bases WHERE base = ?',
+                (base,)).fetchone()
+            hashes = dict(self._conn.execute(
+                'SELECT page, hash FROM pages WHERE base = ?', (base,)))
+        if not force and known == (count, pages):
+            return BaseChanges(base, skipped=True)
+        changes = BaseChanges(base)
+
+        def fetch(page):
+            try:
+                return page, self.api.get_phone(base, page), None
+            except ServerResponsedWithError as e:
+                if e.code in self.EMPTY_ERRORS:
+                    return page, {}, None
+                return page, None, e
+            except Exception as e:
+                return page, None, e
+
+        # загрузка - без блокировки: другие базы и contacts() не ждут сети
+        staged = []
+        for page, phones, error in parallel_map(
+                fetch, range(1, pages + 1), self.concurrency,
+                window=self.prefetch):
+            if error is not None:
+                raise PageFetchError(page, error)
+            phones = phones or {}
+            changes.pages_fetched += 1
+            digest = _page_hash(phones)
+            if hashes.get(page) == digest:
+                continue
+            changes.pages_changed += 1
+            staged.append((page, digest, [
+                (str(phone), page, _encode(record))
+                for phone, record in phones.items()]))
+
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM changed')
+            conn.execute('DELETE FROM fetched')
+            for page, digest, rows in staged:
+                conn.execute('INSERT INTO changed VALUES (?, ?)',
+                             (page, digest))
+                conn.executemany(
+                    'INSERT OR REPLACE INTO fetched VALUES (?, ?, ?)', rows)
+            # страницы за концом уменьшившейся базы
+            conn.execute(
+                'INSERT INTO changed SELECT page, NULL FROM pages '
+                'WHERE base = ? AND page > ?', (base, pages))
+            self._diff(base, changes)
+            self._apply(base, meta, count, pages)
+        return changes
+
+    def _diff(self, base, changes):
+        conn = self._conn
+        changes.added = [
+            (phone, _decode(record)) for phone, record in conn.execute(
+                'SELECT f.phone, f.record FROM fetched f WHERE NOT EXISTS '
+                '(SELECT 1 FROM contacts c WHERE c.base = ? '
+                'AND c.phone = f.phone) ORDER BY f.phone', (base,))]
+        changes.modified = [
+            (phone, _decode(old), _decode(new))
+            for phone, old, new in conn.execute(
+                'SELECT f.phone, c.record, f.record FROM fetched f '
+                'JOIN contacts c ON c.base = ? AND c.phone = f.phone '
+                'WHERE c.record != f.record ORDER BY f.phone', (base,))]
+        changes.removed = [
+            (phone, _decode(record)) for phone, record in conn.execute(
+                'SELECT c.phone, c.record FROM contacts c '
+                'WHERE c.base = ? AND c.page IN (SELECT page FROM changed) '
+                'AND NOT EXISTS (SELECT 1 FROM fetched f '
+                'WHERE f.phone = c.phone) ORDER BY c.phone', (base,))]
+
+    def _apply(self, base, meta, count, pages):
+        conn = self._conn
+        conn.execute(
+            'DELETE FROM contacts WHERE base = ? AND page IN '
+            '(SELECT page FROM changed) AND phone NOT IN '
+            '(SELECT phone FROM fetched)', (base,))
+        conn.execute(
+            'INSERT OR REPLACE INTO contacts '
+            'SELECT ?, phone, page, record FROM fetched', (base,))
+        conn.execute('DELETE FROM pages WHERE base = ? AND page > ?',
+                     (base, pages))
+        conn.execute(
+            'INSERT OR REPLACE INTO pages SELECT ?, page, hash '
+            'FROM changed WHERE hash IS NOT NULL', (base,))
+        conn.execute(
+            'INSERT OR REPLACE INTO bases VALUES (?, ?, ?, ?, ?)',
+            (base, meta.get('name'), count, pages, time.time()))
+        conn.execute('DELETE FROM changed')
+        conn.execute('DELETE FROM fetched')
+
+    def _drop(self, base):
+        """ Удаление базы, которой больше нет на сервере """
+        changes = BaseChanges(base)
+        with self._transaction() as conn:
+            changes.removed = [
+                (phone, _decode(record)) for phone, record in conn.execute(
+                    'SELECT phone, record FROM contacts WHERE base = ? '
+                    'ORDER BY phone', (base,))]
+            for table in ('contacts', 'pages', 'bases'):
+                conn.execute('DELETE FROM {} WHERE base = ?'.format(table),
+                             (base,))
+        return changes
+
+    def bases(self):
+        """ ID сохранённых баз """
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                'SELECT base FROM bases ORDER BY base')]
+
+    def contacts(self, base, batch=1000):
+        """ Итератор по сохранённым номерам базы: пары (номер, данные
+        номера) в порядке страниц; из файла читается по batch номеров
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                'SELECT phone, record FROM contacts WHERE base = ? '
+                'ORDER BY page, phone', (str(base),))
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch)
+            if not rows:
+                return
+            for phone, record in rows:
+                yield phone, _decode(record)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache(object):
+    """ Кэш ответов редко меняющихся API-функций (TTL + LRU)
+    ttl - словарь {адрес php страницы: время жизни в секундах};
+    ответы остальных страниц не кэшируются
+    maxsize - максимальное количество хранимых ответов
+    negative_ttl - время жизни пустых ответов (ошибка 19, None);
+    по умолчанию пустые ответы не кэшируются
+    Успешный вызов изменяющей функции (см. INVALIDATES) сбрасывает
+    кэш зависящих от неё страниц.
+    """
+    DEFAULT_TTL = {
+        'senders.php': 300,
+        'template.php': 300,
+        'base.php': 60,
+        'operator.php': 24 * 3600,
+        'find_on_stop.php': 300,
+    }
+    INVALIDATES = {
+        'add_template.php': ('template.php',),
+        'add2stop.php': ('find_on_stop.php',),
+    }
+
+    def __init__(self, ttl=None, maxsize=1024, negative_ttl=None,
+                 clock=time.time):
+        self.ttl = dict(self.DEFAULT_TTL if ttl is None else ttl)
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        # ключ -> (время устаревания, ответ)
+        self._data = OrderedDict()
+
+    def _key(self, url, params):
+        return url, tuple(sorted(params.items()))
+
+    def get(self, url, params):
+        """ Поиск ответа в кэше, возвращает пару (найден ли, ответ) """
+        if url not in self.ttl:
+            return False, None
+        key = self._key(url, params)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= self._clock():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return False, None
+            # перемещение в конец - недавно использованный
+            del self._data[key]
+            self._data[key] = item
+            self.hits += 1
+        return True, copy.deepcopy(item[1])
+
+    def update(self, url, params, response):
+        """ Учёт успешного ответа: сохранение и/или сброс кэша """
+        for dependent in self.INVALIDATES.get(url, ()):
+            self.invalidate(dependent)
+        if url not in self.ttl:
+            return
+        ttl = self.ttl[url] if response is not None else self.negative_ttl
+        if not ttl:
+            return
+        key = self._key(url, params)
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (self._clock() + ttl, copy.deepcopy(response))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, url=None):
+        """ Сброс кэша одной страницы (или всего кэша, если url=None) """
+        with self._lock:
+            if url is None:
+                self._data.clear()
+                return
+            for key in [k for k in self._data if k[0] == url]:
+                del self._data[key]
+
+    def stats(self):
+        """ Статистика попаданий: {'hits', 'misses', 'size'} """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._data)}
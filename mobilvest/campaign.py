@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+from collections import OrderedDict
+from string import Formatter
+from .mobilvest import BulkSendResult, MobilVestApi, ServerResponsedWithError
+from .utils import parallel_map
+
+
+class _Fields(dict):
+    """ Поля контакта для шаблона: отсутствующие - пустая строка """
+
+    def __missing__(self, key):
+        return ''
+
+
+class Campaign(object):
+    """ Персонализированная рассылка по шаблону
+    template - текст с полями контакта в фигурных скобках:
+    'Здравствуйте, {name}!' (поля как в ответе get_phone, а также
+    phone; отсутствующие поля подставляются пустой строкой)
+    sender - имя отправителя
+    Номера с одинаковым итоговым текстом собираются в пакеты по
+    MAX_PHONES_PER_SMS и отправляются одним вызовом send_sms, поэтому
+    неперсонализированные части рассылки занимают мало запросов.
+    В памяти одновременно не больше max_pending номеров: при
+    переполнении отправляется самый старый неполный пакет.
+    """
+
+    def __init__(self, api, template, sender, max_pending=10000):
+        self.api = api
+        self.template = template
+        self.sender = sender
+        self.max_pending = max_pending
+        self._formatter = Formatter()
+
+    @classmethod
+    def from_template(cls, api, name, sender, **kwargs):
+        """ Рассылка по шаблону name из get_template """
+        templates = api.get_template() or {}
+        if name not in templates:
+            raise ServerResponsedWithError(
+                "Template {} not found".format(name))
+        return cls(api, templates[name]['template'], sender, **kwargs)
+
+    def render(self, phone, record):
+        """ Текст СМС для контакта
+        record - словарь полей get_phone или PhoneRecord
+        """
+        if hasattr(record, 'as_dict'):
+            record = record.as_dict()
+        fields = _Fields(record or {})
+        fields.setdefault('phone', phone)
+        return self._formatter.vformat(self.template, (), fields)
+
+    def batches(self, contacts):
+        """ Пакеты для отправки: пары (текст, список номеров)
+        contacts - итератор пар (номер, данные), как у iter_phones,
+        или записей PhoneRecord
+        """
+        limit = MobilVestApi.MAX_PHONES_PER_SMS
+        groups = OrderedDict()
+        pending = 0
+        for contact in contacts:
+            if hasattr(contact, 'as_dict'):
+                phone, record = contact.phone, contact
+            else:
+                phone, record = contact
+            text = self.render(phone, record)
+            group = groups.get(text)
+            if group is None:
+                group = groups[text] = []
+            elif phone in group:
+                continue
+            group.append(phone)
+            pending += 1
+            if len(group) >= limit:
+                del groups[text]
+                pending -= len(group)
+                yield text, group
+            elif pending > self.max_pending:
+                text, group = groups.popitem(last=False)
+                pending -= len(group)
+                yield text, group
+        for text, group in groups.items():
+            yield text, group
+
+    def send(self, contacts, concurrency=4):
+        """ Отправка рассылки, возвращает BulkSendResult
+        Ошибка одного пакета не прерывает рассылку, а попадает
+        в errors результата.
+        """
+        api = self.api
+        stop_list = getattr(api, 'stop_list', None)
+        result = BulkSendResult()
+
+        def allowed(contacts):
+            # номера из стоп-листа отбрасываются до группировки,
+            # чтобы пакеты оставались полными
+            for contact in contacts:
+                phone = getattr(contact, 'phone', None)
+                if phone is None:
+                    phone = contact[0]
+                if stop_list is not None and phone in stop_list:
+                    result[str(phone)] = {'error': '13'}
+                else:
+                    yield contact
+
+        def send_batch(batch):
+            text, phones = batch
+            try:
+                return phones, api.send_sms(phones, text, self.sender), None
+            except Exception as e:
+                return phones, None, e
+
+        for phones, response, error in parallel_map(
+                send_batch, self.batches(allowed(contacts)), concurrency):
+            if error is not None:
+                result.errors.append((phones, error))
+            else:
+                result.merge(response)
+        return result
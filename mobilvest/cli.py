@@ -0,0 +1,606 @@
+#!/usr/bin/env python
+# coding: UTF-8
+""" Консольная команда mobilvest
+
+    mobilvest send --sender web --text 'Здравствуйте, {name}!' \\
+        --input contacts.csv --output sent.csv --concurrency 8 --rate 20
+    mobilvest status --input sent.csv --output statuses.jsonl
+    mobilvest export-base --base 125452 --output base.csv --resume
+    mobilvest incoming --date-from 2014-10-01 --date-to 2014-10-31
+    mobilvest stats --month-from 2014-01 --month-to 2014-12
+
+Входные данные (CSV с заголовком или JSONL) читаются потоком из файла
+или stdin, результаты пишутся по мере получения, блоками, с flush после
+каждого блока, поэтому память не зависит от объёма задания. Формат
+определяется по расширению файла (.jsonl, .json - JSONL, иначе CSV)
+или задаётся --format.
+Выходной файл служит контрольной точкой: с --resume уже записанные
+строки не обрабатываются повторно, а неполная последняя запись
+(обрыв посреди записи) отбрасывается. В send и status выход содержит
+по строке на каждую входную строку в том же порядке, поэтому
+продолжение пропускает столько входных строк, сколько записано.
+В export-base и incoming последняя страница (день) выгружается заново.
+Данные доступа - --login и --api-key или переменные окружения
+MOBILVEST_LOGIN и MOBILVEST_API_KEY.
+"""
+
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import sys
+import time
+from itertools import islice
+import requests
+from .campaign import Campaign
+from .incoming import _id_order
+from .mobilvest import MobilVestApi, PageFetchError, ServerResponsedWithError
+from .ratelimit import RateLimiter
+from .records import PhoneRecord, SendResult
+from .resilience import CircuitOpenError, ResiliencePolicy
+from .transport import HttpTransport
+from .utils import chunked, parallel_map
+from .utils import json_loads
+
+PY3 = sys.version_info[0] >= 3
+
+SEND_COLUMNS = SendResult.__slots__
+STATUS_COLUMNS = ('id_sms', 'status', 'error')
+BASE_COLUMNS = ('page',) + PhoneRecord.__slots__
+INCOMING_COLUMNS = ('day', 'id', 'date', 'sender', 'prefix', 'text')
+STATS_COLUMNS = ('date', 'status', 'cost', 'parts')
+
+
+class CliError(Exception):
+    """ Ошибка задания: выводится без трассировки, код возврата 1 """
+
+
+def _text(value):
+    """ Значение ячейки в виде текста (unicode в Python 2) """
+    if value is None:
+        return u''
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    if PY3:
+        return str(value)
+    return unicode(value)  # noqa: F821
+
+
+def _binary(stream):
+    return getattr(stream, 'buffer', stream)
+
+
+def _format(path, explicit):
+    if explicit:
+        return explicit
+    if path and os.path.splitext(path)[1].lower() in ('.jsonl', '.json'):
+        return 'jsonl'
+    return 'csv'
+
+
+def _csv_rows(lines):
+    """ Разбор CSV из итератора строк в байтах (все версии Python) """
+    if PY3:
+        lines = (line.decode('utf-8') for line in lines)
+    return csv.reader(lines)
+
+
+def read_rows(stream, fmt, column):
+    """ Итератор по входным строкам: словари полей
+    stream - бинарный поток
+    column - обязательное поле (номер, ID СМС); в JSONL строка может
+    быть и просто значением этого поля
+    """
+    if fmt == 'jsonl':
+        for line in stream:
+            if not line.strip():
+                continue
+            row = json_loads(line)
+            if not isinstance(row, dict):
+                row = {column: row}
+            yield row
+        return
+    if PY3:
+        reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig',
+                                             newline=''))
+    else:
+        reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    if column not in header:
+        raise CliError('Column {!r} not found in input header'.format(
+            column))
+    for values in reader:
+        if values:
+            yield dict(zip(header, values))
+
+
+class Output(object):
+    """ Выходной файл (или stdout), дописываемый блоками
+    Каждый блок кодируется целиком и записывается одним write с flush,
+    поэтому после аварийного завершения в файле остаются целые блоки
+    и, возможно, одна неполная запись, которую отбрасывает resume().
+    """
+
+    def __init__(self, path, fmt, columns):
+        self.path = path
+        self.fmt = fmt
+        self.columns = columns
+        self._append = False
+        self._file = None
+
+    def resume(self, group=None):
+        """ Подготовка к продолжению по уже записанному файлу
+        group - поле, по которому записи идут группами (страница, день):
+        последняя группа удаляется, так как могла записаться не целиком
+        Возвращает (количество оставшихся записей, значение group
+        удалённой группы или None)
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return 0, None
+        count, kept, last = 0, 0, None
+        group_count, group_start = 0, 0
+        header = None
+        with io.open(self.path, 'rb') as f:
+            for offset, end, record in self._records(f):
+                if self.fmt == 'csv' and header is None:
+                    header = next(_csv_rows([record]))
+                    kept = end
+                    group_start = end
+                    continue
+                count += 1
+                kept = end
+                if group is None:
+                    continue
+                value = self._field(record, header, group)
+                if value != last:
+                    last = value
+                    group_start = offset
+                    group_count = count - 1
+        if group is not None and last is not None:
+            kept, count = group_start, group_count
+        with io.open(self.path, 'r+b') as f:
+            f.truncate(kept)
+        self._append = True
+        return count, last
+
+    def _records(self, f):
+        """ Полные записи файла: (начало, конец, запись в байтах)
+        Запись CSV может занимать несколько строк: она закончена, когда
+        строка закончена и число кавычек в записи чётно.
+        """
+        start, end, pending, quotes = 0, 0, [], 0
+        for line in f:
+            pending.append(line)
+            end += len(line)
+            if self.fmt == 'csv':
+                quotes += line.count(b'"')
+            if line.endswith(b'\n') and quotes % 2 == 0:
+                yield start, end, b''.join(pending)
+                start, pending, quotes = end, [], 0
+
+    def _field(self, record, header, name):
+        if self.fmt == 'jsonl':
+            return _text(json_loads(record).get(name))
+        values = next(_csv_rows([record]))
+        return _text(dict(zip(header, values)).get(name))
+
+    def open(self):
+        if self.path is None:
+            self._file = _binary(sys.stdout)
+            empty = True
+        else:
+            self._file = io.open(self.path, 'ab' if self._append else 'wb')
+            empty = self._file.tell() == 0
+        if self.fmt == 'csv' and empty:
+            self._file.write(self._encode_csv([self.columns]))
+            self._file.flush()
+        return self
+
+    def close(self):
+        if self._file is not None and self.path is not None:
+            self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _encode_csv(self, rows):
+        if PY3:
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator='\n').writerows(rows)
+            return buf.getvalue().encode('utf-8')
+        buf = io.BytesIO()
+        csv.writer(buf, lineterminator='\n').writerows(
+            [[v.encode('utf-8') for v in row] for row in rows])
+        return buf.getvalue()
+
+    def write(self, rows):
+        """ Запись блока строк (словарей с полями columns) """
+        if not rows:
+            return
+        values = [[_text(row.get(c)) for c in self.columns] for row in rows]
+        if self.fmt == 'csv':
+            data = self._encode_csv(values)
+        else:
+            data = u''.join(
+                json.dumps(dict(zip(self.columns, row)),
+                           ensure_ascii=False) + u'\n'
+                for row in values).encode('utf-8')
+        self._file.write(data)
+        self._file.flush()
+
+
+class Progress(object):
+    """ Ход работы в stderr: обработано строк и скорость """
+
+    def __init__(self, enabled, stream=None, interval=0.5, clock=time.time):
+        self.enabled = enabled
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.done = 0
+        self.skipped = 0
+        self._clock = clock
+        self._started = clock()
+        self._shown = self._started
+
+    def add(self, count):
+        self.done += count
+        now = self._clock()
+        if self.enabled and now - self._shown >= self.interval:
+            self._shown = now
+            self._show(now, '\r')
+
+    def _show(self, now, end):
+        elapsed = max(now - self._started, 1e-9)
+        line = '{} rows, {:.0f} rows/s, {:.1f} s'.format(
+            self.done, self.done / elapsed, elapsed)
+        if self.skipped:
+            line += ' ({} done before resume)'.format(self.skipped)
+        self.stream.write(line + end)
+        self.stream.flush()
+
+    def finish(self):
+        if self.enabled:
+            self._show(self._clock(), '\n')
+
+
+def _open_input(path):
+    if path in (None, '-'):
+        return _binary(sys.stdin)
+    return io.open(path, 'rb')
+
+
+def _date(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d')
+
+
+def _month(value):
+    return datetime.datetime.strptime(value, '%Y-%m')
+
+
+def _error(exception):
+    """ Код ошибки строки для исключения при запросе: код сервера или
+    unknown - неизвестно, дошёл ли запрос (как в Spool)
+    """
+    code = getattr(exception, 'code', None)
+    return 'unknown' if code is None else str(code)
+
+
+def _missing(value):
+    """ Пустое или отсутствующее обязательное поле строки """
+    return not str(value or '').strip()
+
+
+def _make_api(args):
+    login = args.login or os.environ.get('MOBILVEST_LOGIN')
+    api_key = args.api_key or os.environ.get('MOBILVEST_API_KEY')
+    if not login or not api_key:
+        raise CliError('Pass --login and --api-key or set '
+                       'MOBILVEST_LOGIN and MOBILVEST_API_KEY')
+    rate_limiter = None
+    if args.rate:
+        rate_limiter = RateLimiter(default_rate=args.rate)
+    api = MobilVestApi(
+        login, api_key,
+        transport=HttpTransport(pool_size=max(10, args.concurrency)),
+        rate_limiter=rate_limiter,
+        normalize_phones=getattr(args, 'normalize', False),
+        resilience=ResiliencePolicy(retries=args.retries,
+                                    default_timeout=args.timeout))
+    if args.base_url:
+        api.BASE_URL = args.base_url
+    return api
+
+
+def _stream(args, output, column, process, block_size):
+    """ Обработка входных строк блоками в параллельных потоках
+    process(block) возвращает строки выхода блока - по одной на
+    входную строку; блоки записываются в исходном порядке
+    """
+    done = output.resume()[0] if args.resume else 0
+    progress = Progress(args.progress)
+    progress.skipped = done
+    source = _open_input(args.input)
+    try:
+        rows = islice(read_rows(source, _format(args.input, args.format),
+                                column), done, None)
+        with output:
+            for result in parallel_map(process, chunked(rows, block_size),
+                                       args.concurrency):
+                output.write(result)
+                progress.add(len(result))
+    finally:
+        if source is not _binary(sys.stdin):
+            source.close()
+        progress.finish()
+
+
+def cmd_send(args, api, output):
+    if args.text is None and args.text_column is None:
+        raise CliError('Pass --text or --text-column')
+    column = args.phone_column
+    campaign = Campaign(api, args.text, args.sender)
+
+    def text_of(row):
+        if args.text is None:
+            return row.get(args.text_column) or ''
+        return campaign.render(row[column], row)
+
+    def send(block):
+        numbers = [row.get(column) for row in block]
+        # строка без номера не отправляется, а получает ошибку no_phone
+        texts = [None if _missing(phone) else text_of(row)
+                 for row, phone in zip(block, numbers)]
+        # в одном запросе - номера с одинаковым текстом, без повторов
+        groups = {}
+        for phone, text in zip(numbers, texts):
+            if text is None:
+                continue
+            phones = groups.setdefault(text, [])
+            if phone not in phones:
+                phones.append(phone)
+        responses, errors = {}, {}
+        for text, phones in groups.items():
+            try:
+                response = api.send_sms(phones, text, args.sender) or {}
+            except Exception as e:
+                for phone in phones:
+                    errors[(text, phone)] = _error(e)
+                continue
+            for phone in phones:
+                responses[(text, phone)] = response.get(str(phone))
+        result = []
+        for phone, text in zip(numbers, texts):
+            if text is None:
+                result.append({'phone': phone, 'error': 'no_phone'})
+                continue
+            key = (text, phone)
+            item = responses.get(key)
+            if isinstance(item, dict):
+                result.append(dict(item, phone=phone))
+            else:
+                result.append({'phone': phone,
+                               'error': errors.get(key, 'unknown')})
+        return result
+
+    _stream(args, output, column, send, MobilVestApi.MAX_PHONES_PER_SMS)
+
+
+def cmd_status(args, api, output):
+    column = args.id_column
+
+    def status(block):
+        ids = [row.get(column) for row in block]
+        # пустой id_sms - строка неудачной отправки из вывода send
+        errors = dict((id_sms, 'no_id') for id_sms in ids
+                      if _missing(id_sms))
+        # блоки уже выполняются параллельно
+        statuses = api.get_status_many(
+            [id_sms for id_sms in ids if id_sms not in errors],
+            concurrency=1)
+        errors.update((id_sms, '18') for id_sms in statuses.not_ready)
+        for part, error in statuses.errors:
+            errors.update((id_sms, _error(error)) for id_sms in part)
+        return [{'id_sms': id_sms, 'status': statuses.get(str(id_sms)),
+                 'error': errors.get(id_sms)} for id_sms in ids]
+
+    _stream(args, output, column, status, args.chunk)
+
+
+def cmd_export_base(args, api, output):
+    start_page = args.start_page
+    progress = Progress(args.progress)
+    if args.resume:
+        progress.skipped, page = output.resume(group='page')
+        if page:
+            start_page = int(page)
+    bases = api.get_base() or {}
+    if str(args.base) not in bases:
+        raise CliError('Base {} not found'.format(args.base))
+    pages = int(bases[str(args.base)]['pages'])
+
+    def fetch(page):
+        try:
+            return page, api.get_phone(args.base, page), None
+        except Exception as e:
+            return page, None, e
+
+    try:
+        with output:
+            for page, phones, error in parallel_map(
+                    fetch, range(start_page, pages + 1), args.concurrency):
+                if error is not None:
+                    raise PageFetchError(page, error)
+                rows = [dict(record, page=page, phone=phone)
+                        for phone, record in sorted((phones or {}).items())]
+                output.write(rows)
+                progress.add(len(rows))
+    finally:
+        progress.finish()
+
+
+def cmd_incoming(args, api, output):
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    start = args.date_from or today
+    end = args.date_to or start
+    progress = Progress(args.progress)
+    if args.resume:
+        progress.skipped, day = output.resume(group='day')
+        if day:
+            start = _date(day)
+    days = [start + datetime.timedelta(days=i)
+            for i in range((end - start).days + 1)]
+
+    def fetch(date):
+        return date, api.get_incoming(date) or {}
+
+    try:
+        with output:
+            for date, messages in parallel_map(fetch, days,
+                                               args.concurrency):
+                items = sorted(messages.items(), key=lambda item: (
+                    item[1].get('date', ''), _id_order(item[0])))
+                rows = [dict(message, day=date.strftime('%Y-%m-%d'),
+                             id=sms_id) for sms_id, message in items]
+                output.write(rows)
+                progress.add(len(rows))
+    finally:
+        progress.finish()
+
+
+def cmd_stats(args, api, output):
+    end = args.month_to or args.month_from
+    columns = api.stats_range(args.month_from, end, args.concurrency)
+    with output:
+        output.write([{'date': date.strftime('%Y-%m-%d'), 'status': status,
+                       'cost': '{:.3f}'.format(cost), 'parts': parts}
+                      for date, status, cost, parts in columns.rows()])
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    group = common.add_argument_group('connection')
+    group.add_argument('--login', help='account login '
+                       '(default: $MOBILVEST_LOGIN)')
+    group.add_argument('--api-key', help='API key '
+                       '(default: $MOBILVEST_API_KEY)')
+    group.add_argument('--base-url', help='API address '
+                       '(default: {})'.format(MobilVestApi.BASE_URL))
+    group.add_argument('-c', '--concurrency', type=int, default=4,
+                       help='requests in flight (default: 4)')
+    group.add_argument('--rate', type=float,
+                       help='requests per second limit')
+    group.add_argument('--retries', type=int, default=2,
+                       help='retries of failed reads (default: 2); sends '
+                       'are retried only if the connection was not made')
+    group.add_argument('--timeout', type=float,
+                       help='request timeout in seconds (default: 30)')
+    group = common.add_argument_group('input and output')
+    group.add_argument('-o', '--output',
+                       help='output file (default: stdout)')
+    group.add_argument('--format', choices=('csv', 'jsonl'),
+                       help='input and output format (default: by file '
+                       'extension, csv)')
+    group.add_argument('--resume', action='store_true',
+                       help='continue after the rows already in --output')
+    group.add_argument('--progress', dest='progress', action='store_true',
+                       default=None, help='show progress on stderr '
+                       '(default: when stderr is a terminal)')
+    group.add_argument('--no-progress', dest='progress',
+                       action='store_false')
+
+    streamed = argparse.ArgumentParser(add_help=False)
+    streamed.add_argument('-i', '--input', default='-',
+                          help='input file (default: stdin)')
+
+    parser = argparse.ArgumentParser(
+        prog='mobilvest', description='Bulk jobs for the mobilvest.ru API')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    send = commands.add_parser(
+        'send', parents=[common, streamed],
+        help='send SMS to every row of the input')
+    send.add_argument('--sender', required=True)
+    send.add_argument('--text', help='message text; {field} is replaced '
+                      'by the input column')
+    send.add_argument('--text-column',
+                      help='take the text of each message from this column')
+    send.add_argument('--phone-column', default='phone')
+    send.add_argument('--normalize', action='store_true',
+                      help='bring numbers to 79XXXXXXXXX before sending')
+    send.set_defaults(func=cmd_send, columns=SEND_COLUMNS)
+
+    status = commands.add_parser(
+        'status', parents=[common, streamed],
+        help='delivery status of every id_sms of the input')
+    status.add_argument('--id-column', default='id_sms')
+    status.add_argument('--chunk', type=int, default=100,
+                        help='ids per block (default: 100); a block is '
+                        'split further to keep request URLs short')
+    status.set_defaults(func=cmd_status, columns=STATUS_COLUMNS)
+
+    export = commands.add_parser(
+        'export-base', parents=[common], help='download a contact base')
+    export.add_argument('--base', required=True, help='base ID')
+    export.add_argument('--start-page', type=int, default=1)
+    export.set_defaults(func=cmd_export_base, columns=BASE_COLUMNS)
+
+    incoming = commands.add_parser(
+        'incoming', parents=[common], help='incoming SMS by day')
+    incoming.add_argument('--date-from', type=_date,
+                          help='YYYY-MM-DD (default: today)')
+    incoming.add_argument('--date-to', type=_date,
+                          help='YYYY-MM-DD (default: --date-from)')
+    incoming.set_defaults(func=cmd_incoming, columns=INCOMING_COLUMNS)
+
+    stats = commands.add_parser(
+        'stats', parents=[common], help='daily statistics by month')
+    stats.add_argument('--month-from', type=_month, required=True,
+                       help='YYYY-MM')
+    stats.add_argument('--month-to', type=_month,
+                       help='YYYY-MM (default: --month-from)')
+    stats.set_defaults(func=cmd_stats, columns=STATS_COLUMNS)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.resume and not args.output:
+        parser.error('--resume needs --output')
+    if args.progress is None:
+        args.progress = sys.stderr.isatty()
+    output = Output(args.output, _format(args.output, args.format),
+                    args.columns)
+    try:
+        api = _make_api(args)
+        try:
+            args.func(args, api, output)
+        finally:
+            api.close()
+    except CliError as e:
+        sys.stderr.write('mobilvest: {}\n'.format(e))
+        return 1
+    except (PageFetchError, ServerResponsedWithError, CircuitOpenError,
+            requests.RequestException, IOError, OSError) as e:
+        sys.stderr.write('mobilvest: {}\n'.format(e))
+        if args.output:
+            sys.stderr.write('mobilvest: run again with --resume '
+                             'to continue\n')
+        return 1
+    except KeyboardInterrupt:
+        sys.stderr.write('\nmobilvest: interrupted\n')
+        return 130
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# coding: UTF-8
+""" Локальный заменитель сервера online.mobilvest.ru
+Для тестов и замеров производительности без обращения к платному
+сервису. Проверяет подпись так же, как её формирует
+MobilVestApi._prepare_params, и позволяет добавлять задержку,
+ошибки и ограничение частоты запросов.
+
+    with FakeMobilVestServer(login='user', api_key='123') as server:
+        mapi = MobilVestApi('user', '123')
+        mapi.BASE_URL = server.url
+        mapi.get_balance()
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from hashlib import md5
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # заголовки и тело пишутся отдельно, без этого keep-alive
+    # соединение ждёт отложенного ACK на каждом ответе
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        status, body = self.server.fake.handle(self.path)
+        body = _to_bytes(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeMobilVestServer(object):
+    """ Поддельный сервер API mobilvest
+    login, api_key - данные доступа, с которыми проверяется подпись
+    latency - задержка каждого ответа, в секундах
+    rate_limit - сколько запросов в секунду обслуживать; остальные
+    получают ответ 503
+    base_size - количество номеров в единственной базе (ID 1)
+    page_size - количество номеров на странице phone.php
+    Ошибки добавляются методом fail(). Счётчик запросов по страницам -
+    атрибут requests.
+    """
+    PAGES = ('timestamp.php', 'balance.php', 'base.php', 'senders.php',
+             'phone.php', 'status.php', 'send.php', 'find_on_stop.php',
+             'add2stop.php', 'template.php', 'add_template.php',
+             'stat_by_month.php', 'operator.php', 'incoming.php')
+
+    def __init__(self, login='user', api_key='123', latency=0,
+                 rate_limit=None, base_size=1000, page_size=100,
+                 host='127.0.0.1', port=0):
+        self.login = login
+        self.api_key = api_key
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.base_size = base_size
+        self.page_size = page_size
+        self.requests = dict((page, 0) for page in self.PAGES)
+        self.stop_list = set()
+        self.templates = {}
+        self._failures = {}
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._sms_counter = 0
+        self._httpd = _ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        """ Адрес для MobilVestApi.BASE_URL """
+        host, port = self._httpd.server_address[:2]
+        return 'http://{}:{}/get/'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def fail(self, page, error, times=1):
+        """ Ответить ошибкой error на следующие times запросов к page
+        (times=None - на все запросы)
+        """
+        with self._lock:
+            self._failures[page] = [error, times]
+
+    def _next_failure(self, page):
+        with self._lock:
+            failure = self._failures.get(page)
+            if failure is None:
+                return None
+            if failure[1] is not None:
+                failure[1] -= 1
+                if failure[1] <= 0:
+                    del self._failures[page]
+            return failure[0]
+
+    def _over_rate_limit(self):
+        if self.rate_limit is None:
+            return False
+        now = time.time()
+        with self._lock:
+            while self._recent and self._recent[0] <= now - 1:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                return True
+            self._recent.append(now)
+            return False
+
+    def _check_signature(self, params):
+        if 'signature' not in params:
+            return 1
+        if params.get('login') != self.login:
+            return 7
+        if 'timestamp' not in params:
+            return 24
+        signature = params.pop('signature')
+        params_as_string = ''.join(params[k] for k in sorted(params))
+        valid = md5(_to_bytes(params_as_string) +
+                    _to_bytes(self.api_key)).hexdigest()
+        if signature != valid:
+            return 6
+        return None
+
+    def handle(self, path):
+        """ Обработка запроса, возвращает (HTTP-статус, тело ответа) """
+        parsed = urlparse(path)
+        page = parsed.path.rsplit('/', 1)[-1]
+        if page not in self.requests:
+            return 404, '{}'
+        with self._lock:
+            self.requests[page] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self._over_rate_limit():
+            return 503, 'Service Unavailable'
+        if page == 'timestamp.php':
+            return 200, str(int(time.time()))
+        params = dict((k, v[0]) for k, v in
+                      parse_qs(parsed.query, keep_blank_values=True).items())
+        error = self._check_signature(params) or self._next_failure(page)
+        if error is not None:
+            return 200, json.dumps({'error': error})
+        handler = getattr(self, '_' + page[:-len('.php')])
+        result = handler(params)
+        if isinstance(result, int):
+            result = {'error': result}
+        return 200, json.dumps(result)
+
+    def _balance(self, params):
+        return {'money': '69573.1', 'currency': 'RUR'}
+
+    def _base(self, params):
+        pages = (self.base_size + self.page_size - 1) // self.page_size
+        return {'1': {'name': 'Fake base', 'count': str(self.base_size),
+                      'pages': str(pages)}}
+
+    def _senders(self, params):
+        return {'smstest': 'completed'}
+
+    def _phone(self, params):
+        if 'base' not in params:
+            return 15
+        if params['base'] != '1':
+            return 25
+        page = int(params.get('page') or 1)
+        first = (page - 1) * self.page_size
+        last = min(first + self.page_size, self.base_size)
+        if first >= last:
+            return 19
+        return dict(('7900%07d' % i, {
+            'name': 'Name%d' % i, 'last_name': '', 'middle_name': '',
+            'date_birth': '0000-00-00', 'male': '', 'note1': '',
+            'note2': '', 'region': '', 'operator': ''})
+            for i in range(first, last))
+
+    def _status(self, params):
+        if not params.get('state'):
+            return 17
+        return dict((i, 'deliver') for i in params['state'].split(','))
+
+    def _send(self, params):
+        if not params.get('text'):
+            return 3
+        if not params.get('sender'):
+            return 5
+        phones = [p for p in params.get('phone', '').split(',') if p]
+        if not phones:
+            return 4
+        if len(phones) > 50:
+            return 14
+        result = {}
+        for phone in phones:
+            if phone in self.stop_list:
+                result[phone] = {'error': '13'}
+                continue
+            with self._lock:
+                self._sms_counter += 1
+                id_sms = '40900000%014d' % self._sms_counter
+            result[phone] = {'error': '0', 'id_sms': id_sms,
+                             'cost': '0.5', 'count_sms': '1'}
+        return result
+
+    def _find_on_stop(self, params):
+        if params.get('phone') not in self.stop_list:
+            return 19
+        return {'time_in': '2014-08-29 11:07:43', 'description': ''}
+
+    def _add2stop(self, params):
+        self.stop_list.add(params.get('phone'))
+        return {'id': str(len(self.stop_list))}
+
+    def _template(self, params):
+        if not self.templates:
+            return 19
+        return self.templates
+
+    def _add_template(self, params):
+        if not params.get('name'):
+            return 21
+        if params['name'] in self.templates:
+            return 22
+        self.templates[params['name']] = {
+            'template': params.get('text', ''),
+            'up_time': '2014-08-28 15:22:25'}
+        return {'id': str(len(self.templates))}
+
+    def _stat_by_month(self, params):
+        month = params.get('month')
+        if not month:
+            return 23
+        return {month + '-01': {'deliver': {'cost': '0.500', 'parts': '1'}}}
+
+    def _operator(self, params):
+        if not params.get('phone'):
+            return 4
+        return {'operator': 'Fake operator'}
+
+    def _incoming(self, params):
+        date = params.get('date')
+        if not date:
+            return 30
+        return {'5597': {'date': date + ' 05:47:24', 'sender': '79029734720',
+                         'prefix': '51632', 'text': '51632 TEST'}}
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import datetime
+import io
+import json
+import os
+import threading
+import time
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+class IncomingPoller(object):
+    """ Получение только новых входящих СМС
+    get_incoming(date) каждый раз возвращает все сообщения за день,
+    поэтому поллер помнит для каждого дня ID уже выданных сообщений
+    (водяной знак) и выдаёт только новые, упорядоченные по времени.
+    Первые rollover после полуночи опрашивается и предыдущий день,
+    чтобы не потерять сообщения, пришедшие перед сменой даты.
+    state_path - JSON-файл, куда сохраняется водяной знак, чтобы после
+    перезапуска не выдавать сообщения дня повторно
+    """
+
+    def __init__(self, api, state_path=None,
+                 rollover=datetime.timedelta(minutes=10),
+                 clock=datetime.datetime.now, sleep=time.sleep):
+        self.api = api
+        self.state_path = state_path
+        self.rollover = rollover
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # 'YYYY-MM-DD' -> множество ID выданных сообщений
+        self.seen = {}
+        # 'YYYY-MM-DD' -> время последнего выданного сообщения
+        self.last = {}
+        if state_path is not None and os.path.exists(state_path):
+            self._load()
+
+    def _load(self):
+        with io.open(self.state_path, 'rb') as f:
+            state = json.loads(f.read().decode('utf-8'))
+        self.seen = dict((day, set(ids)) for day, ids in
+                         state.get('seen', {}).items())
+        self.last = state.get('last', {})
+
+    def _save(self):
+        if self.state_path is None:
+            return
+        state = {'seen': dict((day, sorted(ids))
+                              for day, ids in self.seen.items()),
+                 'last': self.last}
+        tmp_path = self.state_path + '.tmp'
+        with io.open(tmp_path, 'wb') as f:
+            f.write(json.dumps(state).encode('utf-8'))
+        _replace(tmp_path, self.state_path)
+
+    def _dates(self, now):
+        today = now.date()
+        midnight = datetime.datetime.combine(today, datetime.time())
+        if now - midnight < self.rollover:
+            return [today - datetime.timedelta(days=1), today]
+        return [today]
+
+    def poll(self):
+        """ Один опрос сервера
+        Возвращает список пар (ID, сообщение) новых сообщений
+        в порядке времени прихода
+        """
+        with self._lock:
+            dates = self._dates(self._clock())
+            # водяной знак сдвигается, только когда загружены все дни:
+            # иначе ошибка на втором дне потеряла бы сообщения первого
+            fetched = []
+            for date in dates:
+                day = date.strftime('%Y-%m-%d')
+                messages = self.api.get_incoming(date) or {}
+                seen = self.seen.get(day, ())
+                new = [(sms_id, message) for sms_id, message
+                       in messages.items() if str(sms_id) not in seen]
+                new.sort(key=lambda item: (item[1].get('date', ''),
+                                           _id_order(item[0])))
+                fetched.append((day, new))
+            result = []
+            for day, new in fetched:
+                seen = self.seen.setdefault(day, set())
+                seen.update(str(sms_id) for sms_id, _ in new)
+                if new:
+                    self.last[day] = new[-1][1].get('date')
+                result.extend(new)
+            # старые дни больше не опрашиваются
+            days = set(d.strftime('%Y-%m-%d') for d in dates)
+            for day in list(self.seen):
+                if day not in days:
+                    del self.seen[day]
+                    self.last.pop(day, None)
+            if result:
+                self._save()
+            return result
+
+    def stream(self, interval=5, stop_event=None):
+        """ Бесконечный итератор по новым сообщениям: опрос сервера
+        каждые interval секунд (до установки stop_event)
+        """
+        while stop_event is None or not stop_event.is_set():
+            for item in self.poll():
+                yield item
+            if stop_event is not None:
+                stop_event.wait(interval)
+            else:
+                self._sleep(interval)
+
+
+def _id_order(sms_id):
+    """ ID сообщений - числа в строках: сравниваем как числа """
+    try:
+        return int(sms_id), ''
+    except ValueError:
+        return 0, sms_id
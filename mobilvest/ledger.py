@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import logging
+import sqlite3
+import time
+from .storage import SqliteStorage
+from .tracker import StatusTracker
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger (
+    id_sms TEXT PRIMARY KEY,
+    phone TEXT,
+    sender TEXT,
+    campaign TEXT,
+    cost REAL,
+    parts INTEGER,
+    sent_at REAL,
+    status TEXT,
+    status_at REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ledger_phone ON ledger (phone);
+CREATE INDEX IF NOT EXISTS ledger_campaign
+    ON ledger (campaign, sent_at, status);
+CREATE INDEX IF NOT EXISTS ledger_status ON ledger (status, sent_at);
+
+-- итоги по кампаниям, часам отправки и статусам поддерживаются
+-- триггерами в той же транзакции ('' вместо NULL: NULL в ключе
+-- не считается повтором)
+CREATE TABLE IF NOT EXISTS ledger_totals (
+    campaign TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    parts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (campaign, hour, status)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS ledger_insert AFTER INSERT ON ledger
+WHEN new.sent_at IS NOT NULL BEGIN
+    INSERT INTO ledger_totals (campaign, hour, status)
+    SELECT IFNULL(new.campaign, ''), CAST(new.sent_at / 3600 AS INTEGER),
+        IFNULL(new.status, '')
+    WHERE NOT EXISTS (SELECT 1 FROM ledger_totals
+        WHERE campaign = IFNULL(new.campaign, '')
+            AND hour = CAST(new.sent_at / 3600 AS INTEGER)
+            AND status = IFNULL(new.status, ''));
+    UPDATE ledger_totals SET count = count + 1,
+        cost = cost + IFNULL(new.cost, 0),
+        parts = parts + IFNULL(new.parts, 0)
+    WHERE campaign = IFNULL(new.campaign, '')
+        AND hour = CAST(new.sent_at / 3600 AS INTEGER)
+        AND status = IFNULL(new.status, '');
+END;
+CREATE TRIGGER IF NOT EXISTS ledger_update_old AFTER UPDATE ON ledger
+WHEN old.sent_at IS NOT NULL BEGIN
+    UPDATE ledger_totals SET count = count - 1,
+        cost = cost - IFNULL(old.cost, 0),
+        parts = parts - IFNULL(old.parts, 0)
+    WHERE campaign = IFNULL(old.campaign, '')
+        AND hour = CAST(old.sent_at / 3600 AS INTEGER)
+        AND status = IFNULL(old.status, '');
+END;
+CREATE TRIGGER IF NOT EXISTS ledger_update_new AFTER UPDATE ON ledger
+WHEN new.sent_at IS NOT NULL BEGIN
+    INSERT INTO ledger_totals (campaign, hour, status)
+    SELECT IFNULL(new.campaign, ''), CAST(new.sent_at / 3600 AS INTEGER),
+        IFNULL(new.status, '')
+    WHERE NOT EXISTS (SELECT 1 FROM ledger_totals
+        WHERE campaign = IFNULL(new.campaign, '')
+            AND hour = CAST(new.sent_at / 3600 AS INTEGER)
+            AND status = IFNULL(new.status, ''));
+    UPDATE ledger_totals SET count = count + 1,
+        cost = cost + IFNULL(new.cost, 0),
+        parts = parts + IFNULL(new.parts, 0)
+    WHERE campaign = IFNULL(new.campaign, '')
+        AND hour = CAST(new.sent_at / 3600 AS INTEGER)
+        AND status = IFNULL(new.status, '');
+END;
+"""
+
+# INSERT ... ON CONFLICT DO UPDATE появился в SQLite 3.24
+_UPSERT = sqlite3.sqlite_version_info >= (3, 24, 0)
+
+COLUMNS = ('id_sms', 'phone', 'sender', 'campaign', 'cost', 'parts',
+           'sent_at', 'status', 'status_at')
+
+
+class Ledger(SqliteStorage):
+    """ Журнал отправленных СМС в файле SQLite
+    Для каждого id_sms хранятся номер, отправитель, кампания,
+    стоимость, количество частей, время отправки и последний статус,
+    поэтому вопросы "что стало с сообщением" и "какая доставляемость
+    у кампании" решаются запросом к индексам, без обращения к API.
+    Подключается через MobilVestApi.add_observer (ответы send_sms и
+    get_status записываются сами, СМС помечаются текущей campaign)
+    или заполняется явно методами record_send и record_statuses.
+    Каждый ответ записывается одной транзакцией. Ошибка записи
+    из обработчика наблюдателя (занятый или недоступный файл)
+    записывается в лог и не влияет на результат запроса к API.
+    """
+    SCHEMA = SCHEMA
+    TEXT_FACTORY = str
+
+    def __init__(self, path, campaign=None):
+        super(Ledger, self).__init__(path)
+        self.campaign = campaign
+
+    def _upsert(self, columns, rows):
+        """ Вставка или обновление строк (id_sms, *columns) одной
+        транзакцией
+        """
+        assignments = ', '.join('{} = ?'.format(c) for c in columns)
+        with self._transaction() as conn:
+            if _UPSERT:
+                conn.executemany(
+                    'INSERT INTO ledger (id_sms, {}) VALUES (?, {}) '
+                    'ON CONFLICT (id_sms) DO UPDATE SET {}'.format(
+                        ', '.join(columns), ', '.join('?' * len(columns)),
+                        ', '.join('{0} = excluded.{0}'.format(c)
+                                  for c in columns)),
+                    rows)
+            else:
+                conn.executemany(
+                    'INSERT OR IGNORE INTO ledger (id_sms) VALUES (?)',
+                    [row[:1] for row in rows])
+                conn.executemany(
+                    'UPDATE ledger SET {} WHERE id_sms = ?'.format(
+                        assignments),
+                    [row[1:] + row[:1] for row in rows])
+
+    def after_response(self, url, params, response, result, timings):
+        try:
+            if url == 'send.php':
+                self.record_send(result, params.get('sender'))
+            elif url == 'status.php':
+                self.record_statuses(result)
+        except Exception:
+            logger.exception('Ledger %s: failed to record %s response',
+                             self.path, url)
+
+    def record_send(self, response, sender=None, campaign=None,
+                    sent_at=None):
+        """ Запись ответа send_sms (номера с ошибкой пропускаются)
+        campaign - метка кампании (по умолчанию - атрибут campaign)
+        Возвращает количество записанных СМС
+        """
+        sent_at = sent_at or time.time()
+        campaign = campaign if campaign is not None else self.campaign
+        rows = []
+        for phone, item in (response or {}).items():
+            if not isinstance(item, dict) or not item.get('id_sms'):
+                continue
+            rows.append((str(item['id_sms']), str(phone), sender, campaign,
+                         float(item.get('cost') or 0),
+                         int(item.get('count_sms') or 0), sent_at))
+        if rows:
+            # статус мог прийти раньше записи об отправке
+            self._upsert(('phone', 'sender', 'campaign', 'cost', 'parts',
+                          'sent_at'), rows)
+        return len(rows)
+
+    def record_statuses(self, statuses, status_at=None):
+        """ Запись ответа get_status {id_sms: статус} """
+        status_at = status_at or time.time()
+        rows = [(str(id_sms), status, status_at)
+                for id_sms, status in (statuses or {}).items()]
+        if rows:
+            self._upsert(('status', 'status_at'), rows)
+        return len(rows)
+
+    def _select(self, where, args):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT {} FROM ledger WHERE {}'.format(
+                    ', '.join(COLUMNS), where), args).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def get(self, id_sms):
+        """ Запись о СМС: словарь с полями COLUMNS (None, если нет) """
+        rows = self._select('id_sms = ?', (str(id_sms),))
+        return rows[0] if rows else None
+
+    def by_phone(self, phone):
+        """ Все СМС на номер, по времени отправки """
+        return self._select('phone = ? ORDER BY sent_at', (str(phone),))
+
+    def _range(self, campaign, since, until):
+        where, args = [], []
+        if campaign is not None:
+            where.append('campaign = ?')
+            args.append(campaign)
+        if since is not None:
+            where.append('sent_at >= ?')
+            args.append(since)
+        if until is not None:
+            where.append('sent_at < ?')
+            args.append(until)
+        return ' AND '.join(where) or '1', args
+
+    def summary(self, campaign=None, since=None, until=None):
+        """ Итоги по статусам: {статус: (количество, стоимость, части)}
+        (статус None - ещё не получен)
+        since, until - границы времени отправки (unix time); если они
+        кратны часу, итоги берутся из ledger_totals и не зависят от
+        количества СМС, иначе считаются по индексу кампаний
+        """
+        if all(t is None or t % 3600 == 0 for t in (since, until)):
+            return self._totals(campaign, since, until)
+        where, args = self._range(campaign, since, until)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT status, COUNT(*), TOTAL(cost), TOTAL(parts) '
+                'FROM ledger WHERE {} GROUP BY status'.format(where),
+                args).fetchall()
+        return dict((status, (count, cost, int(parts)))
+                    for status, count, cost, parts in rows)
+
+    def _totals(self, campaign, since, until):
+        where, args = [], []
+        if campaign is not None:
+            where.append('campaign = ?')
+            args.append(campaign)
+        if since is not None:
+            where.append('hour >= ?')
+            args.append(int(since // 3600))
+        if until is not None:
+            where.append('hour < ?')
+            args.append(int(until // 3600))
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT status, SUM(count), SUM(cost), SUM(parts) '
+                'FROM ledger_totals WHERE {} GROUP BY status '
+                'HAVING SUM(count) > 0'.format(' AND '.join(where) or '1'),
+                args).fetchall()
+        # стоимость копится сложением и вычитанием float
+        return dict((status or None, (count, round(cost, 6), parts))
+                    for status, count, cost, parts in rows)
+
+    def delivery_rate(self, campaign=None, since=None, until=None):
+        """ Доля доставленных СМС (None, если СМС нет) """
+        summary = self.summary(campaign, since, until)
+        total = sum(count for count, _, _ in summary.values())
+        if not total:
+            return None
+        return summary.get('deliver', (0,))[0] / float(total)
+
+    def pending(self, older_than=0, limit=1000):
+        """ id_sms без окончательного статуса, отправленные раньше
+        чем older_than секунд назад (для догоняющего опроса статусов)
+        """
+        terminal = tuple(StatusTracker.TERMINAL_STATUSES)
+        placeholders = ', '.join('?' * len(terminal))
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id_sms FROM ledger WHERE (status IS NULL OR '
+                'status NOT IN ({})) AND sent_at <= ? '
+                'ORDER BY sent_at LIMIT ?'.format(placeholders),
+                terminal + (time.time() - older_than, limit)).fetchall()
+        return [row[0] for row in rows]
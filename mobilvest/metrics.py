@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import threading
+from bisect import bisect_left
+
+
+class MetricsCollector(object):
+    """ Сбор метрик запросов к API (подключается через
+    MobilVestApi.add_observer)
+    По каждой php странице считаются запросы, ошибки по кодам из
+    MobilVestApi.ERRORS (пустой ответ - код 19) и гистограммы
+    длительности по этапам запроса (см. add_observer).
+    Обработка события - несколько операций со словарями под одной
+    блокировкой, поэтому сборщик можно не отключать в рабочем режиме.
+    buckets - верхние границы корзин гистограмм, в секундах
+    """
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                       1, 2.5, 5, 10)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.errors = {}
+        # (страница, этап) -> [счётчики корзин..., +Inf, сумма]
+        self._histograms = {}
+
+    def _observe(self, url, timings):
+        for phase, seconds in timings.items():
+            histogram = self._histograms.get((url, phase))
+            if histogram is None:
+                histogram = [0] * (len(self.buckets) + 1) + [0.0]
+                self._histograms[(url, phase)] = histogram
+            histogram[bisect_left(self.buckets, seconds)] += 1
+            histogram[-1] += seconds
+
+    def _count_error(self, url, code):
+        key = (url, code)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def after_response(self, url, params, response, result, timings):
+        with self._lock:
+            self.requests[url] = self.requests.get(url, 0) + 1
+            if isinstance(response, dict) and response.get('error') == 19:
+                self._count_error(url, 19)
+            self._observe(url, timings)
+
+    def on_error(self, url, params, exception, timings):
+        with self._lock:
+            self.requests[url] = self.requests.get(url, 0) + 1
+            self._count_error(url, getattr(exception, 'code', None))
+            self._observe(url, timings)
+
+    def histogram(self, url, phase='total'):
+        """ Гистограмма этапа: список пар (граница, накопленное число)
+        и сумма длительностей
+        """
+        with self._lock:
+            histogram = list(self._histograms.get(
+                (url, phase), [0] * (len(self.buckets) + 1) + [0.0]))
+        counts, total = histogram[:-1], histogram[-1]
+        cumulative, result = 0, []
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            result.append((bound, cumulative))
+        return result, total
+
+    def export(self):
+        """ Метрики в текстовом формате Prometheus """
+        with self._lock:
+            requests = sorted(self.requests.items())
+            errors = sorted(self.errors.items(), key=lambda i: str(i[0]))
+            phases = sorted(self._histograms)
+        lines = [
+            '# HELP mobilvest_requests_total API requests by page.',
+            '# TYPE mobilvest_requests_total counter',
+        ]
+        for url, count in requests:
+            lines.append('mobilvest_requests_total{page="%s"} %d'
+                         % (url, count))
+        lines += [
+            '# HELP mobilvest_errors_total API errors by page and code '
+            '(code "" - not a server error).',
+            '# TYPE mobilvest_errors_total counter',
+        ]
+        for (url, code), count in errors:
+            lines.append('mobilvest_errors_total{page="%s",code="%s"} %d'
+                         % (url, '' if code is None else code, count))
+        lines += [
+            '# HELP mobilvest_request_duration_seconds '
+            'API request duration by phase.',
+            '# TYPE mobilvest_request_duration_seconds histogram',
+        ]
+        for url, phase in phases:
+            buckets, total = self.histogram(url, phase)
+            labels = 'page="%s",phase="%s"' % (url, phase)
+            for bound, count in buckets:
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('mobilvest_request_duration_seconds_bucket'
+                             '{%s,le="%s"} %d' % (labels, le, count))
+            lines.append('mobilvest_request_duration_seconds_sum{%s} %r'
+                         % (labels, total))
+            lines.append('mobilvest_request_duration_seconds_count{%s} %d'
+                         % (labels, buckets[-1][1]))
+        return '\n'.join(lines) + '\n'
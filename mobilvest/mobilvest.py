@@ -1,18 +1,103 @@
 #!/usr/bin/env python
 # coding: UTF-8
 
-import requests
+import logging
+import threading
+import time
+from decimal import Decimal
 from hashlib import md5
+from .operators import OperatorIndex
+from .phones import normalize_phone, normalize_phones
+from .records import PhoneRecord, SendResult, StatusEntry
+from .stats import MonthStatsCache, StatsColumns, months_between
+from .transport import HttpTransport
+from .utils import chunked, parallel_map, unique
+from .utils import json_loads as default_json_loads
+
+logger = logging.getLogger(__name__)
+
+
+def _to_bytes(value):
+    """ Строка -> bytes (для md5 в Python 3) """
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
+
+
+def _add_timing(timings, phase, started):
+    """ Учёт длительности этапа запроса, возвращает текущее время """
+    now = time.time()
+    timings[phase] = timings.get(phase, 0) + now - started
+    return now
 
 
 class ServerResponsedWithError(Exception):
-    pass
+    """ Сервер вернул ошибку; code - её код из MobilVestApi.ERRORS """
+
+    def __init__(self, msg, code=None):
+        super(ServerResponsedWithError, self).__init__(msg)
+        self.code = code
 
 
 class CantGetStatus(ServerResponsedWithError):
     pass
 
 
+class PageFetchError(Exception):
+    """ Ошибка получения страницы базы номеров
+    page - номер страницы, с которой можно продолжить выгрузку
+    error - исходное исключение
+    """
+
+    def __init__(self, page, error):
+        super(PageFetchError, self).__init__(
+            "Page {}: {}".format(page, error))
+        self.page = page
+        self.error = error
+
+
+class BulkSendResult(dict):
+    """ Объединённый результат массовой отправки
+    Ключи и значения - как в ответе send_sms: {номер: {"error": ...}}
+    errors - список пар (номера пакета, исключение) для пакетов,
+    которые не удалось отправить целиком
+    cost - суммарная стоимость (Decimal)
+    count_sms - суммарное количество СМС (частей)
+    """
+
+    def __init__(self):
+        super(BulkSendResult, self).__init__()
+        self.errors = []
+        self.cost = Decimal(0)
+        self.count_sms = 0
+
+    def merge(self, response):
+        """ Добавление ответа send_sms по одному пакету номеров
+        Номера, приведённые к одному (normalize_phones), получают один
+        и тот же ответ - его стоимость учитывается один раз
+        """
+        counted = set()
+        for phone, item in (response or {}).items():
+            self[phone] = item
+            if isinstance(item, dict) and id(item) not in counted:
+                counted.add(id(item))
+                self.cost += Decimal(item.get('cost') or 0)
+                self.count_sms += int(item.get('count_sms') or 0)
+
+
+class StatusResult(dict):
+    """ Объединённый результат get_status_many: {ID СМС: статус}
+    not_ready - ID, статус которых ещё не получен (ошибка 18)
+    errors - список пар (ID пакета, исключение) для пакетов,
+    которые не удалось запросить
+    """
+
+    def __init__(self):
+        super(StatusResult, self).__init__()
+        self.not_ready = []
+        self.errors = []
+
+
 class MobilVestApi(object):
     ERRORS = {
         1: 'Не указана подпись',
@@ -47,10 +132,72 @@ class MobilVestApi(object):
         30: 'Не указана дата (Формат: YYYY-MM-DD)'
     }
     BASE_URL = 'http://online.mobilvest.ru/get/'
+    # ограничение API на количество номеров в одном запросе send.php
+    MAX_PHONES_PER_SMS = 50
+    # ошибки, после которых имеет смысл пересинхронизировать часы
+    # и повторить запрос: подпись считается вместе с timestamp
+    CLOCK_ERRORS = (6, 24)
+    # по сколько номеров send_bulk приводит к виду 79XXXXXXXXX за раз
+    NORMALIZE_CHUNK = 10000
+    # длина параметра state в адресе запроса get_status_many (с учётом
+    # кодирования запятых), чтобы адрес не превышал ограничений серверов
+    MAX_STATE_LENGTH = 1800
 
-    def __init__(self, login, api_key):
+    def __init__(self, login, api_key, clock_sync_interval=3600,
+                 transport=None, cache=None, stop_list=None,
+                 operator_index=None, rate_limiter=None, stats_cache=None,
+                 json_loads=None, normalize_phones=False, resilience=None):
+        """
+        login, api_key - данные доступа к API
+        clock_sync_interval - через сколько секунд пересинхронизировать
+        часы с сервером (None - только при ошибке подписи)
+        transport - объект с методами get(url, params, timeout) и close(),
+        по умолчанию HttpTransport с пулом соединений
+        cache - ResponseCache для редко меняющихся ответов (по умолчанию
+        ответы не кэшируются)
+        stop_list - StopList: номера из него не отправляются на сервер,
+        а сам список пополняется по ответам API
+        operator_index - OperatorIndex для resolve_operators (по умолчанию
+        создаётся пустой)
+        rate_limiter - RateLimiter, общий для всех потоков, использующих
+        клиент (только для синхронного клиента)
+        stats_cache - MonthStatsCache для stats_range (по умолчанию
+        создаётся в памяти)
+        json_loads - функция разбора ответов сервера (по умолчанию
+        orjson или ujson, если установлены, иначе json.loads)
+        normalize_phones - приводить номера к виду 79XXXXXXXXX перед
+        запросом; некорректные номера получают ошибку 16 без обращения
+        к серверу (см. mobilvest.phones)
+        resilience - ResiliencePolicy: таймауты по страницам, повторы,
+        выключатель и дублирующие запросы (только для синхронного
+        клиента)
+        """
         self.login = login
         self.api_key = api_key
+        self.transport = transport or HttpTransport()
+        self.cache = cache
+        self.stop_list = stop_list
+        self.operator_index = operator_index or OperatorIndex()
+        self.rate_limiter = rate_limiter
+        self.stats_cache = stats_cache or MonthStatsCache()
+        self.json_loads = json_loads or default_json_loads
+        self.normalize_phones = normalize_phones
+        self.resilience = resilience
+        self.observers = []
+        self.clock_sync_interval = clock_sync_interval
+        self._clock_offset = None
+        self._clock_synced_at = None
+        self._clock_lock = threading.Lock()
+
+    def close(self):
+        """ Закрытие соединений транспорта """
+        self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def _list_to_str(self, lst):
         """ Преобразование списка к строке, где значения разделены запятой
@@ -58,9 +205,56 @@ class MobilVestApi(object):
         """
         return ','.join(map(str, lst))
 
+    def _timeout(self, url):
+        if self.resilience is None:
+            return None
+        return self.resilience.timeout(url)
+
     def _get_server_timestamp(self):
-        r = requests.get('http://online.mobilvest.ru/get/timestamp.php')
-        return int(r.text)
+        return int(self.transport.get(self.BASE_URL + 'timestamp.php', None,
+                                      self._timeout('timestamp.php')))
+
+    def sync_clock(self):
+        """ Синхронизация часов с сервером
+        Смещение считается относительно середины запроса к timestamp.php,
+        чтобы задержка сети не сдвигала метку в одну сторону.
+        Возвращает смещение в секундах (время сервера - локальное время)
+        """
+        started = time.time()
+        server_timestamp = self._get_server_timestamp()
+        finished = time.time()
+        offset = server_timestamp - (started + finished) / 2.0
+        with self._clock_lock:
+            self._clock_offset = offset
+            self._clock_synced_at = finished
+        return offset
+
+    def _clock_is_stale(self):
+        if self._clock_synced_at is None:
+            return True
+        if self.clock_sync_interval is None:
+            return False
+        return time.time() - self._clock_synced_at >= self.clock_sync_interval
+
+    @property
+    def clock_offset(self):
+        """ Текущее смещение часов сервера (None, если ещё не известно) """
+        return self._clock_offset
+
+    @property
+    def clock_offset_age(self):
+        """ Сколько секунд прошло с последней синхронизации часов """
+        if self._clock_synced_at is None:
+            return None
+        return time.time() - self._clock_synced_at
+
+    def _get_timestamp(self):
+        """ Временная метка сервера, вычисленная по локальным часам
+        (устаревание часов проверяется в _send_request)
+        """
+        if self._clock_offset is None:
+            self.sync_clock()
+        return int(time.time() + self._clock_offset)
 
     def _prepare_params(self, params):
         """
@@ -77,21 +271,134 @@ class MobilVestApi(object):
         """
         result = params.copy()
         result['login'] = self.login
-        result['timestamp'] = self._get_server_timestamp()
+        result['timestamp'] = self._get_timestamp()
         result['return'] = 'json'
         params_as_string = ''.join(str(result[k]) for k in sorted(result))
-        result['signature'] = md5(params_as_string + self.api_key).hexdigest()
+        result['signature'] = md5(
+            _to_bytes(params_as_string + self.api_key)).hexdigest()
         return result
 
-    def _call_api(self, url, params):
+    def _call_api(self, url, params, convert=None):
         """Вызов одной из API-функций
         url - адрес php страницы
         params - параметры, не относящиеся к безопасности
                                             (login, timestamp, signature)
+        convert - функция преобразования результата (например, в записи
+        из records); кэш и наблюдатели работают с исходным словарём
         возвращает ответ сервера в JSON
         """
+        if self.cache is not None:
+            found, result = self.cache.get(url, params)
+            if found:
+                return convert(result) if convert else result
+        timings = {}
+        started = time.time()
+        self._notify('before_request', url, params)
+
+        def attempt(timings):
+            response = self._request(url, params, timings)
+            if self._is_clock_error(response):
+                # часы могли уйти с момента последней синхронизации
+                self.sync_clock()
+                response = self._request(url, params, timings)
+            return response, self._handle_result(url, params, response)
+
+        try:
+            if self.resilience is None:
+                response, result = attempt(timings)
+            else:
+                response, result = self.resilience.call(url, attempt,
+                                                        timings)
+        except Exception as e:
+            timings['total'] = time.time() - started
+            self._notify('on_error', url, params, e, timings)
+            raise
+        timings['total'] = time.time() - started
+        self._notify('after_response', url, params, response, result,
+                     timings)
+        return convert(result) if convert else result
+
+    def add_observer(self, observer):
+        """ Подписка на события запросов к API
+        observer - объект с любыми из методов:
+        before_request(url, params)
+        after_response(url, params, response, result, timings)
+        on_error(url, params, exception, timings)
+        response - ответ сервера как есть, result - то, что вернёт метод,
+        timings - длительность этапов запроса в секундах: queue (ожидание
+        rate_limiter), timestamp (синхронизация часов), sign, network,
+        decode и total
+        Исключения обработчиков записываются в лог и не влияют
+        на результат запроса.
+        """
+        # новый список, а не append: его могут перебирать другие потоки
+        self.observers = self.observers + [observer]
+
+    def _notify(self, event, *args):
+        for observer in self.observers:
+            handler = getattr(observer, event, None)
+            if handler is None:
+                continue
+            try:
+                handler(*args)
+            except Exception:
+                logger.exception('Observer %r failed on %s', observer, event)
+
+    def _handle_result(self, url, params, response):
+        result = self._handle_response(response)
+        if self.cache is not None:
+            self.cache.update(url, params, result)
+        if self.stop_list is not None:
+            self._update_stop_list(url, params, result)
+        return result
+
+    def _update_stop_list(self, url, params, result):
+        if url == 'send.php':
+            self.stop_list.learn_send_result(result)
+        elif url == 'add2stop.php':
+            self.stop_list.add(params['phone'])
+        elif url == 'find_on_stop.php':
+            if result is None:
+                self.stop_list.discard(params['phone'])
+            else:
+                self.stop_list.add(params['phone'])
+
+    def _request(self, url, params, timings):
+        if self.rate_limiter is None:
+            return self._send_request(url, params, timings)
+        started = time.time()
+        self.rate_limiter.acquire(url)
+        _add_timing(timings, 'queue', started)
+        started = time.time()
+        response = None
+        try:
+            response = self._send_request(url, params, timings)
+            return response
+        finally:
+            self.rate_limiter.release(url, response, time.time() - started)
+
+    def _send_request(self, url, params, timings):
+        started = time.time()
+        if self._clock_is_stale():
+            self.sync_clock()
+        started = _add_timing(timings, 'timestamp', started)
         params = self._prepare_params(params)
-        response = requests.get(self.BASE_URL + url, params=params).json()
+        started = _add_timing(timings, 'sign', started)
+        body = self.transport.get(self.BASE_URL + url, params,
+                                  self._timeout(url))
+        started = _add_timing(timings, 'network', started)
+        response = self.json_loads(body)
+        _add_timing(timings, 'decode', started)
+        return response
+
+    def _is_clock_error(self, response):
+        return (isinstance(response, dict) and
+                response.get('error') in self.CLOCK_ERRORS)
+
+    def _handle_response(self, response):
+        """ Разбор ответа сервера: пустой ответ -> None,
+        ошибка -> исключение, иначе - сам ответ
+        """
         if not response:
             return None
         if 'error' in response:
@@ -103,8 +410,8 @@ class MobilVestApi(object):
             # возвращается ошибка, которую необходимо отличать
             # от всех остальных
             if response['error'] == 18:
-                raise CantGetStatus(msg)
-            raise ServerResponsedWithError(msg)
+                raise CantGetStatus(msg, 18)
+            raise ServerResponsedWithError(msg, response['error'])
         return response
 
     def get_balance(self):
@@ -157,10 +464,11 @@ class MobilVestApi(object):
         url = "senders.php"
         return self._call_api(url, params)
 
-    def get_phone(self, base, page):
+    def get_phone(self, base, page, typed=False):
         """ Запрос номеров из базы
         base - ID базы
         page - номер страницы
+        typed - вернуть список PhoneRecord вместо словаря
         пример ответа:
         {
             "79687931116": {
@@ -189,11 +497,51 @@ class MobilVestApi(object):
         """
         url = "phone.php"
         params = {'base': base, 'page': page}
-        return self._call_api(url, params)
+        convert = PhoneRecord.from_response if typed else None
+        return self._call_api(url, params, convert)
+
+    def iter_phones(self, base, prefetch=4, concurrency=2, start_page=1,
+                    pages=None, typed=False):
+        """ Итератор по всем номерам базы: пары (номер, данные номера)
+        base - ID базы
+        prefetch - сколько страниц загружать заранее
+        concurrency - сколько страниц загружать одновременно
+        start_page - с какой страницы начать (для продолжения выгрузки)
+        pages - количество страниц; если не указано, берётся из get_base
+        typed - выдавать PhoneRecord вместо пар (разбор записей
+        выполняется в потоках загрузки)
+        Страницы выдаются по порядку, в памяти одновременно не более
+        prefetch страниц. При ошибке загрузки бросается PageFetchError,
+        по его атрибуту page можно продолжить выгрузку.
+        """
+        if pages is None:
+            bases = self.get_base() or {}
+            if str(base) not in bases:
+                raise ServerResponsedWithError(self.ERRORS[25])
+            pages = int(bases[str(base)]['pages'])
 
-    def get_status(self, state):
+        def fetch(page):
+            try:
+                return page, self.get_phone(base, page, typed), None
+            except Exception as e:
+                return page, None, e
+
+        for page, phones, error in parallel_map(
+                fetch, range(start_page, pages + 1), concurrency,
+                window=prefetch):
+            if error is not None:
+                raise PageFetchError(page, error)
+            if typed:
+                for record in phones or ():
+                    yield record
+                continue
+            for phone, record in (phones or {}).items():
+                yield phone, record
+
+    def get_status(self, state, typed=False):
         """ Запрос статусов
         state - ID статуса
+        typed - вернуть список StatusEntry вместо словаря
         пример ответа:
         {
             "4091297100348873330001" : "not_deliver",
@@ -205,13 +553,71 @@ class MobilVestApi(object):
             params = {'state': self._list_to_str(state)}
         else:
             params = {'state': state}
-        return self._call_api(url, params)
+        convert = StatusEntry.from_response if typed else None
+        return self._call_api(url, params, convert)
+
+    def get_status_many(self, ids, concurrency=4):
+        """ Статусы любого количества СМС
+        ids - итератор ID СМС, повторы отбрасываются
+        concurrency - сколько запросов выполнять одновременно
+        ID разбиваются на пакеты, умещающиеся в адрес запроса
+        (MAX_STATE_LENGTH), пакеты запрашиваются в пуле потоков.
+        Если на пакет сервер отвечает ошибкой 18 (CantGetStatus), пакет
+        делится пополам, пока ошибка не останется у отдельных ID - они
+        попадают в not_ready, статусы остальных возвращаются. Ошибка
+        запроса другого пакета не прерывает запрос, а попадает в errors.
+        Возвращает StatusResult
+        """
+        def fetch(chunk):
+            statuses, not_ready, errors = {}, [], []
+            parts = [chunk]
+            while parts:
+                part = parts.pop()
+                try:
+                    response = self.get_status(part) or {}
+                except CantGetStatus:
+                    if len(part) == 1:
+                        not_ready.extend(part)
+                    else:
+                        middle = len(part) // 2
+                        parts.append(part[middle:])
+                        parts.append(part[:middle])
+                    continue
+                except Exception as e:
+                    errors.append((part, e))
+                    continue
+                statuses.update(response)
+                not_ready.extend(i for i in part if str(i) not in response)
+            return statuses, not_ready, errors
 
-    def send_sms(self, phone, text, sender):
+        result = StatusResult()
+        for statuses, not_ready, errors in parallel_map(
+                fetch, self._state_chunks(unique(ids)), concurrency):
+            result.update(statuses)
+            result.not_ready.extend(not_ready)
+            result.errors.extend(errors)
+        return result
+
+    def _state_chunks(self, ids):
+        """ Пакеты ID, умещающиеся в MAX_STATE_LENGTH символов """
+        chunk, length = [], 0
+        for id_sms in ids:
+            # запятая в адресе кодируется как %2C
+            size = len(str(id_sms)) + 3
+            if chunk and length + size > self.MAX_STATE_LENGTH:
+                yield chunk
+                chunk, length = [], 0
+            chunk.append(id_sms)
+            length += size
+        if chunk:
+            yield chunk
+
+    def send_sms(self, phone, text, sender, typed=False):
         """ Отправка СМС
         phone - Один номер, или список номеров (не более 50 номеров)
         text - Текст СМС сообщения
         sender - Имя отправителя (одно из одобренных на вашем аккаунте)
+        typed - вернуть список SendResult вместо словаря
         пример ответа:
         {
             "79029134225": {
@@ -222,13 +628,126 @@ class MobilVestApi(object):
             }
         }
         """
-        url = "send.php"
+        allowed, stopped = self._split_stopped(phone)
+        if allowed:
+            url = "send.php"
+            response = self._call_api(url,
+                                      self._send_params(allowed, text, sender))
+            stopped = self._merge_stopped(response, stopped, phone)
+        elif self.normalize_phones:
+            stopped = self._merge_stopped({}, stopped, phone)
+        return SendResult.from_response(stopped) if typed else stopped
+
+    def _send_params(self, phone, text, sender):
         params = {'sender': sender, 'text': text}
         if isinstance(phone, list):
             params['phone'] = self._list_to_str(phone)
         else:
             params['phone'] = phone
-        return self._call_api(url, params)
+        return params
+
+    def _split_stopped(self, phone):
+        """ Отделение некорректных номеров и номеров из локального
+        стоп-листа
+        Возвращает номера для отправки (в том же виде - список или
+        один номер) и ответ для отброшенных номеров в формате send_sms,
+        как если бы сервер вернул для них ошибку 16 или 13
+        """
+        if self.stop_list is None and not self.normalize_phones:
+            return phone, {}
+        phones = phone if isinstance(phone, list) else [phone]
+        rejected = {}
+        if self.normalize_phones:
+            normalized = normalize_phones(phones)
+            phones = normalized.phones
+            for raw in normalized.rejected:
+                rejected[str(raw)] = {'error': '16'}
+        allowed = phones
+        if self.stop_list is not None:
+            allowed, stopped = self.stop_list.filter(phones)
+            for p in stopped:
+                rejected[str(p)] = {'error': '13'}
+        if not isinstance(phone, list):
+            allowed = allowed[0] if allowed else None
+        return allowed, rejected
+
+    def _merge_stopped(self, response, stopped, phone):
+        """ Объединение ответа сервера с ответом для отброшенных номеров
+        С normalize_phones сервер отвечает по приведённым номерам, а
+        результат возвращается по номерам в том виде, в каком их передали
+        (phone), чтобы вызывающий код находил свои номера
+        """
+        if not stopped and not self.normalize_phones:
+            return response
+        result = dict(stopped)
+        result.update(response or {})
+        if not self.normalize_phones:
+            return result
+        by_raw = {}
+        for raw in (phone if isinstance(phone, list) else [phone]):
+            key = str(raw)
+            if key not in result:
+                key = normalize_phone(raw)
+            if key in result:
+                by_raw[str(raw)] = result[key]
+        return by_raw
+
+    def send_bulk(self, phones, text, sender, concurrency=4):
+        """ Массовая отправка СМС
+        phones - любой итератор номеров, повторы отбрасываются
+        text, sender - как в send_sms
+        concurrency - сколько запросов выполнять одновременно
+        Номера разбиваются на пакеты по MAX_PHONES_PER_SMS и отправляются
+        в пуле потоков. Ошибка одного пакета не прерывает рассылку,
+        а попадает в errors результата.
+        Возвращает BulkSendResult
+        """
+        def send_chunk(chunk):
+            try:
+                return chunk, self.send_sms(chunk, text, sender), None
+            except Exception as e:
+                return chunk, None, e
+
+        result = BulkSendResult()
+        chunks = chunked(self._drop_stopped(phones, result),
+                         self.MAX_PHONES_PER_SMS)
+        for chunk, response, error in parallel_map(send_chunk, chunks,
+                                                   concurrency):
+            if error is not None:
+                result.errors.append((chunk, error))
+            else:
+                result.merge(response)
+        return result
+
+    def _drop_stopped(self, phones, result):
+        """ Отбрасывание повторов, некорректных номеров и номеров
+        из стоп-листа до разбиения на пакеты, чтобы пакеты оставались
+        полными
+        """
+        if self.normalize_phones:
+            phones = self._drop_invalid(phones, result)
+        for phone in unique(phones):
+            if self.stop_list is not None and phone in self.stop_list:
+                result[str(phone)] = {'error': '13'}
+            else:
+                yield phone
+
+    def _drop_invalid(self, phones, result):
+        for chunk in chunked(phones, self.NORMALIZE_CHUNK):
+            normalized = normalize_phones(chunk)
+            for raw in normalized.rejected:
+                result[str(raw)] = {'error': '16'}
+            for phone in normalized.phones:
+                yield phone
+
+    def _normalize_phone(self, phone):
+        """ Номер для запроса; некорректный номер - ошибка 16 """
+        if not self.normalize_phones:
+            return phone
+        normalized = normalize_phone(phone)
+        if normalized is None:
+            raise ServerResponsedWithError(self.ERRORS[16], 16)
+        return normalized
 
     def find_on_stop(self, phone):
         """ Поиск номера в стоп-листе
@@ -237,7 +756,7 @@ class MobilVestApi(object):
         {"time_in" : "2014-08-29 11:07:43","description" : "descr"}
         """
         url = "find_on_stop.php"
-        params = {'phone': phone}
+        params = {'phone': self._normalize_phone(phone)}
         return self._call_api(url, params)
 
     def add_to_stop(self, phone):
@@ -247,7 +766,7 @@ class MobilVestApi(object):
         {"id" : "4419373"}
         """
         url = "add2stop.php"
-        params = {'phone': phone}
+        params = {'phone': self._normalize_phone(phone)}
         return self._call_api(url, params)
 
     def get_template(self):
@@ -306,16 +825,138 @@ class MobilVestApi(object):
         url = "stat_by_month.php"
         return self._call_api(url, params)
 
+    def stats_range(self, start, end, concurrency=4):
+        """ Статистика за несколько месяцев
+        start, end - datetime/date-объекты, первый и последний месяцы
+        concurrency - сколько месяцев запрашивать одновременно
+        Закрытые месяцы берутся из stats_cache и запрашиваются только
+        один раз. Возвращает StatsColumns, упорядоченные по дате
+        """
+        def fetch(month):
+            found, response = self.stats_cache.get(month)
+            if not found:
+                response = self.stat_by_month(month)
+                if self.stats_cache.is_closed(month):
+                    self.stats_cache.set(month, response)
+            return StatsColumns.from_response(response)
+
+        result = StatsColumns()
+        for columns in parallel_map(fetch, months_between(start, end),
+                                    concurrency):
+            result.extend(columns)
+        return result
+
     def get_operator(self, phone):
         """ Запрос оператора по номеру
         phone - Номер абонента
         Пример ответа:
         {"operator" : "AT&T"}
         """
-        params = {'phone': phone}
+        params = {'phone': self._normalize_phone(phone)}
         url = "operator.php"
         return self._call_api(url, params)
 
+    def resolve_operators(self, phones, concurrency=4):
+        """ Определение операторов для множества номеров
+        phones - итератор номеров
+        concurrency - сколько запросов выполнять одновременно
+        Номера из уже известных диапазонов определяются по
+        operator_index без запросов; из каждого неизвестного диапазона
+        на сервер уходит один номер, ответ запоминается для диапазона.
+        Если оператор этого номера не получен, весь диапазон остаётся
+        неопределённым без повторных запросов.
+        Возвращает словарь {номер: оператор}, None - если оператор
+        не определён; с normalize_phones ключи - номера в том виде,
+        в каком их передали
+        """
+        def resolve(phone):
+            try:
+                response = self.get_operator(phone)
+            except ServerResponsedWithError:
+                response = None
+            return phone, self._learn_operator(phone, response)
+
+        if self.normalize_phones:
+            phones = list(phones)
+        result, pending = self._known_operators(phones)
+        while pending:
+            keys, representatives = self._operator_ranges(pending)
+            result.update(parallel_map(resolve, representatives.values(),
+                                       concurrency))
+            pending = self._unresolved(pending, keys, representatives,
+                                       result)
+        return self._operators_by_raw(phones, result)
+
+    def _known_operators(self, phones):
+        """ Операторы номеров, известные по operator_index, и список
+        номеров, которые нужно запросить
+        """
+        result = {}
+        pending = []
+        if self.normalize_phones:
+            normalized = normalize_phones(phones)
+            for raw in normalized.rejected:
+                result[str(raw)] = None
+            phones = normalized.phones
+        for phone in unique(phones, key=str):
+            phone = str(phone)
+            operator = self.operator_index.lookup(phone)
+            if operator is None:
+                pending.append(phone)
+            else:
+                result[phone] = operator
+        return result, pending
+
+    def _operators_by_raw(self, phones, result):
+        """ С normalize_phones операторы известны по приведённым номерам:
+        результат возвращается по номерам в том виде, в каком их передали
+        (как в _merge_stopped)
+        """
+        if not self.normalize_phones:
+            return result
+        by_raw = {}
+        for raw in phones:
+            key = str(raw)
+            if key not in result:
+                key = normalize_phone(raw)
+            by_raw[str(raw)] = result.get(key)
+        return by_raw
+
+    def _operator_ranges(self, pending):
+        """ Диапазоны номеров: ключ диапазона каждого номера и первый
+        номер диапазона, который уйдёт на сервер
+        """
+        keys = {}
+        representatives = {}
+        for phone in pending:
+            keys[phone] = key = self.operator_index.range_key(phone)
+            representatives.setdefault(key, phone)
+        return keys, representatives
+
+    def _learn_operator(self, phone, response):
+        operator = (response or {}).get('operator')
+        if operator is not None:
+            self.operator_index.learn(phone, operator)
+        return operator
+
+    def _unresolved(self, pending, keys, representatives, result):
+        """ Номера, которые остались неизвестными после прохода
+        Диапазоны, номер которых не определился, не запрашиваются снова
+        """
+        failed = set(key for key, phone in representatives.items()
+                     if result[phone] is None)
+        resolved = set(representatives.values())
+        remaining = []
+        for phone in pending:
+            if phone in resolved:
+                continue
+            operator = self.operator_index.lookup(phone)
+            if operator is not None or keys[phone] in failed:
+                result[phone] = operator
+            else:
+                remaining.append(phone)
+        return remaining
+
     def get_incoming(self, date):
         """ Запрос входящих СМС
         date - datetime-объект
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import io
+import json
+import threading
+
+
+class OperatorIndex(object):
+    """ Таблица операторов по префиксам номеров, обучаемая на ответах
+    operator.php
+    Номера выделяются операторам диапазонами, поэтому ответ для одного
+    номера запоминается для всего префикса длины prefix_length
+    (по умолчанию - 7 цифр: код страны, код DEF и ещё 3 цифры).
+    Если в одном префиксе встретились разные операторы, префикс
+    помечается неоднозначным и дальше уточняется более длинными
+    префиксами, вплоть до полного номера; поиск идёт по самому длинному
+    известному префиксу.
+    Номера, перенесённые к другому оператору с сохранением номера,
+    таблица может определить неверно.
+    """
+    # запись таблицы неоднозначного префикса
+    AMBIGUOUS = (None, None)
+
+    def __init__(self, prefix_length=7):
+        self.prefix_length = prefix_length
+        self._lock = threading.Lock()
+        # префикс -> (оператор, номер, по которому он известен)
+        self._table = {}
+
+    def __len__(self):
+        return len(self._table)
+
+    def learn(self, phone, operator):
+        """ Запоминание ответа operator.php для номера """
+        with self._lock:
+            self._learn(str(phone), operator, self.prefix_length)
+
+    def _learn(self, phone, operator, length):
+        while length <= len(phone):
+            prefix = phone[:length]
+            entry = self._table.get(prefix)
+            if entry is None or length == len(phone):
+                self._table[prefix] = (operator, phone)
+                return
+            if entry[0] == operator:
+                return
+            if entry != self.AMBIGUOUS:
+                # в диапазоне два оператора: уточняем оба номера
+                self._table[prefix] = self.AMBIGUOUS
+                self._learn(entry[1], entry[0], length + 1)
+            length += 1
+
+    def _longest(self, phone):
+        for length in range(len(phone), self.prefix_length - 1, -1):
+            entry = self._table.get(phone[:length])
+            if entry is not None:
+                return length, entry
+        return None, None
+
+    def lookup(self, phone):
+        """ Оператор номера по таблице (None, если неизвестен) """
+        entry = self._longest(str(phone))[1]
+        return entry[0] if entry is not None else None
+
+    def range_key(self, phone):
+        """ Префикс, который заполнит ответ сервера для этого номера:
+        номера с одинаковым ключом достаточно запросить один раз
+        """
+        phone = str(phone)
+        length, entry = self._longest(phone)
+        if length is None:
+            return phone[:self.prefix_length]
+        return phone[:length + 1]
+
+    def save(self, path):
+        """ Сохранение таблицы в JSON-файл """
+        with self._lock:
+            data = {'prefix_length': self.prefix_length,
+                    'table': dict((k, list(v))
+                                  for k, v in self._table.items())}
+        with io.open(path, 'wb') as f:
+            f.write(json.dumps(data).encode('utf-8'))
+
+    @classmethod
+    def load(cls, path):
+        with io.open(path, 'rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+        index = cls(prefix_length=data['prefix_length'])
+        index._table = dict((k, tuple(v)) for k, v in data['table'].items())
+        return index
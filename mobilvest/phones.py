@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# coding: UTF-8
+""" Приведение номеров к виду 79XXXXXXXXX
+Принимаются номера вида +7 (912) 345-67-89, 8 912 345 67 89,
+9123456789 и т. п. Номера, которые не удаётся привести к мобильному
+номеру России, отбрасываются: сервер всё равно ответит на них
+ошибкой 16, а в пакете send_sms такой номер портит весь запрос.
+Массив номеров обрабатывается целиком: номера склеиваются в одну
+строку, из неё за один проход удаляются все символы, кроме цифр,
+регулярное выражение стирает некорректные номера, а приведение,
+отбор и удаление повторов выполняются через map, itertools и
+словарь - в Python 3 без кода на Python для каждого номера.
+"""
+
+import operator
+import re
+import sys
+from itertools import compress
+
+# всё, кроме цифр и перевода строки (разделителя номеров)
+_DELETE = bytes(bytearray(c for c in range(256)
+                          if not (48 <= c <= 57 or c == 10)))
+_INVALID = re.compile(br'^(?![78]?9[0-9]{9}$).+$', re.M)
+_LAST_10 = operator.itemgetter(slice(-10, None))
+_to_text = '%s'.__mod__
+
+
+if sys.version_info >= (3, 7):
+    def _ordered_unique(items):
+        # dict сохраняет порядок вставки
+        return list(dict.fromkeys(items))
+else:
+    def _ordered_unique(items):
+        # OrderedDict.fromkeys в Python 2 написан на Python и медленнее
+        seen = set()
+        return [item for item in items
+                if not (item in seen or seen.add(item))]
+
+
+class NormalizedPhones(object):
+    """ Результат normalize_phones
+    phones - корректные номера без повторов, в исходном порядке
+    rejected - исходные значения некорректных номеров
+    duplicates - сколько повторов отброшено
+    """
+    __slots__ = ('phones', 'rejected', 'duplicates')
+
+    def __init__(self, phones, rejected, duplicates):
+        self.phones = phones
+        self.rejected = rejected
+        self.duplicates = duplicates
+
+
+def _digits(raw):
+    """ Цифры номеров raw, по строке на номер ('' - номер некорректен) """
+    texts = list(map(_to_text, raw))
+    blob = '\n'.join(texts)
+    if blob.count('\n') != len(texts) - 1:
+        # перевод строки внутри номера: такой номер некорректен
+        blob = '\n'.join(t if '\n' not in t else '' for t in texts)
+    if not isinstance(blob, bytes):
+        blob = blob.encode('ascii', 'replace')
+    blob = _INVALID.sub(b'', blob.translate(None, _DELETE))
+    if not isinstance(blob, str):
+        blob = blob.decode('ascii')
+    return blob.split('\n') if texts else []
+
+
+def normalize_phones(phones):
+    """ Приведение массива номеров к виду 79XXXXXXXXX
+    phones - номера (строки или числа)
+    Возвращает NormalizedPhones
+    """
+    raw = list(phones)
+    digits = _digits(raw)
+    rejected = list(compress(raw, map(operator.not_, digits)))
+    valid = list(map('7'.__add__, map(_LAST_10, filter(None, digits))))
+    unique = _ordered_unique(valid)
+    return NormalizedPhones(unique, rejected, len(valid) - len(unique))
+
+
+def normalize_phone(phone):
+    """ Один номер в виде 79XXXXXXXXX (None, если номер некорректен) """
+    digits = _digits([phone])[0]
+    return '7' + digits[-10:] if digits else None
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from .mobilvest import BulkSendResult, MobilVestApi, ServerResponsedWithError
+from .records import SendResult
+from .utils import chunked, parallel_map, unique
+
+
+class NoAvailableAccount(Exception):
+    """ Все аккаунты пула исключены: мало денег или много ошибок """
+
+
+class _Account(object):
+    __slots__ = ('api', 'login', 'weight', 'balance', 'balance_at',
+                 'in_flight', 'errors', 'disabled_until', 'current')
+
+    def __init__(self, api, weight):
+        self.api = api
+        self.login = api.login
+        self.weight = weight
+        # None - баланс ещё не запрашивался
+        self.balance = None
+        self.balance_at = None
+        self.in_flight = 0
+        # ошибки подряд
+        self.errors = 0
+        self.disabled_until = None
+        # текущий вес для плавного взвешенного round-robin
+        self.current = 0
+
+
+class MobilVestPool(object):
+    """ Пул из нескольких аккаунтов mobilvest
+    Отправки распределяются между аккаунтами по стратегии strategy:
+    'round_robin' - взвешенный round-robin (аккаунт с весом 2 получает
+    вдвое больше запросов), 'least_loaded' - аккаунт с наименьшим числом
+    выполняющихся запросов на единицу веса.
+    Баланс аккаунта запрашивается через get_balance не чаще, чем раз
+    в balance_refresh секунд, а между запросами уменьшается на cost
+    из ответов send_sms. Аккаунт исключается из отправки, пока его
+    баланс меньше min_balance или после error_threshold ошибок подряд
+    (на cooldown секунд).
+    Статусы запрашиваются у того аккаунта, который отправил СМС:
+    пул помнит владельца последних max_tracked id_sms.
+    Пул можно передавать вместо MobilVestApi в StatusTracker и Spool.
+    """
+    STRATEGIES = ('round_robin', 'least_loaded')
+    # ошибки в самом запросе: другой аккаунт ответит так же
+    REQUEST_ERRORS = (3, 4, 11, 14, 16, 27)
+
+    def __init__(self, accounts=(), strategy='round_robin', min_balance=1,
+                 balance_refresh=3600, error_threshold=3, cooldown=60,
+                 max_tracked=1000000, clock=time.time):
+        """
+        accounts - MobilVestApi или пары (MobilVestApi, вес)
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError('Unknown strategy: {}'.format(strategy))
+        self.strategy = strategy
+        self.min_balance = Decimal(min_balance)
+        self.balance_refresh = balance_refresh
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.max_tracked = max_tracked
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._accounts = OrderedDict()
+        # id_sms -> логин отправившего аккаунта
+        self._owners = OrderedDict()
+        for account in accounts:
+            if isinstance(account, tuple):
+                self.add(*account)
+            else:
+                self.add(account)
+
+    def add(self, api, weight=1):
+        """ Добавление аккаунта в пул """
+        with self._lock:
+            self._accounts[api.login] = _Account(api, weight)
+
+    def account(self, login):
+        """ MobilVestApi аккаунта по логину """
+        return self._accounts[login].api
+
+    def close(self):
+        for account in list(self._accounts.values()):
+            account.api.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def refresh_balance(self, login):
+        """ Запрос баланса аккаунта у сервера, возвращает Decimal """
+        account = self._accounts[login]
+        try:
+            response = account.api.get_balance() or {}
+        except Exception:
+            self._failed(account)
+            raise
+        balance = Decimal(response.get('money') or 0)
+        with self._lock:
+            account.balance = balance
+            account.balance_at = self._clock()
+        return balance
+
+    def balances(self):
+        """ Известные балансы аккаунтов: {логин: Decimal или None} """
+        with self._lock:
+            return dict((login, account.balance)
+                        for login, account in self._accounts.items())
+
+    def _balance_is_stale(self, account):
+        return (account.balance_at is None or
+                self._clock() - account.balance_at >= self.balance_refresh)
+
+    def _is_disabled(self, account, now):
+        return account.disabled_until is not None and \
+            now < account.disabled_until
+
+    def _is_available(self, account, now):
+        return (not self._is_disabled(account, now) and
+                account.balance is not None and
+                account.balance >= self.min_balance)
+
+    def _refresh_stale(self, exclude):
+        """ Обновление устаревших балансов; запросы к серверу идут
+        по одному, остальные потоки ждут их результата
+        """
+        for account in list(self._accounts.values()):
+            if (account.login in exclude or
+                    self._is_disabled(account, self._clock()) or
+                    not self._balance_is_stale(account)):
+                continue
+            with self._refresh_lock:
+                # баланс мог обновить другой поток
+                if not self._balance_is_stale(account):
+                    continue
+                try:
+                    self.refresh_balance(account.login)
+                except Exception:
+                    pass
+
+    def _acquire(self, exclude=()):
+        """ Выбор аккаунта для отправки (увеличивает его in_flight) """
+        self._refresh_stale(exclude)
+        with self._lock:
+            now = self._clock()
+            candidates = [a for a in self._accounts.values()
+                          if a.login not in exclude and
+                          self._is_available(a, now)]
+            if not candidates:
+                raise NoAvailableAccount('No account available for sending')
+            if self.strategy == 'least_loaded':
+                account = min(candidates,
+                              key=lambda a: float(a.in_flight) / a.weight)
+            else:
+                # плавный взвешенный round-robin (как в nginx)
+                total = 0
+                for candidate in candidates:
+                    candidate.current += candidate.weight
+                    total += candidate.weight
+                account = max(candidates, key=lambda a: a.current)
+                account.current -= total
+            account.in_flight += 1
+            return account
+
+    def _failed(self, account):
+        with self._lock:
+            account.errors += 1
+            if account.errors >= self.error_threshold:
+                account.disabled_until = self._clock() + self.cooldown
+                account.errors = 0
+
+    def _succeeded(self, account, response):
+        cost = Decimal(0)
+        owners = []
+        for item in (response or {}).values():
+            if isinstance(item, dict):
+                cost += Decimal(item.get('cost') or 0)
+                if item.get('id_sms'):
+                    owners.append(str(item['id_sms']))
+        with self._lock:
+            account.errors = 0
+            account.disabled_until = None
+            if account.balance is not None:
+                account.balance -= cost
+            for id_sms in owners:
+                self._owners[id_sms] = account.login
+            while len(self._owners) > self.max_tracked:
+                self._owners.popitem(last=False)
+
+    def send_sms(self, phone, text, sender, typed=False):
+        """ Отправка СМС через один из аккаунтов (см.
+        MobilVestApi.send_sms)
+        Если сервер отверг запрос из-за аккаунта (например,
+        отправитель не одобрен), запрос повторяется через другой
+        аккаунт. Обрыв связи не повторяется: СМС могла уйти.
+        """
+        tried = set()
+        while True:
+            account = self._acquire(tried)
+            tried.add(account.login)
+            try:
+                response = account.api.send_sms(phone, text, sender)
+            except ServerResponsedWithError as e:
+                if e.code in self.REQUEST_ERRORS:
+                    raise
+                self._failed(account)
+                if len(tried) >= len(self._accounts):
+                    raise
+                continue
+            except Exception:
+                self._failed(account)
+                raise
+            finally:
+                with self._lock:
+                    account.in_flight -= 1
+            self._succeeded(account, response)
+            return SendResult.from_response(response) if typed else response
+
+    def send_bulk(self, phones, text, sender, concurrency=4):
+        """ Массовая отправка через аккаунты пула (см.
+        MobilVestApi.send_bulk)
+        """
+        def send_chunk(chunk):
+            try:
+                return chunk, self.send_sms(chunk, text, sender), None
+            except Exception as e:
+                return chunk, None, e
+
+        result = BulkSendResult()
+        chunks = chunked(unique(phones), MobilVestApi.MAX_PHONES_PER_SMS)
+        for chunk, response, error in parallel_map(send_chunk, chunks,
+                                                   concurrency):
+            if error is not None:
+                result.errors.append((chunk, error))
+            else:
+                result.merge(response)
+        return result
+
+    def owner(self, id_sms):
+        """ Логин аккаунта, отправившего СМС (None, если неизвестен) """
+        with self._lock:
+            return self._owners.get(str(id_sms))
+
+    def assign(self, id_sms, login):
+        """ Запоминание владельца СМС (например, после перезапуска) """
+        with self._lock:
+            self._owners[str(id_sms)] = login
+
+    def get_status(self, state, typed=False):
+        """ Запрос статусов у аккаунтов, отправивших СМС
+        state - ID СМС или список ID
+        Для ID с неизвестным владельцем бросается KeyError
+        """
+        ids = state if isinstance(state, list) else [state]
+        groups = OrderedDict()
+        with self._lock:
+            for id_sms in ids:
+                login = self._owners.get(str(id_sms))
+                if login is None:
+                    raise KeyError('Unknown id_sms: {}'.format(id_sms))
+                groups.setdefault(login, []).append(id_sms)
+
+        def fetch(item):
+            login, group = item
+            return self._accounts[login].api.get_status(group, typed)
+
+        if len(groups) == 1:
+            return fetch(list(groups.items())[0])
+        result = [] if typed else {}
+        for response in parallel_map(fetch, groups.items(), len(groups)):
+            if typed:
+                result.extend(response or [])
+            else:
+                result.update(response or {})
+        return result if typed or result else None
+
+    def stats(self):
+        """ Состояние аккаунтов: {логин: {balance, in_flight, errors,
+        available}}
+        """
+        with self._lock:
+            now = self._clock()
+            return dict((login, {
+                'balance': account.balance,
+                'in_flight': account.in_flight,
+                'errors': account.errors,
+                'available': self._is_available(account, now),
+            }) for login, account in self._accounts.items())
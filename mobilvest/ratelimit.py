@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import threading
+import time
+
+
+class TokenBucket(object):
+    """ Ограничение частоты: rate запросов в секунду,
+    с допустимым всплеском до burst запросов подряд
+    """
+
+    def __init__(self, rate, burst=None, clock=time.time, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = clock()
+
+    def reserve(self):
+        """ Резервирование одного запроса, возвращает, сколько секунд
+        нужно подождать до его выполнения
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        """ Ожидание разрешения на запрос """
+        delay = self.reserve()
+        if delay > 0:
+            self._sleep(delay)
+        return delay
+
+
+class ConcurrencyController(object):
+    """ Ограничение числа одновременных запросов по схеме AIMD
+    Пока запросы проходят успешно и быстрее latency_threshold,
+    лимит растёт примерно на единицу за "круг" запросов;
+    при ошибке или медленном ответе лимит умножается на decrease.
+    """
+
+    def __init__(self, initial=8, minimum=1, maximum=64, decrease=0.5,
+                 latency_threshold=None):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.latency_threshold = latency_threshold
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            self.waiting += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    self._condition.wait()
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    def release(self, success=True, latency=None):
+        with self._condition:
+            self.in_flight -= 1
+            slow = (self.latency_threshold is not None and
+                    latency is not None and
+                    latency > self.latency_threshold)
+            if success and not slow:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            else:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+            self._condition.notify_all()
+
+
+class RateLimiter(object):
+    """ Ограничитель запросов к API, общий для всех потоков
+    rates - словарь {адрес php страницы: запросов в секунду}
+    default_rate - частота для остальных страниц (None - без ограничения)
+    concurrency - ConcurrencyController (None - без ограничения)
+    Неудачей для ConcurrencyController считаются исключения при запросе
+    (таймауты, ответы 5xx, которые не разбираются как JSON) и ошибки
+    сервера из BACKOFF_ERRORS.
+    """
+    BACKOFF_ERRORS = (12, 25)
+
+    def __init__(self, rates=None, default_rate=None, concurrency=None,
+                 clock=time.time, sleep=time.sleep):
+        self._buckets = dict((url, TokenBucket(rate, clock=clock,
+                                               sleep=sleep))
+                             for url, rate in (rates or {}).items())
+        self._default = None
+        if default_rate is not None:
+            self._default = TokenBucket(default_rate, clock=clock,
+                                        sleep=sleep)
+        self.concurrency = concurrency
+        self.waiting = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, url):
+        """ Ожидание разрешения на запрос к странице url """
+        bucket = self._buckets.get(url, self._default)
+        with self._lock:
+            self.waiting += 1
+        try:
+            if bucket is not None:
+                bucket.acquire()
+            if self.concurrency is not None:
+                self.concurrency.acquire()
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def release(self, url, response, latency):
+        """ Завершение запроса
+        response - ответ сервера (None, если запрос не удался)
+        latency - длительность запроса в секундах
+        """
+        if self.concurrency is None:
+            return
+        success = response is not None and not (
+            isinstance(response, dict) and
+            response.get('error') in self.BACKOFF_ERRORS)
+        self.concurrency.release(success, latency)
+
+    def stats(self):
+        """ Текущее состояние: частоты, лимит параллельности и
+        количество запросов, ожидающих разрешения
+        """
+        result = {
+            'rates': dict((url, b.rate) for url, b in self._buckets.items()),
+            'default_rate': self._default and self._default.rate,
+            'waiting': self.waiting,
+        }
+        if self.concurrency is not None:
+            result['concurrency_limit'] = int(self.concurrency.limit)
+            result['in_flight'] = self.concurrency.in_flight
+        return result
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# coding: UTF-8
+""" Типизированные записи ответов API
+Методы MobilVestApi по умолчанию возвращают ответ сервера как есть -
+словари строк. Для больших выгрузок (статусы, базы номеров) это
+дорого по памяти, а числа приходится разбирать заново. Записи ниже
+хранят поля в __slots__ и уже разобранными: номера и коды ошибок -
+int, стоимость - Decimal, даты - datetime.date.
+Включаются параметром typed=True у send_sms, get_status, get_phone
+и iter_phones.
+"""
+
+import datetime
+from decimal import Decimal
+
+
+def _parse_date(value):
+    """ 'YYYY-MM-DD' -> datetime.date, '0000-00-00' и мусор -> None """
+    try:
+        return datetime.date(*map(int, value.split('-')))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _parse_phone(value):
+    """ Номер из цифр -> int; иначе строка как есть (номера, отвергнутые
+    при приведении normalize_phones, остаются в том виде, в каком их
+    передали)
+    """
+    value = str(value)
+    return int(value) if value.isdigit() else value
+
+
+def _parse_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class _Record(object):
+    """ Общие методы записей: сравнение, repr, as_dict и pickle """
+    __slots__ = ()
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                all(getattr(self, name) == getattr(other, name)
+                    for name in self.__slots__))
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(name, getattr(self, name))
+            for name in self.__slots__))
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+class SendResult(_Record):
+    """ Результат отправки СМС на один номер
+    phone - номер (int; строка, если номер передан не одними цифрами)
+    error - код ошибки (0 - принято сервером)
+    id_sms - ID СМС (None при ошибке)
+    cost - стоимость (Decimal, None при ошибке)
+    count_sms - количество частей
+    """
+    __slots__ = ('phone', 'error', 'id_sms', 'cost', 'count_sms')
+
+    def __init__(self, phone, error, id_sms=None, cost=None, count_sms=0):
+        self.phone = phone
+        self.error = error
+        self.id_sms = id_sms
+        self.cost = cost
+        self.count_sms = count_sms
+
+    @property
+    def ok(self):
+        return self.error == 0
+
+    @classmethod
+    def from_item(cls, phone, item):
+        cost = item.get('cost')
+        return cls(_parse_phone(phone), _parse_int(item.get('error'), None),
+                   item.get('id_sms'),
+                   Decimal(cost) if cost is not None else None,
+                   _parse_int(item.get('count_sms')))
+
+    @classmethod
+    def from_response(cls, response):
+        """ Ответ send_sms -> список SendResult """
+        return [cls.from_item(phone, item)
+                for phone, item in (response or {}).items()]
+
+
+class StatusEntry(_Record):
+    """ Статус одной СМС
+    id_sms - ID СМС (строка: ID длиннее 64 бит)
+    status - статус ('deliver', 'not_deliver', 'expired', ...)
+    """
+    __slots__ = ('id_sms', 'status')
+
+    def __init__(self, id_sms, status):
+        self.id_sms = id_sms
+        self.status = status
+
+    @property
+    def delivered(self):
+        return self.status == 'deliver'
+
+    @classmethod
+    def from_response(cls, response):
+        """ Ответ get_status -> список StatusEntry """
+        return [cls(str(id_sms), status)
+                for id_sms, status in (response or {}).items()]
+
+
+class PhoneRecord(_Record):
+    """ Номер из базы
+    phone - номер (int)
+    date_birth - datetime.date (None, если не указана)
+    остальные поля - строки, как в ответе get_phone
+    """
+    __slots__ = ('phone', 'name', 'last_name', 'middle_name', 'date_birth',
+                 'male', 'note1', 'note2', 'region', 'operator')
+
+    def __init__(self, phone, name='', last_name='', middle_name='',
+                 date_birth=None, male='', note1='', note2='', region='',
+                 operator=''):
+        self.phone = phone
+        self.name = name
+        self.last_name = last_name
+        self.middle_name = middle_name
+        self.date_birth = date_birth
+        self.male = male
+        self.note1 = note1
+        self.note2 = note2
+        self.region = region
+        self.operator = operator
+
+    @classmethod
+    def from_item(cls, phone, item):
+        get = item.get
+        return cls(int(phone), get('name', ''), get('last_name', ''),
+                   get('middle_name', ''), _parse_date(get('date_birth')),
+                   get('male', ''), get('note1', ''), get('note2', ''),
+                   get('region', ''), get('operator', ''))
+
+    @classmethod
+    def from_response(cls, response):
+        """ Ответ get_phone -> список PhoneRecord """
+        return [cls.from_item(phone, item)
+                for phone, item in (response or {}).items()]
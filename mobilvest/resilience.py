@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import random
+import threading
+import time
+from requests.exceptions import ConnectTimeout
+from urllib3.exceptions import ConnectTimeoutError
+
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+
+class CircuitOpenError(Exception):
+    """ Запрос не выполнен: сервер считается недоступным
+    (CircuitBreaker в состоянии open)
+    """
+
+
+class CircuitBreaker(object):
+    """ Быстрый отказ во время недоступности сервера
+    После failure_threshold сбоев подряд (исключения транспорта:
+    таймауты, обрывы, ответы не в JSON) выключатель размыкается,
+    и запросы сразу завершаются CircuitOpenError. Через reset_timeout
+    секунд пропускается один пробный запрос: успех замыкает
+    выключатель, сбой размыкает его снова.
+    Ответ сервера с кодом ошибки считается успехом - сервер работает.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30,
+                 clock=time.time):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """ Разрешение на запрос; бросает CircuitOpenError """
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return
+        raise CircuitOpenError('Circuit is open: server is unavailable')
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._trial = False
+
+
+def request_not_sent(exception):
+    """ Известно ли, что запрос не дошёл до сервера: соединение
+    не было установлено (отказ в соединении, таймаут подключения)
+    """
+    if isinstance(exception, ConnectTimeout):
+        return True
+    reason = getattr(exception.args[0] if exception.args else None,
+                     'reason', None)
+    return isinstance(reason, ConnectTimeoutError)
+
+
+class ResiliencePolicy(object):
+    """ Таймауты, повторы, выключатель и дублирующие запросы
+    для MobilVestApi (только для синхронного клиента)
+    timeouts - {адрес php страницы: таймаут в секундах}
+    default_timeout - таймаут остальных страниц (None - таймаут
+    транспорта)
+    retries - сколько раз повторять безопасный запрос
+    backoff, max_backoff - пауза перед повтором: случайная величина
+    от 0 до min(max_backoff, backoff * 2 ** номер повтора)
+    breaker - CircuitBreaker (None - без выключателя)
+    hedge - {страница чтения: задержка в секундах}: если ответа нет
+    дольше задержки, отправляется второй такой же запрос и берётся
+    первый из ответов
+    Повторяются только запросы чтения (READ_PAGES) - после сбоя
+    транспорта или ошибки из RETRY_ERRORS. У send.php и прочих
+    изменяющих запросов нет ключа идемпотентности, поэтому они
+    повторяются, только если соединение не было установлено.
+    """
+    READ_PAGES = frozenset([
+        'balance.php', 'base.php', 'senders.php', 'phone.php', 'status.php',
+        'find_on_stop.php', 'template.php', 'stat_by_month.php',
+        'operator.php', 'incoming.php'])
+    RETRY_ERRORS = (12, 25)
+
+    def __init__(self, timeouts=None, default_timeout=None, retries=2,
+                 backoff=0.2, max_backoff=5, breaker=None, hedge=None,
+                 sleep=time.sleep, random=random.random):
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker
+        # дублировать можно только запросы чтения
+        self.hedge = dict((url, delay)
+                          for url, delay in (hedge or {}).items()
+                          if url in self.READ_PAGES)
+        self._sleep = sleep
+        self._random = random
+
+    def timeout(self, url):
+        return self.timeouts.get(url, self.default_timeout)
+
+    def backoff_delay(self, attempt):
+        return self._random() * min(self.max_backoff,
+                                    self.backoff * 2 ** attempt)
+
+    def should_retry(self, url, exception):
+        code = getattr(exception, 'code', None)
+        if isinstance(exception, CircuitOpenError):
+            return False
+        if url in self.READ_PAGES:
+            return code is None or code in self.RETRY_ERRORS
+        return code is None and request_not_sent(exception)
+
+    def call(self, url, attempt, timings):
+        """ Выполнение запроса с повторами
+        attempt(timings) - одна попытка запроса
+        """
+        retry = 0
+        while True:
+            try:
+                return self._call_once(url, attempt, timings)
+            except Exception as e:
+                if retry >= self.retries or not self.should_retry(url, e):
+                    raise
+            started = time.time()
+            self._sleep(self.backoff_delay(retry))
+            timings['retry'] = timings.get('retry', 0) + \
+                time.time() - started
+            retry += 1
+
+    def _call_once(self, url, attempt, timings):
+        if self.breaker is not None:
+            self.breaker.allow()
+        try:
+            if url in self.hedge:
+                result = self._hedged(attempt, self.hedge[url], timings)
+            else:
+                result = attempt(timings)
+        except Exception as e:
+            if self.breaker is not None:
+                if getattr(e, 'code', None) is None:
+                    self.breaker.failure()
+                else:
+                    self.breaker.success()
+            raise
+        if self.breaker is not None:
+            self.breaker.success()
+        return result
+
+    def _hedged(self, attempt, delay, timings):
+        """ Первый успешный из двух одинаковых запросов; второй
+        отправляется, если первый не ответил за delay секунд
+        """
+        results = Queue()
+
+        def run():
+            own_timings = {}
+            try:
+                results.put((attempt(own_timings), None, own_timings))
+            except Exception as e:
+                results.put((None, e, own_timings))
+
+        def start():
+            thread = threading.Thread(target=run)
+            thread.daemon = True
+            thread.start()
+
+        start()
+        try:
+            outcome = results.get(timeout=delay)
+            started = 1
+        except Empty:
+            start()
+            started = 2
+            outcome = results.get()
+        if outcome[1] is not None and started == 2:
+            # первый ответ - ошибка: ждём второй
+            outcome = results.get()
+        result, error, own_timings = outcome
+        for phase, seconds in own_timings.items():
+            timings[phase] = timings.get(phase, 0) + seconds
+        if error is not None:
+            raise error
+        return result
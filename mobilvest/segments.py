@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import threading
+import time
+from decimal import Decimal
+
+# основная таблица GSM 03.38 (символ ESC не входит)
+GSM7_BASIC = frozenset(
+    u'@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    u'¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà')
+# расширенная таблица: такие символы занимают два септета
+GSM7_EXTENDED = frozenset(u'\x0c^{}\\[~]|€')
+
+# (длина одной СМС, длина части составной СМС)
+LIMITS = {'gsm7': (160, 153), 'ucs2': (70, 67)}
+
+
+def _units(text):
+    """ Кодировка текста и длины его символов в единицах кодировки
+    (септеты GSM-7 или 16-битные слова UCS-2)
+    """
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    units = []
+    for char in text:
+        if char in GSM7_BASIC:
+            units.append(1)
+        elif char in GSM7_EXTENDED:
+            units.append(2)
+        else:
+            # символы вне BMP кодируются суррогатной парой
+            return 'ucs2', [2 if ord(c) > 0xFFFF else 1 for c in text]
+    return 'gsm7', units
+
+
+def count_parts(text):
+    """ Сколько частей займёт СМС
+    Возвращает (кодировка, длина, количество частей): кодировка -
+    'gsm7' или 'ucs2', длина - в септетах или 16-битных словах.
+    Символ расширенной таблицы GSM-7 и суррогатная пара UCS-2
+    не разрываются между частями.
+    """
+    encoding, units = _units(text)
+    length = sum(units)
+    single, multi = LIMITS[encoding]
+    if length <= single:
+        return encoding, length, 1 if length else 0
+    parts, used = 1, 0
+    for size in units:
+        if used + size > multi:
+            parts += 1
+            used = 0
+        used += size
+    return encoding, length, parts
+
+
+class InsufficientFunds(Exception):
+    """ Оценочная стоимость рассылки больше баланса
+    cost - оценка стоимости, balance - известный баланс
+    """
+
+    def __init__(self, cost, balance):
+        super(InsufficientFunds, self).__init__(
+            "Estimated cost {} exceeds balance {}".format(cost, balance))
+        self.cost = cost
+        self.balance = balance
+
+
+class CostEstimator(object):
+    """ Оценка стоимости рассылки без запросов к серверу
+    Подключается через MobilVestApi.add_observer: цена одной части
+    узнаётся из ответов send_sms (берётся наибольшая цена части - цена
+    зависит от оператора, а для проверки средств лучше переоценить),
+    баланс - из ответов get_balance, и между ними уменьшается на cost
+    отправленных СМС. Баланс запрашивается заново, если ему больше
+    balance_ttl секунд.
+    price - известная заранее цена части (Decimal)
+    """
+
+    def __init__(self, price=None, balance_ttl=300, clock=time.time):
+        self.price = Decimal(price) if price is not None else None
+        self.balance_ttl = balance_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._balance = None
+        self._balance_at = None
+        # text -> количество частей для повторяющихся текстов
+        self._parts = {}
+
+    def after_response(self, url, params, response, result, timings):
+        if url == 'balance.php' and result:
+            self.set_balance(result.get('money') or 0)
+        elif url == 'send.php':
+            self.learn(result)
+
+    def learn(self, response):
+        """ Учёт ответа send_sms: цена части и расход баланса """
+        spent = Decimal(0)
+        price = None
+        for item in (response or {}).values():
+            if not isinstance(item, dict) or str(item.get('error')) != '0':
+                continue
+            cost = Decimal(item.get('cost') or 0)
+            parts = int(item.get('count_sms') or 0)
+            spent += cost
+            if parts:
+                item_price = cost / parts
+                if price is None or item_price > price:
+                    price = item_price
+        with self._lock:
+            if price is not None and (self.price is None or
+                                      price > self.price):
+                self.price = price
+            if self._balance is not None:
+                self._balance -= spent
+
+    def set_balance(self, balance):
+        with self._lock:
+            self._balance = Decimal(balance)
+            self._balance_at = self._clock()
+
+    def balance(self, api=None):
+        """ Известный баланс (Decimal или None)
+        api - клиент для запроса баланса, если известный устарел
+        """
+        with self._lock:
+            stale = (self._balance_at is None or
+                     self._clock() - self._balance_at >= self.balance_ttl)
+        if stale and api is not None:
+            response = api.get_balance() or {}
+            # если оценщик подключён к api, баланс уже обновлён
+            self.set_balance(response.get('money') or 0)
+        return self._balance
+
+    def parts(self, text):
+        """ Количество частей СМС с текстом text """
+        parts = self._parts.get(text)
+        if parts is None:
+            parts = count_parts(text)[2]
+            if len(self._parts) < 1024:
+                self._parts[text] = parts
+        return parts
+
+    def estimate(self, text, count=1):
+        """ Стоимость отправки text на count номеров (Decimal)
+        Бросает ValueError, если цена части ещё неизвестна
+        """
+        if self.price is None:
+            raise ValueError('Price per part is unknown: pass price or '
+                             'send a message first')
+        return self.price * self.parts(text) * count
+
+    def split(self, phones, text, api=None):
+        """ Разделение рассылки на номера, на которые хватает баланса,
+        и остальные: возвращает два списка
+        """
+        phones = list(phones)
+        balance = self.balance(api)
+        if balance is None:
+            raise ValueError('Balance is unknown: pass api')
+        cost = self.estimate(text)
+        if not cost:
+            return phones, []
+        affordable = max(0, int(balance // cost))
+        return phones[:affordable], phones[affordable:]
+
+    def check(self, phones, text, api=None):
+        """ Проверка, что на рассылку хватает средств; возвращает
+        оценку стоимости или бросает InsufficientFunds
+        """
+        phones = list(phones)
+        balance = self.balance(api)
+        if balance is None:
+            raise ValueError('Balance is unknown: pass api')
+        cost = self.estimate(text, len(phones))
+        if cost > balance:
+            raise InsufficientFunds(cost, balance)
+        return cost
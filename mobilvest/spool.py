@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import threading
+import time
+import uuid
+from .mobilvest import ServerResponsedWithError
+from .storage import SqliteStorage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT UNIQUE,
+    phone TEXT NOT NULL,
+    text TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    batch TEXT,
+    id_sms TEXT,
+    cost TEXT,
+    count_sms INTEGER,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_state
+    ON messages (state, sender, text, id);
+CREATE INDEX IF NOT EXISTS messages_batch ON messages (batch);
+"""
+
+
+class Spool(SqliteStorage):
+    """ Очередь исходящих СМС в файле SQLite
+    Постановка в очередь - одна вставка в локальную базу, сервер при
+    этом не вызывается. Обработчики (drain, run) забирают сообщения
+    пакетами до 50 номеров с одинаковыми отправителем и текстом,
+    отправляют их через send_sms и записывают id_sms, стоимость и ошибки.
+    Состояния сообщения:
+    pending - ждёт отправки
+    sending - отправляется
+    sent - принято сервером
+    failed - отвергнуто сервером (код ошибки - в error)
+    unknown - неизвестно, дошёл ли запрос до сервера (обрыв связи,
+    аварийное завершение процесса во время отправки); такие сообщения
+    не отправляются повторно автоматически, см. requeue_unknown
+    key - ключ идемпотентности: сообщение с уже известным ключом
+    повторно в очередь не ставится.
+    Очередь рассчитана на один обрабатывающий процесс.
+    """
+    BATCH_SIZE = 50
+    SCHEMA = SCHEMA
+    TEXT_FACTORY = str
+
+    def enqueue(self, phone, text, sender, key=None):
+        """ Постановка сообщения в очередь
+        Возвращает False, если сообщение с таким key уже было
+        """
+        return self.enqueue_many([(phone, text, sender, key)]) == 1
+
+    def enqueue_many(self, messages):
+        """ Постановка в очередь в одной транзакции
+        messages - итератор кортежей (phone, text, sender, key)
+        Возвращает количество добавленных сообщений
+        """
+        now = time.time()
+        rows = [(key, str(phone), text, sender, now, now)
+                for phone, text, sender, key in messages]
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO messages '
+                '(key, phone, text, sender, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?)', rows)
+            return conn.total_changes - before
+
+    def _claim(self):
+        """ Захват очередного пакета: возвращает (batch, sender, text,
+        [(id, phone), ...]) или None, если очередь пуста
+        """
+        with self._transaction('BEGIN IMMEDIATE') as conn:
+            first = conn.execute(
+                "SELECT sender, text FROM messages WHERE state = 'pending'"
+                " ORDER BY id LIMIT 1").fetchone()
+            if first is None:
+                return None
+            sender, text = first
+            rows = conn.execute(
+                "SELECT id, phone FROM messages WHERE state = 'pending'"
+                " AND sender = ? AND text = ? ORDER BY id LIMIT ?",
+                (sender, text, self.BATCH_SIZE * 2)).fetchall()
+            # в одном запросе номер может быть только один раз
+            claimed, phones = [], set()
+            for row_id, phone in rows:
+                if phone not in phones and len(claimed) < self.BATCH_SIZE:
+                    phones.add(phone)
+                    claimed.append((row_id, phone))
+            batch = uuid.uuid4().hex
+            conn.executemany(
+                "UPDATE messages SET state = 'sending', batch = ?, "
+                "updated = ? WHERE id = ?",
+                [(batch, time.time(), row_id) for row_id, _ in claimed])
+        return batch, sender, text, claimed
+
+    def _record(self, claimed, response=None, error=None, state=None):
+        now = time.time()
+        updates = []
+        for row_id, phone in claimed:
+            item = (response or {}).get(phone)
+            if state is not None:
+                updates.append((state, None, None, None, error, now, row_id))
+            elif isinstance(item, dict) and str(item.get('error')) == '0':
+                updates.append(('sent', item.get('id_sms'), item.get('cost'),
+                                item.get('count_sms'), None, now, row_id))
+            else:
+                code = item.get('error') if isinstance(item, dict) else None
+                updates.append(('failed', None, None, None,
+                                None if code is None else str(code),
+                                now, row_id))
+        with self._transaction() as conn:
+            conn.executemany(
+                'UPDATE messages SET state = ?, id_sms = ?, cost = ?, '
+                'count_sms = ?, error = ?, updated = ? WHERE id = ?',
+                updates)
+
+    def process_batch(self, api):
+        """ Отправка одного пакета, возвращает количество сообщений
+        в нём (0 - очередь пуста)
+        """
+        claimed = self._claim()
+        if claimed is None:
+            return 0
+        batch, sender, text, claimed = claimed
+        phones = [phone for _, phone in claimed]
+        try:
+            response = api.send_sms(phones, text, sender)
+        except ServerResponsedWithError as e:
+            self._record(claimed, error=str(e.code), state='failed')
+        except Exception as e:
+            self._record(claimed, error=repr(e), state='unknown')
+        else:
+            self._record(claimed, response)
+        return len(claimed)
+
+    def recover(self):
+        """ Перевод сообщений, отправка которых была прервана
+        (например, аварийным завершением процесса), в состояние unknown
+        Вызывается перед запуском обработчиков.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE messages SET state = 'unknown', updated = ? "
+                "WHERE state = 'sending'", (time.time(),))
+            return cursor.rowcount
+
+    def requeue_unknown(self):
+        """ Повторная постановка в очередь сообщений в состоянии unknown
+        (после сверки со статистикой сервера)
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE messages SET state = 'pending', batch = NULL, "
+                "updated = ? WHERE state = 'unknown'", (time.time(),))
+            return cursor.rowcount
+
+    def _worker(self, api, stop_event, poll_interval):
+        while not stop_event.is_set():
+            if self.process_batch(api) == 0:
+                if poll_interval is None:
+                    return
+                stop_event.wait(poll_interval)
+
+    def run(self, api, workers=4, poll_interval=1.0, stop_event=None):
+        """ Обработка очереди в workers потоках
+        poll_interval - пауза при пустой очереди; None - завершиться,
+        когда очередь опустеет
+        stop_event - threading.Event для остановки обработчиков
+        """
+        self.recover()
+        if stop_event is None:
+            stop_event = threading.Event()
+        threads = [threading.Thread(target=self._worker,
+                                    args=(api, stop_event, poll_interval))
+                   for _ in range(workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def drain(self, api, workers=4):
+        """ Отправка всей очереди, возвращает stats() """
+        self.run(api, workers=workers, poll_interval=None)
+        return self.stats()
+
+    def stats(self):
+        """ Количество сообщений по состояниям """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT state, COUNT(*) FROM messages GROUP BY state')
+            return dict(rows.fetchall())
+
+    def get(self, key):
+        """ Состояние сообщения по ключу идемпотентности: словарь
+        с полями state, id_sms, cost, count_sms, error (None, если нет)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT state, id_sms, cost, count_sms, error '
+                'FROM messages WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('state', 'id_sms', 'cost', 'count_sms', 'error'),
+                        row))
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+from array import array
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+class StatsColumns(object):
+    """ Статистика stat_by_month в виде колонок
+    date - список datetime.date
+    status - список статусов ('deliver', 'not_deliver', ...)
+    cost - array('d') стоимостей
+    parts - array('l') количества частей СМС
+    Суммирование по array выполняется без создания объектов на
+    каждую строку, поэтому агрегаты за годы считаются быстро.
+    """
+    __slots__ = ('date', 'status', 'cost', 'parts')
+
+    def __init__(self):
+        self.date = []
+        self.status = []
+        self.cost = array('d')
+        self.parts = array('l')
+
+    def __len__(self):
+        return len(self.date)
+
+    def append(self, date, status, cost, parts):
+        self.date.append(date)
+        self.status.append(status)
+        self.cost.append(float(cost))
+        self.parts.append(int(parts))
+
+    def extend(self, other):
+        self.date.extend(other.date)
+        self.status.extend(other.status)
+        self.cost.extend(other.cost)
+        self.parts.extend(other.parts)
+
+    @classmethod
+    def from_response(cls, response):
+        """ Разбор ответа stat_by_month (строки упорядочены по дате) """
+        columns = cls()
+        for day in sorted(response or {}):
+            # без strptime: быстрее и безопасно в потоках Python 2
+            date = datetime.date(*map(int, day.split('-')))
+            for status in sorted(response[day]):
+                item = response[day][status]
+                columns.append(date, status, item.get('cost') or 0,
+                               item.get('parts') or 0)
+        return columns
+
+    def rows(self):
+        """ Итератор по строкам (date, status, cost, parts) """
+        return zip(self.date, self.status, self.cost, self.parts)
+
+    def total_cost(self):
+        return sum(self.cost)
+
+    def total_parts(self):
+        return sum(self.parts)
+
+    def by_status(self):
+        """ Итоги по статусам: {status: (стоимость, части)} """
+        result = {}
+        for status, cost, parts in zip(self.status, self.cost, self.parts):
+            total = result.get(status, (0.0, 0))
+            result[status] = (total[0] + cost, total[1] + parts)
+        return result
+
+
+class MonthStatsCache(object):
+    """ Кэш статистики закрытых месяцев
+    Статистика месяца считается окончательной, когда с его конца
+    прошло settle_days дней (статусы последних СМС месяца
+    приходят с задержкой). Такие месяцы больше не запрашиваются.
+    directory - каталог для хранения между перезапусками
+    (по умолчанию - только в памяти); файл месяца записывается
+    во временный файл и подменяется целиком, поэтому прерванная
+    запись не оставляет обрезанный JSON
+    """
+
+    def __init__(self, directory=None, settle_days=3):
+        self.directory = directory
+        self.settle_days = settle_days
+        self._months = {}
+        self._lock = threading.Lock()
+
+    def is_closed(self, month, today=None):
+        today = today or datetime.date.today()
+        next_month = (month.replace(day=28) +
+                      datetime.timedelta(days=4)).replace(day=1)
+        return today >= next_month + datetime.timedelta(days=self.settle_days)
+
+    def _path(self, key):
+        return os.path.join(self.directory, 'stat_by_month-%s.json' % key)
+
+    def get(self, month):
+        """ Ответ stat_by_month из кэша, (найден ли, ответ) """
+        key = month.strftime('%Y-%m')
+        with self._lock:
+            if key in self._months:
+                return True, self._months[key]
+        if self.directory is not None and os.path.exists(self._path(key)):
+            with io.open(self._path(key), 'rb') as f:
+                response = json.loads(f.read().decode('utf-8'))
+            with self._lock:
+                self._months[key] = response
+            return True, response
+        return False, None
+
+    def set(self, month, response):
+        key = month.strftime('%Y-%m')
+        if self.directory is not None:
+            self._write(self._path(key), response)
+        with self._lock:
+            self._months[key] = response
+
+    def _write(self, path, response):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with io.open(fd, 'wb') as f:
+                f.write(json.dumps(response).encode('utf-8'))
+            _replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+
+def months_between(start, end):
+    """ Первые числа всех месяцев от start до end включительно """
+    month = datetime.date(start.year, start.month, 1)
+    last = datetime.date(end.year, end.month, 1)
+    while month <= last:
+        yield month
+        month = (month + datetime.timedelta(days=32)).replace(day=1)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import io
+import re
+import threading
+
+_NOT_DIGITS = re.compile(r'\D')
+
+
+class StopList(object):
+    """ Локальная копия стоп-листа
+    Номера хранятся как целые числа в множестве: проверка - O(1),
+    а память - несколько десятков байт на номер.
+    Наполняется по ответам find_on_stop, add_to_stop и send_sms
+    (ошибка 13), а также из файла (один номер в строке).
+    Список может не знать о части номеров в стоп-листе сервера,
+    но номер из списка сервер гарантированно отвергнет.
+    """
+
+    def __init__(self, phones=()):
+        self._phones = set()
+        self._lock = threading.Lock()
+        self.update(phones)
+
+    @staticmethod
+    def _key(phone):
+        digits = _NOT_DIGITS.sub('', str(phone))
+        return int(digits) if digits else None
+
+    def add(self, phone):
+        key = self._key(phone)
+        if key is not None:
+            with self._lock:
+                self._phones.add(key)
+
+    def discard(self, phone):
+        key = self._key(phone)
+        with self._lock:
+            self._phones.discard(key)
+
+    def update(self, phones):
+        keys = set(self._key(p) for p in phones)
+        keys.discard(None)
+        with self._lock:
+            self._phones.update(keys)
+
+    def __contains__(self, phone):
+        return self._key(phone) in self._phones
+
+    def __len__(self):
+        return len(self._phones)
+
+    def filter(self, phones):
+        """ Разделение номеров на пару списков (разрешённые, в стоп-листе) """
+        allowed, stopped = [], []
+        for phone in phones:
+            (stopped if phone in self else allowed).append(phone)
+        return allowed, stopped
+
+    def learn_send_result(self, response):
+        """ Добавление номеров, отвергнутых send_sms с ошибкой 13 """
+        for phone, item in (response or {}).items():
+            if isinstance(item, dict) and str(item.get('error')) == '13':
+                self.add(phone)
+
+    @classmethod
+    def load(cls, path):
+        """ Загрузка из текстового файла: один номер в строке """
+        with io.open(path, encoding='utf-8') as f:
+            return cls(line for line in f if line.strip())
+
+    def save(self, path):
+        with self._lock:
+            phones = sorted(self._phones)
+        with io.open(path, 'w', encoding='utf-8') as f:
+            for phone in phones:
+                f.write(u'{}\n'.format(phone))
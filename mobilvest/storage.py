@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SqliteStorage(object):
+    """ Основа локальных хранилищ в файле SQLite (Spool, Ledger, BaseSync)
+    Одно соединение на объект, общее для всех потоков: каждое обращение
+    к нему выполняется под self._lock. Файл открывается в режиме WAL,
+    чтобы чтение из других процессов не ждало записи.
+    SCHEMA - скрипт создания таблиц
+    TEXT_FACTORY - text_factory соединения (None - по умолчанию sqlite3)
+    """
+    SCHEMA = ''
+    TEXT_FACTORY = None
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False,
+                                     isolation_level=None)
+        if self.TEXT_FACTORY is not None:
+            self._conn.text_factory = self.TEXT_FACTORY
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @contextmanager
+    def _transaction(self, begin='BEGIN'):
+        """ Транзакция под блокировкой соединения:
+
+            with self._transaction() as conn:
+                conn.execute(...)
+
+        COMMIT - при выходе из блока (в том числе через return),
+        ROLLBACK - при исключении
+        begin - команда начала транзакции (например, BEGIN IMMEDIATE)
+        """
+        with self._lock:
+            self._conn.execute(begin)
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import datetime
+import json
+import sys
+import unittest
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from .aio import AsyncMobilVestApi
+    from .mobilvest import CantGetStatus, PageFetchError
+
+
+class FakeAsyncTransport(object):
+    """ Транспорт, отвечающий заранее заданными телами ответов """
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.calls = []
+        self.closed = False
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append((url, params))
+        name = url.rsplit('/', 1)[-1]
+        body = self.bodies[name]
+        if callable(body):
+            body = body(params)
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(body)
+        return future
+
+    def close(self):
+        self.closed = True
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(None)
+        return future
+
+
+@unittest.skipIf(sys.version_info < (3, 5),
+                 'asyncio client requires Python 3.5+')
+class TestsAsyncMobilVest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.transport = FakeAsyncTransport({
+            'timestamp.php': b'1432359515',
+            'balance.php': b'{"money" : "69573.1","currency" : "RUR"}',
+            'status.php': b'{"error": 18}',
+        })
+        self.mapi = AsyncMobilVestApi('user', '123',
+                                      transport=self.transport)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_get_balance(self):
+        balance = self.run_async(self.mapi.get_balance())
+        self.assertIn('money', balance)
+        url, params = self.transport.calls[-1]
+        self.assertIn('signature', params)
+        self.assertEqual(params['login'], 'user')
+
+    def test_clock_synced_once(self):
+        async_calls = [self.mapi.get_balance() for _ in range(5)]
+        self.run_async(asyncio.gather(*async_calls))
+        timestamp_calls = [c for c in self.transport.calls
+                           if c[0].endswith('timestamp.php')]
+        self.assertEqual(len(timestamp_calls), 1)
+
+    def test_cant_get_status(self):
+        self.assertRaises(CantGetStatus, self.run_async,
+                          self.mapi.get_status('4091297100348873330001'))
+
+    def test_send_bulk(self):
+        def send(params):
+            phones = params['phone'].split(',')
+            return ('{%s}' % ','.join(
+                '"%s": {"error": "0", "id_sms": "1", "cost": "0.5", '
+                '"count_sms": "1"}' % p for p in phones)).encode('utf-8')
+
+        self.transport.bodies['send.php'] = send
+        phones = ['79000000%03d' % i for i in range(120)]
+        result = self.run_async(
+            self.mapi.send_bulk(phones, 'Hello', 'web.web', concurrency=2))
+        self.assertEqual(len(result), 120)
+        self.assertEqual(result.count_sms, 120)
+
+    def test_get_status_many(self):
+        def status(params):
+            ids = params['state'].split(',')
+            if '0' in ids:
+                return b'{"error": 18}'
+            return json.dumps(dict((i, 'deliver') for i in ids)).encode()
+
+        self.transport.bodies['status.php'] = status
+        ids = [str(i) for i in range(500)] + ['1']
+        result = self.run_async(self.mapi.get_status_many(ids,
+                                                          concurrency=2))
+        self.assertEqual(result.not_ready, ['0'])
+        self.assertEqual(len(result), 499)
+        self.assertEqual(result['499'], 'deliver')
+        self.assertEqual(result.errors, [])
+
+    def test_iter_phones(self):
+        def phone(params):
+            page = int(params['page'])
+            if page == self.fail_page:
+                return b'{"error": 25}'
+            return json.dumps(dict(
+                ('7900%03d%04d' % (page, i), {'name': 'N%d' % i})
+                for i in range(3))).encode()
+
+        def collect(**kwargs):
+            # без async for: файл должен разбираться и в Python 2
+            iterator = self.mapi.iter_phones(1, concurrency=2, **kwargs)
+            items = []
+            while True:
+                try:
+                    items.append(self.run_async(iterator.__anext__()))
+                except StopAsyncIteration:
+                    return items
+
+        self.fail_page = None
+        self.transport.bodies['base.php'] = (
+            b'{"1": {"name": "Clients", "count": "15", "pages": "5"}}')
+        self.transport.bodies['phone.php'] = phone
+        phones = [item[0] for item in collect()]
+        self.assertEqual(sorted(phones), phones)
+        self.assertEqual(len(phones), 15)
+        records = collect(start_page=5, typed=True)
+        self.assertEqual([r.phone for r in records],
+                         [int(p) for p in phones[-3:]])
+        self.fail_page = 3
+        with self.assertRaises(PageFetchError) as ctx:
+            collect(pages=5)
+        self.assertEqual(ctx.exception.page, 3)
+
+    def test_resolve_operators(self):
+        def operator(params):
+            if params['phone'].startswith('7902'):
+                return b'{"operator": "MTS"}'
+            return b'{"error": 19}'
+
+        self.transport.bodies['operator.php'] = operator
+        phones = ['790212345%02d' % i for i in range(20)]
+        phones += ['79031234567', '79031234568']
+        operators = self.run_async(self.mapi.resolve_operators(phones))
+        self.assertEqual(len(operators), 22)
+        self.assertEqual(operators['79021234519'], 'MTS')
+        self.assertIsNone(operators['79031234568'])
+        self.assertEqual(len([c for c in self.transport.calls
+                              if c[0].endswith('operator.php')]), 2)
+        self.mapi.normalize_phones = True
+        operators = self.run_async(self.mapi.resolve_operators(
+            ['+7 902 123 45 00', 'bad']))
+        self.assertEqual(operators, {'+7 902 123 45 00': 'MTS', 'bad': None})
+
+    def test_stats_range(self):
+        def stats(params):
+            return json.dumps({params['month'] + '-01': {
+                'deliver': {'cost': '0.5', 'parts': '1'}}}).encode()
+
+        self.transport.bodies['stat_by_month.php'] = stats
+        start, end = datetime.date(2014, 11, 1), datetime.date(2015, 2, 1)
+        columns = self.run_async(self.mapi.stats_range(start, end,
+                                                       concurrency=2))
+        self.assertEqual([d.month for d in columns.date], [11, 12, 1, 2])
+        self.assertEqual(columns.total_parts(), 4)
+        # закрытые месяцы второй раз берутся из кэша
+        self.run_async(self.mapi.stats_range(start, end))
+        self.assertEqual(len([c for c in self.transport.calls
+                              if c[0].endswith('stat_by_month.php')]), 4)
+
+    def test_close(self):
+        self.run_async(self.mapi.close())
+        self.assertTrue(self.transport.closed)
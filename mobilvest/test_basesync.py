@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import os
+import shutil
+import tempfile
+import unittest
+from .basesync import BaseSync
+from .mobilvest import PageFetchError, ServerResponsedWithError
+
+
+def contact(i, name=None):
+    return '7900%07d' % i, {'name': name or 'Name%d' % i, 'last_name': '',
+                            'middle_name': '', 'date_birth': '0000-00-00',
+                            'male': '', 'note1': '', 'note2': '',
+                            'region': '', 'operator': ''}
+
+
+class FakeApi(object):
+
+    def __init__(self, page_size=3):
+        self.page_size = page_size
+        self.bases = {'1': [contact(i) for i in range(10)],
+                      '2': [contact(i) for i in range(100, 104)]}
+        self.calls = []
+        self.fail_page = None
+        self.on_page = None
+        self.extra_pages = 0
+
+    def get_base(self):
+        result = {}
+        for base, contacts in self.bases.items():
+            pages = (len(contacts) + self.page_size - 1) // self.page_size
+            result[base] = {'name': 'Base ' + base,
+                            'count': str(len(contacts)),
+                            'pages': str(pages + self.extra_pages)}
+        return result
+
+    def get_phone(self, base, page):
+        self.calls.append((base, page))
+        if self.on_page is not None:
+            self.on_page()
+        if page == self.fail_page:
+            raise ServerResponsedWithError('Ошибка доступа к базе', 25)
+        first = (page - 1) * self.page_size
+        chunk = self.bases[base][first:first + self.page_size]
+        if not chunk:
+            # пустой ответ (ошибка 19) get_phone возвращает как None
+            return None
+        return dict((phone, dict(record)) for phone, record in chunk)
+
+
+class TestsBaseSync(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.api = FakeApi()
+        self.sync = BaseSync(self.api, os.path.join(self.directory, 'b.db'))
+
+    def tearDown(self):
+        self.sync.close()
+        shutil.rmtree(self.directory)
+
+    def phones(self, pairs):
+        return [pair[0] for pair in pairs]
+
+    def test_initial_and_unchanged(self):
+        result = self.sync.sync()
+        self.assertEqual(len(result['1'].added), 10)
+        self.assertEqual(result['1'].added[0], contact(0))
+        self.assertEqual(result['2'].pages_fetched, 2)
+        self.assertEqual(list(self.sync.contacts('1')),
+                         [contact(i) for i in range(10)])
+        self.assertEqual(self.sync.bases(), ['1', '2'])
+        self.api.calls = []
+        result = self.sync.sync()
+        self.assertTrue(result['1'].skipped)
+        self.assertFalse(result['1'].changed)
+        self.assertEqual(self.api.calls, [])
+
+    def test_modified_with_force(self):
+        self.sync.sync()
+        self.api.bases['1'][4] = contact(4, 'Ivan')
+        self.assertTrue(self.sync.sync(['1'])['1'].skipped)
+        changes = self.sync.sync(['1'], force=True)['1']
+        self.assertEqual(changes.pages_fetched, 4)
+        self.assertEqual(changes.pages_changed, 1)
+        self.assertEqual(changes.modified, [
+            ('79000000004', contact(4)[1], contact(4, 'Ivan')[1])])
+        self.assertEqual(changes.added, [])
+        self.assertEqual(changes.removed, [])
+        self.assertEqual(dict(self.sync.contacts('1'))['79000000004']['name'],
+                         'Ivan')
+
+    def test_added_and_removed(self):
+        self.sync.sync()
+        self.api.bases['1'].append(contact(10))
+        changes = self.sync.sync(['1'])['1']
+        self.assertEqual(changes.pages_changed, 1)
+        self.assertEqual(self.phones(changes.added), ['79000000010'])
+        # удаление сдвигает номера на всех следующих страницах
+        del self.api.bases['1'][1]
+        del self.api.bases['1'][-1]
+        del self.api.bases['1'][-1]
+        changes = self.sync.sync(['1'])['1']
+        self.assertEqual(self.phones(changes.removed),
+                         ['79000000001', '79000000009', '79000000010'])
+        self.assertEqual(changes.added, [])
+        self.assertEqual(changes.modified, [])
+        self.assertEqual(self.phones(self.sync.contacts('1')),
+                         self.phones(self.api.bases['1']))
+        self.api.calls = []
+        self.assertTrue(self.sync.sync(['1'])['1'].skipped)
+
+    def test_dropped_base(self):
+        self.sync.sync()
+        del self.api.bases['2']
+        result = self.sync.sync()
+        self.assertEqual(len(result['2'].removed), 4)
+        self.assertEqual(self.sync.bases(), ['1'])
+        self.assertEqual(list(self.sync.contacts('2')), [])
+        self.assertRaises(ServerResponsedWithError, self.sync.sync, ['2'])
+
+    def test_page_error_keeps_copy(self):
+        self.sync.sync()
+        self.api.bases['1'].append(contact(10))
+        self.api.fail_page = 2
+        self.assertRaises(PageFetchError, self.sync.sync, ['1'])
+        self.assertEqual(len(list(self.sync.contacts('1'))), 10)
+        self.api.fail_page = None
+        changes = self.sync.sync(['1'])['1']
+        self.assertEqual(self.phones(changes.added), ['79000000010'])
+
+    def test_lock_free_while_fetching(self):
+        free = []
+
+        def on_page():
+            # локальная копия доступна, пока страницы загружаются
+            free.append(self.sync._lock.acquire(False))
+            if free[-1]:
+                self.sync._lock.release()
+
+        self.api.on_page = on_page
+        self.sync.sync(['1'])
+        self.assertEqual(free, [True] * 4)
+        # страница за концом базы - пустой ответ
+        self.api.on_page = None
+        self.api.extra_pages = 1
+        del self.api.bases['1'][8:]
+        changes = self.sync.sync(['1'])['1']
+        self.assertEqual(changes.pages_fetched, 4)
+        self.assertEqual(self.phones(changes.removed),
+                         ['79000000008', '79000000009'])
+
+
+if __name__ == '__main__':
+    unittest.main()
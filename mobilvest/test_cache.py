@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import unittest
+from .cache import ResponseCache
+
+
+class TestsResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.cache = ResponseCache(clock=lambda: self.now, maxsize=2)
+
+    def test_ttl(self):
+        self.cache.update('senders.php', {}, {'smstest': 'completed'})
+        self.assertEqual(self.cache.get('senders.php', {}),
+                         (True, {'smstest': 'completed'}))
+        self.now += 301
+        self.assertEqual(self.cache.get('senders.php', {}), (False, None))
+        self.assertEqual(self.cache.stats(),
+                         {'hits': 1, 'misses': 1, 'size': 0})
+
+    def test_not_cached_endpoint(self):
+        self.cache.update('send.php', {'phone': '1'}, {'1': {}})
+        self.assertEqual(self.cache.get('send.php', {'phone': '1'}),
+                         (False, None))
+
+    def test_lru(self):
+        for phone in ('1', '2', '3'):
+            self.cache.update('operator.php', {'phone': phone},
+                              {'operator': phone})
+        self.assertFalse(self.cache.get('operator.php', {'phone': '1'})[0])
+        self.assertTrue(self.cache.get('operator.php', {'phone': '3'})[0])
+
+    def test_negative_caching(self):
+        self.cache.update('find_on_stop.php', {'phone': '1'}, None)
+        self.assertFalse(self.cache.get('find_on_stop.php',
+                                        {'phone': '1'})[0])
+        cache = ResponseCache(negative_ttl=60)
+        cache.update('find_on_stop.php', {'phone': '1'}, None)
+        self.assertEqual(cache.get('find_on_stop.php', {'phone': '1'}),
+                         (True, None))
+
+    def test_invalidation(self):
+        self.cache.update('template.php', {}, {'test': {}})
+        self.cache.update('add_template.php', {'name': 'a', 'text': 'b'},
+                          {'id': '1'})
+        self.assertFalse(self.cache.get('template.php', {})[0])
+
+    def test_returns_copy(self):
+        self.cache.update('senders.php', {}, {'smstest': 'completed'})
+        self.cache.get('senders.php', {})[1].clear()
+        self.assertEqual(self.cache.get('senders.php', {})[1],
+                         {'smstest': 'completed'})
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import unittest
+from .campaign import Campaign
+from .mobilvest import ServerResponsedWithError
+from .records import PhoneRecord
+from .stoplist import StopList
+
+
+class FakeApi(object):
+
+    def __init__(self):
+        self.calls = []
+        self.stop_list = None
+
+    def send_sms(self, phone, text, sender):
+        self.calls.append((list(phone), text, sender))
+        return dict((str(p), {'error': '0', 'id_sms': str(p), 'cost': '0.5',
+                              'count_sms': '1'}) for p in phone)
+
+    def get_template(self):
+        return {'hello': {'template': 'Hello, {name}!',
+                          'up_time': '2014-08-28 15:22:25'}}
+
+
+class TestsCampaign(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeApi()
+
+    def contacts(self, count, names):
+        for i in range(count):
+            yield '790000%05d' % i, {'name': names[i % len(names)]}
+
+    def test_render(self):
+        campaign = Campaign(self.api, '{name} {last_name}: {phone}', 'web')
+        self.assertEqual(campaign.render('79000000000', {'name': 'Ivan'}),
+                         'Ivan : 79000000000')
+        record = PhoneRecord(79000000000, name='Ivan', last_name='Petrov')
+        self.assertEqual(campaign.render(record.phone, record),
+                         'Ivan Petrov: 79000000000')
+
+    def test_grouping(self):
+        campaign = Campaign(self.api, 'Hello, {name}!', 'web')
+        result = campaign.send(self.contacts(230, ['Ivan', 'Anna']),
+                               concurrency=2)
+        self.assertEqual(len(result), 230)
+        # 115 номеров на каждый текст: по 3 запроса
+        self.assertEqual(len(self.api.calls), 6)
+        self.assertEqual(sorted(len(c[0]) for c in self.api.calls),
+                         [15, 15, 50, 50, 50, 50])
+        for phones, text, sender in self.api.calls:
+            self.assertEqual(sender, 'web')
+            self.assertIn(text, ('Hello, Ivan!', 'Hello, Anna!'))
+
+    def test_bounded_memory(self):
+        campaign = Campaign(self.api, '{name}', 'web', max_pending=10)
+        names = [str(i) for i in range(100)]
+        pending = 0
+        for text, phones in campaign.batches(self.contacts(1000, names)):
+            self.assertLessEqual(len(phones), 50)
+            pending += len(phones)
+        self.assertEqual(pending, 1000)
+
+    def test_stop_list_and_template(self):
+        self.api.stop_list = StopList(['79000000001'])
+        campaign = Campaign.from_template(self.api, 'hello', 'web')
+        result = campaign.send(self.contacts(3, ['Ivan']))
+        self.assertEqual(result['79000000001'], {'error': '13'})
+        self.assertEqual(self.api.calls, [
+            (['79000000000', '79000000002'], 'Hello, Ivan!', 'web')])
+        self.assertRaises(ServerResponsedWithError, Campaign.from_template,
+                          self.api, 'missing', 'web')
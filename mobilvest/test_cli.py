@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import csv
+import io
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import unittest
+from .cli import Output, main
+from .fakeserver import FakeMobilVestServer
+
+
+class Stderr(object):
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def isatty(self):
+        return False
+
+
+class TestsCli(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeMobilVestServer(login='user', api_key='123',
+                                          base_size=250).start()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write(self, name, lines):
+        with io.open(self.path(name), 'wb') as f:
+            f.write(u''.join(line + u'\n' for line in lines).encode('utf-8'))
+        return self.path(name)
+
+    def read_csv(self, name):
+        with io.open(self.path(name), 'rb') as f:
+            lines = f.read().decode('utf-8').splitlines(True)
+        return list(csv.DictReader([line.encode('utf-8')
+                                    if str is bytes else line
+                                    for line in lines]))
+
+    def read_jsonl(self, name):
+        with io.open(self.path(name), 'rb') as f:
+            return [json.loads(line.decode('utf-8')) for line in f]
+
+    def run_cli(self, *argv):
+        return main(list(argv) + ['--login', 'user', '--api-key', '123',
+                                  '--base-url', self.server.url,
+                                  '--no-progress'])
+
+    def test_send(self):
+        lines = [u'phone,name'] + [u'7900%07d,Name%d' % (i, i % 3)
+                                   for i in range(120)]
+        lines.insert(11, u'79000000000,Name0')
+        source = self.write('contacts.csv', lines)
+        self.assertEqual(self.run_cli(
+            'send', '--sender', 'web', '--text', u'Hi, {name}!',
+            '-i', source, '-o', self.path('sent.csv'), '-c', '3'), 0)
+        rows = self.read_csv('sent.csv')
+        self.assertEqual([row['phone'] for row in rows],
+                         [line.split(',')[0] for line in lines[1:]])
+        self.assertEqual(set(row['error'] for row in rows), set(['0']))
+        # повтор номера в одном блоке отправляется один раз
+        self.assertEqual(rows[0]['id_sms'], rows[10]['id_sms'])
+        self.assertEqual(len(set(row['id_sms'] for row in rows)), 120)
+        # по запросу на текст в каждом блоке из 50 строк
+        self.assertEqual(self.server.requests['send.php'], 9)
+
+    def test_send_rows_without_phone(self):
+        source = self.write('phones.jsonl', [
+            '{"phone": "79000000001"}', '{"name": "Ivan"}',
+            '{"phone": ""}', '"79000000002"'])
+        self.assertEqual(self.run_cli(
+            'send', '--sender', 'web', '--text', 'Hi', '-i', source,
+            '-o', self.path('sent.jsonl')), 0)
+        self.assertEqual([(row['phone'], row['error'])
+                          for row in self.read_jsonl('sent.jsonl')],
+                         [('79000000001', '0'), ('', 'no_phone'),
+                          ('', 'no_phone'), ('79000000002', '0')])
+        # короткая строка CSV
+        source = self.write('phones.csv', ['name,phone', 'Ivan,79000000003',
+                                           'Petr'])
+        self.assertEqual(self.run_cli(
+            'send', '--sender', 'web', '--text', 'Hi {name}', '-i', source,
+            '-o', self.path('sent.csv')), 0)
+        self.assertEqual([row['error'] for row in self.read_csv('sent.csv')],
+                         ['0', 'no_phone'])
+        self.assertEqual(self.server._sms_counter, 3)
+
+    def test_send_resume(self):
+        source = self.write('phones.jsonl', ['"7900%07d"' % i
+                                             for i in range(100)])
+        output = self.path('sent.jsonl')
+        with io.open(output, 'wb') as f:
+            for i in range(30):
+                f.write(json.dumps({'phone': '7900%07d' % i, 'error': '0'})
+                        .encode('utf-8') + b'\n')
+            f.write(b'{"phone": "790000')
+        self.assertEqual(self.run_cli(
+            'send', '--sender', 'web', '--text', 'Hi', '-i', source,
+            '-o', output, '--resume'), 0)
+        rows = self.read_jsonl('sent.jsonl')
+        self.assertEqual([row['phone'] for row in rows],
+                         ['7900%07d' % i for i in range(100)])
+        self.assertEqual(self.server._sms_counter, 70)
+
+    def test_send_errors(self):
+        source = self.write('phones.csv', ['phone', '79000000001'])
+        self.server.fail('send.php', 12)
+        self.assertEqual(self.run_cli(
+            'send', '--sender', 'web', '--text', 'Hi', '-i', source,
+            '-o', self.path('sent.csv'), '--retries', '0'), 0)
+        self.assertEqual(self.read_csv('sent.csv')[0]['error'], '12')
+        self.assertEqual(self.run_cli(
+            'send', '--sender', 'web', '--text', 'Hi', '-i', source,
+            '--phone-column', 'number'), 1)
+        self.assertEqual(main(['send', '--sender', 'web', '--text', 'Hi',
+                               '-i', source, '--login', '',
+                               '--no-progress']), 1)
+
+    def test_connection_error(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:%d/' % sock.getsockname()[1]
+        sock.close()
+        stderr, sys.stderr = sys.stderr, Stderr()
+        try:
+            self.assertEqual(main([
+                'export-base', '--base', '1', '-o', self.path('base.csv'),
+                '--login', 'user', '--api-key', '123', '--base-url', url,
+                '--retries', '0', '--no-progress']), 1)
+            lines = ''.join(sys.stderr.parts).splitlines()
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('mobilvest: '))
+        self.assertIn('--resume', lines[1])
+
+    def test_status(self):
+        ids = ['40900000%014d' % i for i in range(250)]
+        source = self.write('ids.csv', ['id_sms'] + ids)
+        self.server.fail('status.php', 18)
+        self.assertEqual(self.run_cli(
+            'status', '-i', source, '-o', self.path('status.jsonl'),
+            '--chunk', '100', '-c', '1'), 0)
+        rows = self.read_jsonl('status.jsonl')
+        self.assertEqual([row['id_sms'] for row in rows], ids)
+        # блок из 100 ID - два запроса (72 + 28 ID), запрос с ошибкой 18
+        # повторяется половинами
+        self.assertEqual(set(row['status'] for row in rows),
+                         set(['deliver']))
+        self.assertEqual(set(row['error'] for row in rows), set(['']))
+        self.assertEqual(self.server.requests['status.php'], 7)
+
+    def test_status_failed_sends(self):
+        source = self.write('sent.csv', ['phone,id_sms,error',
+                                         '79000000001,4090000001,0',
+                                         '79000000002,,12',
+                                         '79000000003,4090000003,0'])
+        self.assertEqual(self.run_cli(
+            'status', '-i', source, '-o', self.path('status.csv')), 0)
+        rows = self.read_csv('status.csv')
+        self.assertEqual([(row['id_sms'], row['status'], row['error'])
+                          for row in rows],
+                         [('4090000001', 'deliver', ''),
+                          ('', '', 'no_id'),
+                          ('4090000003', 'deliver', '')])
+        self.assertEqual(self.server.requests['status.php'], 1)
+
+    def test_export_base_resume(self):
+        output = self.path('base.csv')
+        self.assertEqual(self.run_cli('export-base', '--base', '1',
+                                      '-o', output), 0)
+        with io.open(output, 'rb') as f:
+            full = f.read()
+        self.assertEqual(len(self.read_csv('base.csv')), 250)
+        # обрыв посреди второй страницы
+        lines = full.splitlines(True)
+        with io.open(output, 'wb') as f:
+            f.write(b''.join(lines[:151]) + lines[151][:5])
+        self.server.requests['phone.php'] = 0
+        self.assertEqual(self.run_cli('export-base', '--base', '1',
+                                      '-o', output, '--resume'), 0)
+        with io.open(output, 'rb') as f:
+            self.assertEqual(f.read(), full)
+        self.assertEqual(self.server.requests['phone.php'], 2)
+
+    def test_incoming_and_stats(self):
+        self.assertEqual(self.run_cli(
+            'incoming', '--date-from', '2014-10-27', '--date-to',
+            '2014-10-29', '-o', self.path('incoming.csv')), 0)
+        rows = self.read_csv('incoming.csv')
+        self.assertEqual([row['day'] for row in rows],
+                         ['2014-10-27', '2014-10-28', '2014-10-29'])
+        self.assertEqual(rows[0]['date'], '2014-10-27 05:47:24')
+        self.assertEqual(rows[0]['text'], '51632 TEST')
+        self.assertEqual(self.run_cli(
+            'stats', '--month-from', '2014-01', '--month-to', '2014-03',
+            '-o', self.path('stats.jsonl')), 0)
+        self.assertEqual(self.read_jsonl('stats.jsonl')[2], {
+            'date': '2014-03-01', 'status': 'deliver', 'cost': '0.500',
+            'parts': '1'})
+
+    def test_output_resume_multiline_csv(self):
+        path = self.path('out.csv')
+        output = Output(path, 'csv', ('day', 'text'))
+        with output:
+            output.write([{'day': '1', 'text': u'a\n"b"'},
+                          {'day': '2', 'text': u'c'}])
+            output.write([{'day': '2', 'text': u'd\ne'}])
+        with io.open(path, 'ab') as f:
+            f.write(b'3,"unfinished\n')
+        self.assertEqual(Output(path, 'csv', ('day', 'text')).resume(),
+                         (3, None))
+        output = Output(path, 'csv', ('day', 'text'))
+        self.assertEqual(output.resume(group='day'), (1, '2'))
+        with output:
+            output.write([{'day': '2', 'text': u'f'}])
+        self.assertEqual([row['text'] for row in self.read_csv('out.csv')],
+                         ['a\n"b"', 'f'])
+
+
+if __name__ == '__main__':
+    unittest.main()
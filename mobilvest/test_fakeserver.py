@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import unittest
+from .fakeserver import FakeMobilVestServer
+from .mobilvest import CantGetStatus, MobilVestApi, ServerResponsedWithError
+
+
+class TestsFakeServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeMobilVestServer(login='user', api_key='123',
+                                          base_size=250).start()
+        self.mapi = self.make_api('123')
+
+    def tearDown(self):
+        self.mapi.close()
+        self.server.stop()
+
+    def make_api(self, api_key):
+        mapi = MobilVestApi('user', api_key)
+        mapi.BASE_URL = self.server.url
+        return mapi
+
+    def test_signature(self):
+        self.assertIn('money', self.mapi.get_balance())
+        mapi = self.make_api('wrong key')
+        self.assertRaises(ServerResponsedWithError, mapi.get_balance)
+        mapi.close()
+
+    def test_send_and_status(self):
+        result = self.mapi.send_sms(['79029134225', '79029134226'],
+                                    'Hello', 'web.web')
+        ids = [item['id_sms'] for item in result.values()]
+        self.server.fail('status.php', 18)
+        self.assertRaises(CantGetStatus, self.mapi.get_status, ids)
+        self.assertEqual(set(self.mapi.get_status(ids).values()),
+                         set(['deliver']))
+        self.assertEqual(self.server.requests['timestamp.php'], 1)
+
+    def test_export_base(self):
+        self.assertEqual(len(list(self.mapi.iter_phones('1'))), 250)
+        self.assertEqual(self.server.requests['phone.php'], 3)
+
+    def test_rate_limit(self):
+        # timestamp.php + balance.php
+        self.server.rate_limit = 2
+        self.mapi.get_balance()
+        self.assertRaises(ValueError, self.mapi.get_balance)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from .incoming import IncomingPoller
+
+
+class FakeApi(object):
+
+    def __init__(self):
+        self.days = {}
+        self.calls = []
+        self.fail_day = None
+
+    def add(self, sms_id, date, text):
+        day = date[:10]
+        self.days.setdefault(day, {})[sms_id] = {
+            'date': date, 'sender': '79029734720', 'prefix': '51632',
+            'text': text}
+
+    def get_incoming(self, date):
+        day = date.strftime('%Y-%m-%d')
+        self.calls.append(day)
+        if day == self.fail_day:
+            raise IOError('connection reset')
+        return dict(self.days.get(day, {})) or None
+
+
+class TestsIncomingPoller(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.directory, 'incoming.json')
+        self.now = datetime.datetime(2014, 10, 27, 12, 0)
+        self.api = FakeApi()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_poller(self):
+        return IncomingPoller(self.api, state_path=self.state_path,
+                              clock=lambda: self.now)
+
+    def test_only_new_messages(self):
+        poller = self.make_poller()
+        self.api.add('5598', '2014-10-27 05:47:30', 'second')
+        self.api.add('5597', '2014-10-27 05:47:24', 'first')
+        self.assertEqual([m['text'] for _, m in poller.poll()],
+                         ['first', 'second'])
+        self.assertEqual(poller.poll(), [])
+        self.api.add('5599', '2014-10-27 06:00:00', 'third')
+        self.assertEqual([i for i, _ in poller.poll()], ['5599'])
+
+    def test_restart_does_not_replay(self):
+        self.api.add('5597', '2014-10-27 05:47:24', 'first')
+        self.make_poller().poll()
+        self.assertEqual(self.make_poller().poll(), [])
+
+    def test_day_rollover(self):
+        poller = self.make_poller()
+        self.now = datetime.datetime(2014, 10, 27, 23, 59, 40)
+        self.assertEqual(poller.poll(), [])
+        self.api.add('5597', '2014-10-27 23:59:50', 'late')
+        self.now = datetime.datetime(2014, 10, 28, 0, 1)
+        self.api.add('5598', '2014-10-28 00:00:30', 'early')
+        self.assertEqual([m['text'] for _, m in poller.poll()],
+                         ['late', 'early'])
+        self.assertEqual(self.api.calls[-2:], ['2014-10-27', '2014-10-28'])
+        self.now = datetime.datetime(2014, 10, 28, 1, 0)
+        self.assertEqual(poller.poll(), [])
+        self.assertEqual(list(poller.seen), ['2014-10-28'])
+
+    def test_rollover_failure_keeps_messages(self):
+        poller = self.make_poller()
+        self.now = datetime.datetime(2014, 10, 28, 0, 1)
+        self.api.add('5597', '2014-10-27 23:59:50', 'late')
+        self.api.fail_day = '2014-10-28'
+        self.assertRaises(IOError, poller.poll)
+        self.api.fail_day = None
+        self.assertEqual([m['text'] for _, m in poller.poll()], ['late'])
+        self.assertEqual(poller.poll(), [])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from . import ledger
+from .ledger import Ledger
+
+
+def send_response(first, count):
+    return dict(('790000%05d' % i, {'error': '0', 'id_sms': 'id%d' % i,
+                                    'cost': '0.5', 'count_sms': '2'})
+                for i in range(first, first + count))
+
+
+class TestsLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'ledger.sqlite')
+        self.ledger = Ledger(self.path)
+
+    def tearDown(self):
+        self.ledger.close()
+        shutil.rmtree(self.directory)
+
+    def test_record_send(self):
+        response = send_response(0, 3)
+        response['79000000013'] = {'error': '13'}
+        self.assertEqual(self.ledger.record_send(
+            response, 'web', campaign='promo', sent_at=100), 3)
+        record = self.ledger.get('id1')
+        self.assertEqual(record['phone'], '79000000001')
+        self.assertEqual(record['campaign'], 'promo')
+        self.assertEqual(record['parts'], 2)
+        self.assertIsNone(record['status'])
+        self.assertIsNone(self.ledger.get('missing'))
+        self.assertEqual(len(self.ledger.by_phone('79000000002')), 1)
+
+    def test_statuses_and_aggregates(self):
+        self.ledger.record_send(send_response(0, 10), 'web', 'promo', 100)
+        self.ledger.record_send(send_response(10, 10), 'web', 'other', 200)
+        self.ledger.record_statuses(dict(
+            ('id%d' % i, 'deliver' if i % 2 else 'not_deliver')
+            for i in range(6)))
+        # статус пришёл раньше записи об отправке
+        self.ledger.record_statuses({'id30': 'deliver'})
+        self.ledger.record_send(send_response(30, 1), 'web', 'promo', 300)
+
+        summary = self.ledger.summary('promo')
+        self.assertEqual(summary['deliver'], (4, 2.0, 8))
+        self.assertEqual(summary['not_deliver'][0], 3)
+        self.assertEqual(summary[None][0], 4)
+        self.assertAlmostEqual(self.ledger.delivery_rate('promo'), 4 / 11.0)
+        self.assertEqual(self.ledger.summary(since=200, until=300),
+                         {None: (10, 5.0, 20)})
+        self.assertIsNone(self.ledger.delivery_rate('missing'))
+        # итоги из ledger_totals совпадают с подсчётом по строкам
+        # (since=1 не кратно часу)
+        for campaign in ('promo', 'other', None):
+            self.assertEqual(self.ledger.summary(campaign),
+                             self.ledger.summary(campaign, since=1))
+        self.assertEqual(self.ledger.summary('promo', since=3600), {})
+        self.assertEqual(len(self.ledger.pending()), 14)
+
+    def test_observer(self):
+        self.ledger.campaign = 'promo'
+        self.ledger.after_response('send.php', {'sender': 'web'}, None,
+                                   send_response(0, 2), {})
+        self.ledger.after_response('status.php', {}, None,
+                                   {'id0': 'deliver'}, {})
+        self.assertEqual(self.ledger.get('id0')['status'], 'deliver')
+        self.assertEqual(self.ledger.get('id1')['sender'], 'web')
+        self.ledger.close()
+        # данные сохраняются между открытиями файла
+        self.ledger = Ledger(self.path)
+        self.assertEqual(self.ledger.summary('promo')['deliver'][0], 1)
+
+    def test_observer_write_error(self):
+        self.ledger._conn.execute('DROP TABLE ledger')
+        logger = logging.getLogger('mobilvest.ledger')
+        logger.disabled = True
+        try:
+            self.ledger.after_response('send.php', {'sender': 'web'}, None,
+                                       send_response(0, 2), {})
+        finally:
+            logger.disabled = False
+        # явный вызов по-прежнему сообщает об ошибке
+        self.assertRaises(sqlite3.OperationalError,
+                          self.ledger.record_statuses, {'id0': 'deliver'})
+
+    def test_without_upsert(self):
+        # SQLite до 3.24: INSERT OR IGNORE + UPDATE
+        upsert, ledger._UPSERT = ledger._UPSERT, False
+        try:
+            self.ledger.record_statuses({'id0': 'deliver'})
+            self.ledger.record_send(send_response(0, 2), 'web', 'promo', 100)
+        finally:
+            ledger._UPSERT = upsert
+        self.assertEqual(self.ledger.get('id0')['status'], 'deliver')
+        self.assertEqual(self.ledger.summary('promo'),
+                         {'deliver': (1, 0.5, 2), None: (1, 0.5, 2)})
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import unittest
+from .metrics import MetricsCollector
+from .mobilvest import ServerResponsedWithError
+
+
+class TestsMetricsCollector(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = MetricsCollector(buckets=(0.1, 1))
+        timings = {'network': 0.05, 'total': 0.5}
+        self.metrics.after_response('balance.php', {}, {'money': '1'},
+                                    {'money': '1'}, timings)
+        self.metrics.after_response('phone.php', {}, {'error': 19},
+                                    None, timings)
+        self.metrics.on_error('send.php', {},
+                              ServerResponsedWithError('error', 13),
+                              {'total': 2.0})
+
+    def test_counters(self):
+        self.assertEqual(self.metrics.requests, {
+            'balance.php': 1, 'phone.php': 1, 'send.php': 1})
+        self.assertEqual(self.metrics.errors, {
+            ('phone.php', 19): 1, ('send.php', 13): 1})
+
+    def test_histogram(self):
+        buckets, total = self.metrics.histogram('send.php')
+        self.assertEqual(buckets, [(0.1, 0), (1, 0), (float('inf'), 1)])
+        self.assertEqual(total, 2.0)
+
+    def test_export(self):
+        text = self.metrics.export()
+        self.assertIn('mobilvest_requests_total{page="balance.php"} 1', text)
+        self.assertIn('mobilvest_errors_total{page="send.php",code="13"} 1',
+                      text)
+        self.assertIn('mobilvest_request_duration_seconds_bucket'
+                      '{page="balance.php",phase="network",le="0.1"} 1', text)
+        self.assertIn('mobilvest_request_duration_seconds_count'
+                      '{page="balance.php",phase="total"} 1', text)
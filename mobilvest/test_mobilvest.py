@@ -1,10 +1,17 @@
 #!/usr/bin/env python
 # coding: UTF-8
+from __future__ import absolute_import
 import unittest
 import responses
 import mobilvest
-import urlparse
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
 import datetime
+import json
+import logging
+from decimal import Decimal
 from hashlib import md5
 
 
@@ -34,9 +41,10 @@ class TestsMobilVest(unittest.TestCase):
             recieved_signature = params.pop('signature')
             params_as_string = ''.join(str(params[k]) for k in sorted(params))
             valid_signature = md5(
-                params_as_string + self.valid_api_key).hexdigest()
+                (params_as_string + self.valid_api_key).encode('utf-8')
+            ).hexdigest()
             self.assertEqual(recieved_signature, valid_signature)
-            return (200, {}, {})
+            return (200, {}, '{}')
 
         responses.add_callback(
             responses.GET, 'http://online.mobilvest.ru/get/balance.php',
@@ -281,3 +289,526 @@ class TestsMobilVest(unittest.TestCase):
         for i in incomings.values():
             self.assertIn('sender', i)
             self.assertIn('text', i)
+
+    @responses.activate
+    def test_timestamp_is_cached(self):
+        """ Временная метка сервера запрашивается один раз,
+        дальше вычисляется по локальным часам
+        """
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/balance.php',
+                      body='{"money" : "69573.1","currency" : "RUR"}')
+
+        self.mapi.get_balance()
+        self.mapi.get_balance()
+        timestamp_calls = [c for c in responses.calls
+                           if 'timestamp.php' in c.request.url]
+        self.assertEqual(len(timestamp_calls), 1)
+        self.assertIsNotNone(self.mapi.clock_offset)
+        self.assertGreaterEqual(self.mapi.clock_offset_age, 0)
+
+    @responses.activate
+    def test_clock_resync_interval(self):
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/balance.php',
+                      body='{"money" : "69573.1","currency" : "RUR"}')
+
+        mapi = mobilvest.MobilVestApi('user', self.valid_api_key,
+                                      clock_sync_interval=0)
+        mapi.get_balance()
+        mapi.get_balance()
+        timestamp_calls = [c for c in responses.calls
+                           if 'timestamp.php' in c.request.url]
+        self.assertEqual(len(timestamp_calls), 2)
+
+    @responses.activate
+    def test_resync_on_signature_error(self):
+        """ При ошибке подписи часы синхронизируются заново,
+        а запрос повторяется
+        """
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/balance.php',
+                      body='{"error": 6}')
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/balance.php',
+                      body='{"money" : "69573.1","currency" : "RUR"}')
+
+        balance_json = self.mapi.get_balance()
+        self.assertIn('money', balance_json)
+        timestamp_calls = [c for c in responses.calls
+                           if 'timestamp.php' in c.request.url]
+        self.assertEqual(len(timestamp_calls), 2)
+
+    def test_custom_transport(self):
+        class FakeTransport(object):
+            closed = False
+
+            def __init__(self):
+                self.urls = []
+
+            def get(self, url, params=None, timeout=None):
+                self.urls.append(url)
+                if url.endswith('timestamp.php'):
+                    return b'1432359515'
+                return b'{"money" : "69573.1","currency" : "RUR"}'
+
+            def close(self):
+                self.closed = True
+
+        transport = FakeTransport()
+        with mobilvest.MobilVestApi('user', self.valid_api_key,
+                                    transport=transport) as mapi:
+            self.assertIn('money', mapi.get_balance())
+        self.assertEqual(len(transport.urls), 2)
+        self.assertTrue(transport.closed)
+
+    @responses.activate
+    def test_send_bulk(self):
+        def send_callback(request):
+            params = urlparse.parse_qs(urlparse.urlparse(
+                request.path_url).query)
+            phones = params['phone'][0].split(',')
+            if len(phones) > 50:
+                return (200, {}, '{"error": 14}')
+            if '79000000120' in phones:
+                return (200, {}, '{"error": 12}')
+            body = {p: {"error": "0", "id_sms": "1" + p,
+                        "cost": "0.5", "count_sms": "1"} for p in phones}
+            return (200, {}, json.dumps(body))
+
+        responses.add_callback(
+            responses.GET, 'http://online.mobilvest.ru/get/send.php',
+            callback=send_callback,
+            content_type='application/json',
+        )
+
+        phones = ['79000000%03d' % i for i in range(130)]
+        result = self.mapi.send_bulk(phones + phones[:10], "Hello world!",
+                                     "web.web", concurrency=3)
+        send_calls = [c for c in responses.calls
+                      if 'send.php' in c.request.url]
+        self.assertEqual(len(send_calls), 3)
+        # третий пакет (номера 100-129) отвергнут целиком
+        self.assertEqual(len(result), 100)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(result.errors[0][0], phones[100:])
+        self.assertEqual(result.count_sms, 100)
+        self.assertEqual(result.cost, 50)
+        self.assertEqual(result['79000000001']['id_sms'], '179000000001')
+
+    @responses.activate
+    def test_get_status_many(self):
+        not_ready = set(['4091297100348800000005', '4091297100348800000077'])
+
+        def status_callback(request):
+            params = urlparse.parse_qs(urlparse.urlparse(
+                request.path_url).query)
+            ids = params['state'][0].split(',')
+            self.assertLessEqual(len(ids), 20)
+            if 'broken' in ids:
+                return (200, {}, '{"error": 25}')
+            if not_ready.intersection(ids):
+                return (200, {}, '{"error": 18}')
+            return (200, {}, json.dumps({i: 'deliver' for i in ids}))
+
+        responses.add_callback(
+            responses.GET, 'http://online.mobilvest.ru/get/status.php',
+            callback=status_callback,
+            content_type='application/json',
+        )
+        # 20 ID по 22 символа в пакете
+        self.mapi.MAX_STATE_LENGTH = 500
+        ids = ['40912971003488%08d' % i for i in range(100)]
+        result = self.mapi.get_status_many(ids + ids[:10] + ['broken'],
+                                           concurrency=3)
+        self.assertEqual(len(result), 98)
+        self.assertEqual(result[ids[6]], 'deliver')
+        self.assertEqual(result.not_ready, [ids[5], ids[77]])
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(result.errors[0][0], ['broken'])
+        self.assertEqual(result.errors[0][1].code, 25)
+        status_calls = [c for c in responses.calls
+                        if 'status.php' in c.request.url]
+        # 6 пакетов; для каждого ID без статуса - 4 деления пополам
+        # (20 -> 10 -> 5 -> 2 или 3 -> 1) по 2 запроса
+        self.assertEqual(len(status_calls), 6 + 2 * 4 * 2)
+
+    @responses.activate
+    def test_iter_phones(self):
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/base.php',
+                      body='{"125452": {"name": "clients", "count": "6", '
+                           '"pages": "3"}}')
+
+        def phone_callback(request):
+            params = urlparse.parse_qs(urlparse.urlparse(
+                request.path_url).query)
+            page = int(params['page'][0])
+            if page == 3 and self.fail_last_page:
+                return (200, {}, '{"error": 25}')
+            body = {'7900000%02d%02d' % (page, i): {"name": str(i)}
+                    for i in range(2)}
+            return (200, {}, json.dumps(body))
+
+        responses.add_callback(
+            responses.GET, 'http://online.mobilvest.ru/get/phone.php',
+            callback=phone_callback,
+            content_type='application/json',
+        )
+
+        self.fail_last_page = False
+        phones = list(self.mapi.iter_phones('125452', prefetch=2))
+        self.assertEqual(len(phones), 6)
+        pages = [int(p[7:9]) for p, _ in phones]
+        self.assertEqual(pages, sorted(pages))
+
+        self.fail_last_page = True
+        phones = []
+        failed_page = None
+        try:
+            for phone, record in self.mapi.iter_phones('125452'):
+                phones.append(phone)
+        except mobilvest.PageFetchError as e:
+            failed_page = e.page
+        self.assertEqual(failed_page, 3)
+        self.assertEqual(len(phones), 4)
+
+        self.fail_last_page = False
+        rest = list(self.mapi.iter_phones('125452', start_page=3, pages=3))
+        self.assertEqual(len(rest), 2)
+
+    @responses.activate
+    def test_cached_senders(self):
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/senders.php',
+                      body='{"smstest":"completed","smstest2":"completed"}')
+
+        mapi = mobilvest.MobilVestApi('user', self.valid_api_key,
+                                      cache=mobilvest.ResponseCache())
+        self.assertEqual(mapi.get_senders(), mapi.get_senders())
+        senders_calls = [c for c in responses.calls
+                         if 'senders.php' in c.request.url]
+        self.assertEqual(len(senders_calls), 1)
+        self.assertEqual(mapi.cache.stats()['hits'], 1)
+
+    @responses.activate
+    def test_stop_list(self):
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/add2stop.php',
+                      body='{"id" : "4419373"}')
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/send.php',
+                      body='''
+                        {
+                            "79029134226": {
+                                "error": "13"
+                            }
+                        }''')
+
+        stop_list = mobilvest.StopList()
+        mapi = mobilvest.MobilVestApi('user', self.valid_api_key,
+                                      stop_list=stop_list)
+        mapi.add_to_stop('79029134225')
+        self.assertIn('79029134225', stop_list)
+
+        # номер из стоп-листа не уходит на сервер
+        result = mapi.send_sms('79029134225', 'Hello world!', 'web.web')
+        self.assertEqual(result, {'79029134225': {'error': '13'}})
+        self.assertFalse([c for c in responses.calls
+                          if 'send.php' in c.request.url])
+
+        result = mapi.send_sms(['79029134225', '79029134226'],
+                               'Hello world!', 'web.web')
+        self.assertEqual(set(result), set(['79029134225', '79029134226']))
+        send_call = [c for c in responses.calls
+                     if 'send.php' in c.request.url][0]
+        self.assertNotIn('79029134225', send_call.request.url)
+        # ошибка 13 от сервера пополняет стоп-лист
+        self.assertIn('79029134226', stop_list)
+
+    @responses.activate
+    def test_resolve_operators(self):
+        def operator_callback(request):
+            params = urlparse.parse_qs(urlparse.urlparse(
+                request.path_url).query)
+            phone = params['phone'][0]
+            if phone.startswith('7902'):
+                return (200, {}, '{"operator": "MTS"}')
+            return (200, {}, '{"error": 19}')
+
+        responses.add_callback(
+            responses.GET, 'http://online.mobilvest.ru/get/operator.php',
+            callback=operator_callback,
+            content_type='application/json',
+        )
+
+        phones = ['790212345%02d' % i for i in range(20)]
+        phones += ['79031234567', '79021234500', '79031234568',
+                   '79031239999']
+        operators = self.mapi.resolve_operators(phones)
+        self.assertEqual(len(operators), 23)
+        self.assertEqual(operators['79021234501'], 'MTS')
+        self.assertIsNone(operators['79031234567'])
+        # ошибка по одному номеру диапазона не повторяется для остальных
+        self.assertIsNone(operators['79031239999'])
+        operator_calls = [c for c in responses.calls
+                          if 'operator.php' in c.request.url]
+        self.assertEqual(len(operator_calls), 2)
+
+    @responses.activate
+    def test_rate_limiter(self):
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/balance.php',
+                      body='{"money" : "69573.1","currency" : "RUR"}')
+
+        controller = mobilvest.ConcurrencyController(initial=2)
+        limiter = mobilvest.RateLimiter(default_rate=1000,
+                                        concurrency=controller)
+        mapi = mobilvest.MobilVestApi('user', self.valid_api_key,
+                                      rate_limiter=limiter)
+        mapi.get_balance()
+        self.assertEqual(controller.in_flight, 0)
+        self.assertGreater(controller.limit, 2)
+
+    @responses.activate
+    def test_observers(self):
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/balance.php',
+                      body='{"money" : "69573.1","currency" : "RUR"}')
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/senders.php',
+                      body='{"error": 7}')
+
+        events = []
+
+        class Observer(object):
+            def before_request(self, url, params):
+                events.append(('before', url))
+
+            def after_response(self, url, params, response, result, timings):
+                events.append(('after', url, sorted(timings)))
+
+            def on_error(self, url, params, exception, timings):
+                events.append(('error', url, exception.code))
+
+        self.mapi.add_observer(Observer())
+        self.mapi.get_balance()
+        self.assertRaises(mobilvest.ServerResponsedWithError,
+                          self.mapi.get_senders)
+        self.assertEqual(events, [
+            ('before', 'balance.php'),
+            ('after', 'balance.php',
+             ['decode', 'network', 'sign', 'timestamp', 'total']),
+            ('before', 'senders.php'),
+            ('error', 'senders.php', 7),
+        ])
+
+    @responses.activate
+    def test_failing_observer(self):
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/balance.php',
+                      body='{"money" : "69573.1","currency" : "RUR"}')
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/senders.php',
+                      body='{"error": 7}')
+        events = []
+
+        class Broken(object):
+            def before_request(self, url, params):
+                raise ValueError('before')
+
+            def after_response(self, url, params, response, result, timings):
+                raise ValueError('after')
+
+            def on_error(self, url, params, exception, timings):
+                raise ValueError('error')
+
+        class Observer(object):
+            def after_response(self, url, params, response, result, timings):
+                events.append(url)
+
+        self.mapi.add_observer(Broken())
+        self.mapi.add_observer(Observer())
+        logger = logging.getLogger('mobilvest.mobilvest')
+        logger.disabled = True
+        try:
+            self.assertEqual(self.mapi.get_balance()['money'], '69573.1')
+            with self.assertRaises(mobilvest.ServerResponsedWithError) as ctx:
+                self.mapi.get_senders()
+        finally:
+            logger.disabled = False
+        self.assertEqual(ctx.exception.code, 7)
+        self.assertEqual(events, ['balance.php'])
+
+    @responses.activate
+    def test_stats_range(self):
+        def stat_callback(request):
+            params = urlparse.parse_qs(urlparse.urlparse(
+                request.path_url).query)
+            month = params['month'][0]
+            body = {month + '-01': {'deliver': {'cost': '0.5',
+                                                'parts': '1'}}}
+            return (200, {}, json.dumps(body))
+
+        responses.add_callback(
+            responses.GET, 'http://online.mobilvest.ru/get/stat_by_month.php',
+            callback=stat_callback,
+            content_type='application/json',
+        )
+
+        start, end = datetime.date(2013, 11, 1), datetime.date(2014, 2, 1)
+        stats = self.mapi.stats_range(start, end)
+        self.assertEqual([d.month for d in stats.date], [11, 12, 1, 2])
+        self.assertEqual(stats.total_parts(), 4)
+        # закрытые месяцы повторно не запрашиваются
+        self.mapi.stats_range(start, end)
+        stat_calls = [c for c in responses.calls
+                      if 'stat_by_month.php' in c.request.url]
+        self.assertEqual(len(stat_calls), 4)
+
+    @responses.activate
+    def test_typed_results(self):
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/status.php',
+                      body='{"4091297100348873330001": "not_deliver"}')
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/send.php',
+                      body='{"79029134225": {"error": "0", "id_sms": "1", '
+                           '"cost": "0.5", "count_sms": "1"}}')
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/base.php',
+                      body='{"1": {"name": "clients", "count": "2", '
+                           '"pages": "1"}}')
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/phone.php',
+                      body='{"79000000001": {"date_birth": "1990-01-02"}}')
+
+        entry, = self.mapi.get_status('4091297100348873330001', typed=True)
+        self.assertIsInstance(entry, mobilvest.StatusEntry)
+        self.assertEqual(entry.status, 'not_deliver')
+        result, = self.mapi.send_sms('79029134225', 'text', 'sender',
+                                     typed=True)
+        self.assertTrue(result.ok)
+        record, = list(self.mapi.iter_phones('1', typed=True))
+        self.assertEqual(record.phone, 79000000001)
+        self.assertEqual(record.date_birth, datetime.date(1990, 1, 2))
+        # по умолчанию - словари, как раньше
+        self.assertIn('79029134225',
+                      self.mapi.send_sms('79029134225', 'text', 'sender'))
+
+    @responses.activate
+    def test_custom_json_loads(self):
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/balance.php',
+                      body='{"money": "1.5", "currency": "RUR"}')
+        bodies = []
+
+        def loads(body):
+            bodies.append(body)
+            return json.loads(body)
+
+        mapi = mobilvest.MobilVestApi('user', '123', json_loads=loads)
+        self.assertEqual(mapi.get_balance()['money'], '1.5')
+        self.assertEqual(len(bodies), 1)
+
+    @responses.activate
+    def test_cost_estimator(self):
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/balance.php',
+                      body='{"money": "10", "currency": "RUR"}')
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/send.php',
+                      body='{"79029134225": {"error": "0", "id_sms": "1", '
+                           '"cost": "1.0", "count_sms": "2"}}')
+        estimator = mobilvest.CostEstimator()
+        self.mapi.add_observer(estimator)
+        self.mapi.get_balance()
+        self.mapi.send_sms('79029134225', 'a' * 200, 'sender')
+        self.assertEqual(estimator.price, Decimal('0.5'))
+        self.assertEqual(estimator.balance(), 9)
+        affordable, rest = estimator.split(['1', '2', '3'], 'a' * 500)
+        self.assertEqual((len(affordable), len(rest)), (3, 0))
+        self.assertRaises(mobilvest.InsufficientFunds, estimator.check,
+                          range(10), 'a' * 500)
+
+    @responses.activate
+    def test_normalize_phones(self):
+        def send_callback(request):
+            params = urlparse.parse_qs(urlparse.urlparse(
+                request.path_url).query)
+            phones = params['phone'][0].split(',')
+            self.sent.append(phones)
+            return (200, {}, json.dumps(dict(
+                (p, {'error': '0', 'id_sms': p, 'cost': '0.5',
+                     'count_sms': '1'}) for p in phones)))
+
+        responses.add_callback(
+            responses.GET, 'http://online.mobilvest.ru/get/send.php',
+            callback=send_callback,
+            content_type='application/json',
+        )
+        self.sent = []
+        mapi = mobilvest.MobilVestApi('user', '123', normalize_phones=True)
+        result = mapi.send_sms(['+7 (912) 345-67-89', '8 912 345 67 89',
+                                '123'], 'text', 'web')
+        self.assertEqual(self.sent, [['79123456789']])
+        # ответ - по номерам в том виде, в каком их передали
+        self.assertEqual(sorted(result), ['+7 (912) 345-67-89', '123',
+                                          '8 912 345 67 89'])
+        self.assertEqual(result['8 912 345 67 89']['id_sms'], '79123456789')
+        self.assertEqual(result['123'], {'error': '16'})
+        self.assertEqual(mapi.send_sms('bad', 'text', 'web'),
+                         {'bad': {'error': '16'}})
+        bulk = mobilvest.BulkSendResult()
+        bulk.merge(result)
+        self.assertEqual(bulk.cost, Decimal('0.5'))
+        typed = mapi.send_sms(['+7 902 913 42 25', 'not-a-phone',
+                               '79029134226'], 'text', 'web', typed=True)
+        by_phone = dict((r.phone, r) for r in typed)
+        self.assertTrue(by_phone['+7 902 913 42 25'].ok)
+        self.assertEqual(by_phone['not-a-phone'].error, 16)
+        self.assertEqual(by_phone[79029134226].id_sms, '79029134226')
+
+        result = mapi.send_bulk(['8 912 345 67 89', '79123456789', 'bad'],
+                                'text', 'web')
+        self.assertEqual(self.sent[-1], ['79123456789'])
+        self.assertEqual(result['bad'], {'error': '16'})
+        with self.assertRaises(mobilvest.ServerResponsedWithError) as e:
+            mapi.get_operator('123')
+        self.assertEqual(e.exception.code, 16)
+
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/operator.php',
+                      body='{"operator": "MTS"}')
+        operators = mapi.resolve_operators(
+            iter(['+7 912 345 67 89', '89123456780', '79123456789', 'bad']))
+        self.assertEqual(operators, {'+7 912 345 67 89': 'MTS',
+                                     '89123456780': 'MTS',
+                                     '79123456789': 'MTS', 'bad': None})
+
+    @responses.activate
+    def test_resilience(self):
+        from requests.exceptions import ReadTimeout
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/balance.php',
+                      body=ReadTimeout('read timed out'))
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/balance.php',
+                      body='{"money": "1.5", "currency": "RUR"}')
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/send.php',
+                      body=ReadTimeout('read timed out'))
+        sleeps = []
+        policy = mobilvest.ResiliencePolicy(
+            timeouts={'send.php': 60}, default_timeout=5,
+            sleep=sleeps.append)
+        mapi = mobilvest.MobilVestApi('user', '123', resilience=policy)
+        self.assertEqual(mapi.get_balance()['money'], '1.5')
+        self.assertEqual(len(sleeps), 1)
+        # отправка могла дойти до сервера - не повторяется
+        self.assertRaises(ReadTimeout, mapi.send_sms, '79029134225',
+                          'text', 'sender')
+        send_calls = [c for c in responses.calls
+                      if 'send.php' in c.request.url]
+        self.assertEqual(len(send_calls), 1)
+        self.assertEqual(len(sleeps), 1)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import os
+import shutil
+import tempfile
+import unittest
+from .operators import OperatorIndex
+
+
+class TestsOperatorIndex(unittest.TestCase):
+
+    def test_prefix_learning(self):
+        index = OperatorIndex()
+        index.learn('79021234567', 'MTS')
+        self.assertEqual(index.lookup('79021230000'), 'MTS')
+        self.assertIsNone(index.lookup('79031234567'))
+
+    def test_conflict_splits_range(self):
+        index = OperatorIndex()
+        index.learn('79021234567', 'MTS')
+        index.learn('79021239999', 'Beeline')
+        self.assertEqual(index.lookup('79021234567'), 'MTS')
+        self.assertEqual(index.lookup('79021239999'), 'Beeline')
+        self.assertEqual(index.lookup('79021234000'), 'MTS')
+        # диапазон 7902123 теперь неоднозначен
+        self.assertIsNone(index.lookup('79021231111'))
+        self.assertEqual(index.range_key('79021231111'), '79021231')
+
+    def test_save_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'operators.json')
+            index = OperatorIndex()
+            index.learn('79021234567', 'MTS')
+            index.learn('79021239999', 'Beeline')
+            index.save(path)
+            loaded = OperatorIndex.load(path)
+            self.assertEqual(loaded.lookup('79021234000'), 'MTS')
+            self.assertIsNone(loaded.lookup('79021231111'))
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import unittest
+from .phones import normalize_phone, normalize_phones
+
+
+class TestsPhones(unittest.TestCase):
+
+    def test_formats(self):
+        for raw in ('+7 (912) 345-67-89', '8 912 345 67 89', '9123456789',
+                    '79123456789', 79123456789, u'+7 912 345-67-89'):
+            self.assertEqual(normalize_phone(raw), '79123456789')
+
+    def test_invalid(self):
+        for raw in ('', 'abc', '7912', '8 800 123 45 67', '+1 912 345 67 89',
+                    '7912345678900', None):
+            self.assertIsNone(normalize_phone(raw))
+
+    def test_bulk(self):
+        result = normalize_phones([
+            '+7 (912) 345-67-89', '89123456780', 'abc', '9123456781',
+            '79123456789', '7\n9123456782', 79123456780])
+        self.assertEqual(result.phones,
+                         ['79123456789', '79123456780', '79123456781'])
+        self.assertEqual(result.rejected, ['abc', '7\n9123456782'])
+        self.assertEqual(result.duplicates, 2)
+
+    def test_empty(self):
+        result = normalize_phones([])
+        self.assertEqual((result.phones, result.rejected, result.duplicates),
+                         ([], [], 0))
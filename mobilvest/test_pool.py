@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import unittest
+from decimal import Decimal
+from .mobilvest import ServerResponsedWithError
+from .pool import MobilVestPool, NoAvailableAccount
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeApi(object):
+    """ Аккаунт с заданным балансом; каждая СМС стоит 0.5 """
+
+    def __init__(self, login, money='10', error=None):
+        self.login = login
+        self.money = money
+        self.error = error
+        self.balance_calls = 0
+        self.sent = []
+        self.status_calls = []
+
+    def get_balance(self):
+        self.balance_calls += 1
+        return {'money': self.money, 'currency': 'RUR'}
+
+    def send_sms(self, phone, text, sender):
+        if self.error is not None:
+            raise ServerResponsedWithError('error', self.error)
+        phones = phone if isinstance(phone, list) else [phone]
+        result = {}
+        for p in phones:
+            self.sent.append(p)
+            result[str(p)] = {'error': '0', 'cost': '0.5', 'count_sms': '1',
+                              'id_sms': '%s-%s' % (self.login, p)}
+        return result
+
+    def get_status(self, state, typed=False):
+        self.status_calls.append(list(state))
+        return dict((i, 'deliver') for i in state)
+
+    def close(self):
+        pass
+
+
+class TestsMobilVestPool(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_weighted_round_robin(self):
+        a, b = FakeApi('a'), FakeApi('b')
+        pool = MobilVestPool([(a, 2), (b, 1)], clock=self.clock)
+        for i in range(6):
+            pool.send_sms(str(i), 'text', 'sender')
+        self.assertEqual(len(a.sent), 4)
+        self.assertEqual(len(b.sent), 2)
+
+    def test_balance_tracking(self):
+        a = FakeApi('a', money='2')
+        pool = MobilVestPool([a], min_balance=1, clock=self.clock)
+        pool.send_sms(['1', '2'], 'text', 'sender')
+        self.assertEqual(pool.balances()['a'], Decimal('1'))
+        pool.send_sms('3', 'text', 'sender')
+        # баланс 0.5 < min_balance, а обновлять его ещё рано
+        self.assertRaises(NoAvailableAccount,
+                          pool.send_sms, '4', 'text', 'sender')
+        self.assertEqual(a.balance_calls, 1)
+        a.money = '100'
+        self.clock.now += pool.balance_refresh
+        pool.send_sms('4', 'text', 'sender')
+        self.assertEqual(a.balance_calls, 2)
+
+    def test_failover(self):
+        a, b = FakeApi('a', error=10), FakeApi('b')
+        pool = MobilVestPool([a, b], error_threshold=2, cooldown=60,
+                             clock=self.clock)
+        for i in range(4):
+            pool.send_sms(str(i), 'text', 'sender')
+        self.assertEqual(len(b.sent), 4)
+        self.assertFalse(pool.stats()['a']['available'])
+        # ошибка в самом запросе не повторяется через другой аккаунт
+        b.error = 3
+        self.assertRaises(ServerResponsedWithError,
+                          pool.send_sms, '5', 'text', 'sender')
+        self.clock.now += 60
+        a.error = b.error = None
+        pool.send_sms('6', 'text', 'sender')
+        pool.send_sms('7', 'text', 'sender')
+        self.assertEqual(len(a.sent), 1)
+
+    def test_status_routing(self):
+        a, b = FakeApi('a', money='100'), FakeApi('b', money='100')
+        pool = MobilVestPool([a, b], clock=self.clock)
+        pool.send_bulk([str(i) for i in range(120)], 'text', 'sender',
+                       concurrency=1)
+        statuses = pool.get_status(['a-0', 'b-50', 'a-100'])
+        self.assertEqual(len(statuses), 3)
+        self.assertEqual(a.status_calls, [['a-0', 'a-100']])
+        self.assertEqual(b.status_calls, [['b-50']])
+        self.assertRaises(KeyError, pool.get_status, 'unknown')
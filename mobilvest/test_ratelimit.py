@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import unittest
+from .ratelimit import ConcurrencyController, RateLimiter, TokenBucket
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestsRateLimit(unittest.TestCase):
+
+    def test_token_bucket(self):
+        clock = FakeClock()
+        bucket = TokenBucket(10, burst=2, clock=clock, sleep=clock.sleep)
+        for _ in range(12):
+            bucket.acquire()
+        # 2 запроса всплеском, остальные 10 - со скоростью 10 в секунду
+        self.assertAlmostEqual(clock.now, 1.0)
+
+    def test_aimd(self):
+        controller = ConcurrencyController(initial=4, minimum=1, maximum=8,
+                                           latency_threshold=1.0)
+        for _ in range(20):
+            controller.acquire()
+            controller.release(success=True, latency=0.1)
+        self.assertGreater(controller.limit, 5)
+        controller.acquire()
+        controller.release(success=True, latency=2.0)
+        self.assertLess(controller.limit, 4)
+        for _ in range(10):
+            controller.acquire()
+            controller.release(success=False)
+        self.assertEqual(controller.limit, 1)
+
+    def test_rate_limiter(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rates={'send.php': 1}, default_rate=100,
+                              concurrency=ConcurrencyController(initial=2),
+                              clock=clock, sleep=clock.sleep)
+        for _ in range(3):
+            limiter.acquire('send.php')
+            limiter.release('send.php', {'79029134225': {}}, 0.1)
+        self.assertAlmostEqual(clock.now, 2.0)
+        limiter.acquire('status.php')
+        limiter.release('status.php', {'error': 12}, 0.1)
+        stats = limiter.stats()
+        self.assertEqual(stats['rates'], {'send.php': 1.0})
+        self.assertEqual(stats['default_rate'], 100.0)
+        self.assertEqual(stats['in_flight'], 0)
+        self.assertEqual(stats['waiting'], 0)
+        self.assertEqual(stats['concurrency_limit'], 1)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import datetime
+import pickle
+import unittest
+from decimal import Decimal
+from .records import PhoneRecord, SendResult, StatusEntry
+
+
+class TestsRecords(unittest.TestCase):
+
+    def test_send_result(self):
+        results = SendResult.from_response({
+            "79029134225": {"error": "0", "id_sms": "4092112510348380960001",
+                            "cost": "0.5", "count_sms": "2"},
+            "79029134226": {"error": "13"}})
+        results.sort(key=lambda r: r.phone)
+        sent, stopped = results
+        self.assertEqual(sent.phone, 79029134225)
+        self.assertTrue(sent.ok)
+        self.assertEqual(sent.cost, Decimal('0.5'))
+        self.assertEqual(sent.count_sms, 2)
+        self.assertFalse(stopped.ok)
+        self.assertEqual(stopped.error, 13)
+        self.assertIsNone(stopped.cost)
+        self.assertIsNone(stopped.id_sms)
+
+    def test_status_entry(self):
+        entries = StatusEntry.from_response(
+            {"4091297100348873330001": "deliver"})
+        self.assertEqual(entries,
+                         [StatusEntry('4091297100348873330001', 'deliver')])
+        self.assertTrue(entries[0].delivered)
+        self.assertEqual(StatusEntry.from_response(None), [])
+
+    def test_phone_record(self):
+        record, = PhoneRecord.from_response({
+            "79687931116": {"name": "Ivan", "last_name": "",
+                            "middle_name": "", "date_birth": "1980-02-29",
+                            "male": "m", "note1": "", "note2": "",
+                            "region": "", "operator": "MTS"}})
+        self.assertEqual(record.phone, 79687931116)
+        self.assertEqual(record.date_birth, datetime.date(1980, 2, 29))
+        self.assertEqual(record.operator, 'MTS')
+        self.assertIsNone(PhoneRecord.from_item(
+            '79687931117', {"date_birth": "0000-00-00"}).date_birth)
+        self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_pickle_and_dict(self):
+        record = SendResult(79029134225, 0, '1', Decimal('0.5'), 1)
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+        self.assertEqual(pickle.loads(pickle.dumps(record, 2)), record)
+        self.assertEqual(record.as_dict()['cost'], Decimal('0.5'))
+        self.assertIn('phone=79029134225', repr(record))
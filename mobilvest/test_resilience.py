@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import threading
+import time
+import unittest
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+from .mobilvest import ServerResponsedWithError
+from .resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy
+
+
+class Attempts(object):
+    """ Попытки запроса: по очереди бросают исключения из outcomes,
+    затем возвращают 'ok'
+    """
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.count = 0
+
+    def __call__(self, timings):
+        self.count += 1
+        if self.outcomes:
+            raise self.outcomes.pop(0)
+        return 'ok'
+
+
+class TestsCircuitBreaker(unittest.TestCase):
+
+    def test_states(self):
+        now = [0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10,
+                                 clock=lambda: now[0])
+        breaker.allow()
+        breaker.failure()
+        breaker.failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertRaises(CircuitOpenError, breaker.allow)
+        now[0] = 10
+        self.assertEqual(breaker.state, 'half_open')
+        breaker.allow()
+        # пробный запрос только один
+        self.assertRaises(CircuitOpenError, breaker.allow)
+        breaker.failure()
+        self.assertEqual(breaker.state, 'open')
+        now[0] = 20
+        breaker.allow()
+        breaker.success()
+        self.assertEqual(breaker.state, 'closed')
+
+
+class TestsResiliencePolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+        self.policy = ResiliencePolicy(retries=2, sleep=self.sleeps.append,
+                                       random=lambda: 1.0)
+
+    def test_retry_reads(self):
+        attempts = Attempts(ReadTimeout(), ServerResponsedWithError('', 12))
+        timings = {}
+        self.assertEqual(self.policy.call('status.php', attempts, timings),
+                         'ok')
+        self.assertEqual(attempts.count, 3)
+        self.assertEqual(self.sleeps, [0.2, 0.4])
+        self.assertIn('retry', timings)
+
+        attempts = Attempts(*[ReadTimeout()] * 3)
+        self.assertRaises(ReadTimeout, self.policy.call, 'balance.php',
+                          attempts, {})
+        attempts = Attempts(ServerResponsedWithError('', 7))
+        self.assertRaises(ServerResponsedWithError, self.policy.call,
+                          'balance.php', attempts, {})
+        self.assertEqual(attempts.count, 1)
+
+    def test_sends_retried_only_when_not_sent(self):
+        attempts = Attempts(ReadTimeout())
+        self.assertRaises(ReadTimeout, self.policy.call, 'send.php',
+                          attempts, {})
+        self.assertEqual(attempts.count, 1)
+        attempts = Attempts(ConnectionError('reset by peer'))
+        self.assertRaises(ConnectionError, self.policy.call, 'send.php',
+                          attempts, {})
+        attempts = Attempts(ConnectTimeout())
+        self.assertEqual(self.policy.call('send.php', attempts, {}), 'ok')
+
+    def test_breaker(self):
+        now = [0]
+        self.policy.breaker = CircuitBreaker(
+            failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+        attempts = Attempts(*[ReadTimeout()] * 5)
+        self.assertRaises(CircuitOpenError, self.policy.call, 'status.php',
+                          attempts, {})
+        self.assertEqual(attempts.count, 2)
+        # ошибка сервера - сервер работает
+        now[0] = 10
+        attempts = Attempts(ServerResponsedWithError('', 7))
+        self.assertRaises(ServerResponsedWithError, self.policy.call,
+                          'balance.php', attempts, {})
+        self.assertEqual(self.policy.breaker.state, 'closed')
+
+    def test_hedge(self):
+        policy = ResiliencePolicy(hedge={'status.php': 0.01,
+                                         'send.php': 0.01})
+        self.assertEqual(list(policy.hedge), ['status.php'])
+        calls = []
+        release = threading.Event()
+
+        def attempt(timings):
+            calls.append(1)
+            if len(calls) == 1:
+                # первый запрос "завис"
+                release.wait(1)
+                return 'slow'
+            timings['network'] = 0.001
+            return 'fast'
+
+        timings = {}
+        started = time.time()
+        self.assertEqual(policy.call('status.php', attempt, timings), 'fast')
+        self.assertLess(time.time() - started, 0.5)
+        self.assertEqual(timings, {'network': 0.001})
+        release.set()
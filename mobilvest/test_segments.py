@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import unittest
+from decimal import Decimal
+from .segments import CostEstimator, InsufficientFunds, count_parts
+
+
+class FakeApi(object):
+
+    def __init__(self, money):
+        self.money = money
+        self.balance_calls = 0
+
+    def get_balance(self):
+        self.balance_calls += 1
+        return {'money': self.money, 'currency': 'RUR'}
+
+
+class TestsCountParts(unittest.TestCase):
+
+    def test_gsm7(self):
+        self.assertEqual(count_parts('a' * 160), ('gsm7', 160, 1))
+        self.assertEqual(count_parts('a' * 161), ('gsm7', 161, 2))
+        self.assertEqual(count_parts('a' * 306)[2], 2)
+        self.assertEqual(count_parts('a' * 307)[2], 3)
+
+    def test_extended_chars(self):
+        self.assertEqual(count_parts(u'{' * 80), ('gsm7', 160, 1))
+        self.assertEqual(count_parts(u'{' * 81)[2], 2)
+        # символ расширенной таблицы не разрывается между частями
+        self.assertEqual(count_parts(u'a' * 152 + u'€' + u'a' * 152)[2], 3)
+
+    def test_ucs2(self):
+        self.assertEqual(count_parts(u'П' * 70), ('ucs2', 70, 1))
+        self.assertEqual(count_parts(u'П' * 71), ('ucs2', 71, 2))
+        self.assertEqual(count_parts(u'Привет' * 12)[0], 'ucs2')
+        self.assertEqual(count_parts(u'П' * 134)[2], 2)
+        self.assertEqual(count_parts(u'П' * 135)[2], 3)
+        self.assertEqual(count_parts(u'Привет'.encode('utf-8'))[0], 'ucs2')
+
+    def test_empty(self):
+        self.assertEqual(count_parts(''), ('gsm7', 0, 0))
+
+
+class TestsCostEstimator(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.estimator = CostEstimator(clock=lambda: self.now)
+
+    def test_learn_price(self):
+        self.assertRaises(ValueError, self.estimator.estimate, 'text')
+        self.estimator.after_response('send.php', {}, None, {
+            '79029134225': {'error': '0', 'cost': '1.0', 'count_sms': '2'},
+            '79029134226': {'error': '0', 'cost': '0.6', 'count_sms': '1'},
+            '79029134227': {'error': '13'}}, {})
+        self.assertEqual(self.estimator.price, Decimal('0.6'))
+        self.assertEqual(self.estimator.estimate('a' * 200, 10),
+                         Decimal('12.0'))
+
+    def test_cached_balance(self):
+        api = FakeApi('10')
+        estimator = CostEstimator(price='0.5', clock=lambda: self.now)
+        self.assertEqual(estimator.balance(api), Decimal('10'))
+        estimator.learn({'79029134225': {'error': '0', 'cost': '1.5',
+                                         'count_sms': '3'}})
+        self.assertEqual(estimator.balance(api), Decimal('8.5'))
+        self.assertEqual(api.balance_calls, 1)
+
+        phones = [str(79000000000 + i) for i in range(20)]
+        affordable, rest = estimator.split(phones, 'hello', api)
+        self.assertEqual(len(affordable), 17)
+        self.assertEqual(rest, phones[17:])
+        self.assertRaises(InsufficientFunds,
+                          estimator.check, phones, 'hello', api)
+        self.assertEqual(estimator.check(phones[:10], 'hello', api),
+                         Decimal('5.0'))
+        self.assertEqual(api.balance_calls, 1)
+        self.now += estimator.balance_ttl
+        estimator.balance(api)
+        self.assertEqual(api.balance_calls, 2)
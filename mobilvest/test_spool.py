@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from .fakeserver import FakeMobilVestServer
+from .mobilvest import MobilVestApi, ServerResponsedWithError
+from .spool import Spool
+
+
+class FakeApi(object):
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def send_sms(self, phone, text, sender):
+        with self.lock:
+            self.calls.append((list(phone), text, sender))
+        if text == 'forbidden':
+            raise ServerResponsedWithError('forbidden', 11)
+        if text == 'timeout':
+            raise IOError('timeout')
+        return dict((p, {'error': '13'} if p.endswith('13') else
+                     {'error': '0', 'id_sms': 'id' + p, 'cost': '0.5',
+                      'count_sms': '1'}) for p in phone)
+
+
+class TestsSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'spool.sqlite')
+        self.spool = Spool(self.path)
+        self.api = FakeApi()
+
+    def tearDown(self):
+        self.spool.close()
+        shutil.rmtree(self.directory)
+
+    def test_idempotency(self):
+        self.assertTrue(self.spool.enqueue('79000000001', 'Hi', 'web',
+                                           key='a'))
+        self.assertFalse(self.spool.enqueue('79000000001', 'Hi', 'web',
+                                            key='a'))
+        self.assertEqual(self.spool.stats(), {'pending': 1})
+
+    def test_normalize_phones(self):
+        self.spool.enqueue_many([
+            ('+7 (902) 913-42-25', 'Hi', 'web', 'plus'),
+            ('8 902 913 42 26', 'Hi', 'web', 'eight'),
+            ('not-a-phone', 'Hi', 'web', 'bad')])
+        with FakeMobilVestServer(login='user', api_key='123') as server:
+            mapi = MobilVestApi('user', '123', normalize_phones=True)
+            mapi.BASE_URL = server.url
+            self.assertEqual(self.spool.drain(mapi),
+                             {'sent': 2, 'failed': 1})
+            mapi.close()
+        self.assertEqual(self.spool.get('plus')['state'], 'sent')
+        self.assertTrue(self.spool.get('plus')['id_sms'])
+        self.assertTrue(self.spool.get('eight')['id_sms'])
+        self.assertEqual(self.spool.get('bad')['error'], '16')
+
+    def test_drain_batches(self):
+        messages = [('7900000%04d' % i, 'Hi', 'web', 'k%d' % i)
+                    for i in range(120)]
+        messages += [('79000000001', 'Other', 'web', 'other')]
+        self.assertEqual(self.spool.enqueue_many(messages), 121)
+        stats = self.spool.drain(self.api, workers=3)
+        # номера, оканчивающиеся на 13, - в стоп-листе (i = 13 и 113)
+        self.assertEqual(stats, {'sent': 119, 'failed': 2})
+        self.assertEqual(len(self.api.calls), 4)
+        self.assertTrue(all(len(c[0]) <= 50 for c in self.api.calls))
+        self.assertEqual(self.spool.get('k1')['id_sms'], 'id79000000001')
+        self.assertEqual(self.spool.get('k13'),
+                         {'state': 'failed', 'id_sms': None, 'cost': None,
+                          'count_sms': None, 'error': '13'})
+
+    def test_duplicate_phone_goes_to_next_batch(self):
+        self.spool.enqueue('79000000001', 'Hi', 'web', key='1')
+        self.spool.enqueue('79000000001', 'Hi', 'web', key='2')
+        self.spool.drain(self.api, workers=1)
+        self.assertEqual(len(self.api.calls), 2)
+
+    def test_errors(self):
+        self.spool.enqueue('79000000001', 'forbidden', 'web', key='1')
+        self.spool.enqueue('79000000002', 'timeout', 'web', key='2')
+        self.spool.drain(self.api, workers=1)
+        self.assertEqual(self.spool.get('1')['state'], 'failed')
+        self.assertEqual(self.spool.get('1')['error'], '11')
+        self.assertEqual(self.spool.get('2')['state'], 'unknown')
+        self.assertEqual(self.spool.requeue_unknown(), 1)
+
+    def test_recover_after_crash(self):
+        self.spool.enqueue('79000000001', 'Hi', 'web', key='1')
+        self.spool.enqueue('79000000002', 'Hi', 'web', key='2')
+        self.spool._claim()
+        self.spool.close()
+        # перезапуск: прерванный пакет не отправляется повторно
+        self.spool = Spool(self.path)
+        self.spool.enqueue('79000000003', 'Hi', 'web', key='3')
+        self.assertEqual(self.spool.drain(self.api),
+                         {'unknown': 2, 'sent': 1})
+        self.assertEqual(self.api.calls, [(['79000000003'], 'Hi', 'web')])
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from .stats import MonthStatsCache, StatsColumns, months_between
+
+
+class TestsStats(unittest.TestCase):
+
+    def test_columns(self):
+        columns = StatsColumns.from_response({
+            "2014-08-06": {
+                "deliver": {"cost": "0.600", "parts": "1"},
+                "not_deliver": {"cost": "0.600", "parts": "2"}},
+            "2014-08-01": {
+                "deliver": {"cost": "0.500", "parts": "1"}}})
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(columns.date[0], datetime.date(2014, 8, 1))
+        self.assertAlmostEqual(columns.total_cost(), 1.7)
+        self.assertEqual(columns.total_parts(), 4)
+        by_status = columns.by_status()
+        self.assertAlmostEqual(by_status['deliver'][0], 1.1)
+        self.assertEqual(by_status['not_deliver'][1], 2)
+        self.assertEqual(list(columns.rows())[2][1], 'not_deliver')
+
+    def test_empty_response(self):
+        self.assertEqual(len(StatsColumns.from_response(None)), 0)
+
+    def test_months_between(self):
+        months = list(months_between(datetime.date(2013, 11, 15),
+                                     datetime.datetime(2014, 2, 1)))
+        self.assertEqual([m.strftime('%Y-%m') for m in months],
+                         ['2013-11', '2013-12', '2014-01', '2014-02'])
+
+    def test_cache(self):
+        cache = MonthStatsCache(settle_days=3)
+        august = datetime.date(2014, 8, 1)
+        self.assertFalse(cache.is_closed(august, datetime.date(2014, 9, 2)))
+        self.assertTrue(cache.is_closed(august, datetime.date(2014, 9, 4)))
+
+        directory = tempfile.mkdtemp()
+        try:
+            MonthStatsCache(directory).set(august, {"2014-08-01": {}})
+            self.assertEqual(MonthStatsCache(directory).get(august),
+                             (True, {"2014-08-01": {}}))
+            # незаписываемый ответ не портит сохранённый месяц
+            self.assertRaises(TypeError, MonthStatsCache(directory).set,
+                              august, {"2014-08-01": object()})
+            self.assertEqual(MonthStatsCache(directory).get(august),
+                             (True, {"2014-08-01": {}}))
+            self.assertEqual(os.listdir(directory),
+                             ['stat_by_month-2014-08.json'])
+        finally:
+            shutil.rmtree(directory)
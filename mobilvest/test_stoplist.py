@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import os
+import shutil
+import tempfile
+import unittest
+from .stoplist import StopList
+
+
+class TestsStopList(unittest.TestCase):
+
+    def test_membership(self):
+        stop_list = StopList(['79029134225'])
+        self.assertIn('79029134225', stop_list)
+        self.assertIn(79029134225, stop_list)
+        self.assertIn('+7 (902) 913-42-25', stop_list)
+        self.assertNotIn('79029134226', stop_list)
+        stop_list.discard('79029134225')
+        self.assertEqual(len(stop_list), 0)
+
+    def test_filter(self):
+        stop_list = StopList(['79029134225'])
+        self.assertEqual(stop_list.filter(['79029134225', '79029134226']),
+                         (['79029134226'], ['79029134225']))
+
+    def test_learn_send_result(self):
+        stop_list = StopList()
+        stop_list.learn_send_result({
+            "79029134225": {"error": "13"},
+            "79029134226": {"error": "0", "id_sms": "1"}})
+        self.assertIn('79029134225', stop_list)
+        self.assertNotIn('79029134226', stop_list)
+
+    def test_save_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'stop.txt')
+            StopList(['79029134225', '79029134226']).save(path)
+            stop_list = StopList.load(path)
+            self.assertEqual(len(stop_list), 2)
+            self.assertIn('79029134226', stop_list)
+        finally:
+            shutil.rmtree(directory)
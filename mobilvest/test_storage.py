@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from .storage import SqliteStorage
+
+
+class Storage(SqliteStorage):
+    SCHEMA = 'CREATE TABLE IF NOT EXISTS items (name TEXT PRIMARY KEY);'
+
+    def add(self, *names):
+        with self._transaction() as conn:
+            conn.executemany('INSERT INTO items VALUES (?)',
+                             [(name,) for name in names])
+
+    def add_first(self, *names):
+        with self._transaction('BEGIN IMMEDIATE') as conn:
+            for name in names:
+                conn.execute('INSERT INTO items VALUES (?)', (name,))
+                return name
+
+    def names(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                'SELECT name FROM items ORDER BY name')]
+
+
+class TestsSqliteStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'items.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_transaction(self):
+        with Storage(self.path) as storage:
+            storage.add('a', 'b')
+            # ошибка посреди транзакции откатывает её целиком
+            self.assertRaises(sqlite3.IntegrityError, storage.add, 'c', 'a')
+            self.assertEqual(storage.add_first('d', 'e'), 'd')
+            self.assertEqual(storage.names(), ['a', 'b', 'd'])
+        # соединение свободно: транзакции завершены
+        with Storage(self.path) as storage:
+            storage.add('c')
+            self.assertEqual(storage.names(), ['a', 'b', 'c', 'd'])
+
+
+if __name__ == '__main__':
+    unittest.main()
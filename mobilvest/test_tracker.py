@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import logging
+import unittest
+from .mobilvest import CantGetStatus
+from .tracker import StatusTracker
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeApi(object):
+    """ get_status отвечает по заранее заданному расписанию статусов """
+
+    def __init__(self, clock, ready_at):
+        self.clock = clock
+        self.ready_at = ready_at
+        self.calls = []
+        self.fail_calls = set()
+
+    def get_status(self, state):
+        self.calls.append(list(state))
+        if len(self.calls) in self.fail_calls:
+            raise IOError('connection reset')
+        ready = dict((i, self.ready_at[i][1]) for i in state
+                     if self.clock() >= self.ready_at[i][0])
+        if not ready:
+            raise CantGetStatus('Не получен статус')
+        return ready
+
+
+class TestsStatusTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def make_tracker(self, api, **kwargs):
+        return StatusTracker(api, clock=self.clock, sleep=self.clock.sleep,
+                             **kwargs)
+
+    def test_batches_and_results(self):
+        ready_at = dict(('id%d' % i, (1010, 'deliver')) for i in range(5))
+        api = FakeApi(self.clock, ready_at)
+        tracker = self.make_tracker(api, batch_size=3)
+        delivered = []
+        tracker.callback = lambda id_sms, status: delivered.append(id_sms)
+        for id_sms in ready_at:
+            tracker.register(id_sms)
+
+        results = dict(tracker.results())
+        self.assertEqual(sorted(results), sorted(ready_at))
+        self.assertEqual(set(results.values()), set(['deliver']))
+        self.assertEqual(sorted(delivered), sorted(ready_at))
+        self.assertEqual(len(tracker), 0)
+        # каждый опрос - не более 2 запросов на 5 сообщений
+        self.assertTrue(all(len(c) <= 3 for c in api.calls))
+        self.assertLessEqual(len(api.calls), 6)
+
+    def test_non_terminal_status_is_polled_again(self):
+        api = FakeApi(self.clock, {'id1': (1000, 'send')})
+        tracker = self.make_tracker(api)
+        tracker.register('id1')
+        self.clock.now += 5
+        self.assertEqual(tracker.poll(), [])
+        self.assertEqual(len(tracker), 1)
+        api.ready_at['id1'] = (1000, 'not_deliver')
+        self.clock.now = tracker.next_check()
+        self.assertEqual(tracker.poll(), [('id1', 'not_deliver')])
+
+    def test_backoff_grows_with_age(self):
+        api = FakeApi(self.clock, {'id1': (10 ** 6, 'deliver')})
+        tracker = self.make_tracker(api, min_interval=5, max_interval=60)
+        tracker.register('id1')
+        checks = []
+        for _ in range(6):
+            self.clock.now = tracker.next_check()
+            checks.append(self.clock.now)
+            tracker.poll()
+        intervals = [b - a for a, b in zip(checks, checks[1:])]
+        self.assertEqual(intervals, sorted(intervals))
+        self.assertLessEqual(max(intervals), 60)
+
+    def test_transient_failure(self):
+        ready_at = dict(('id%d' % i, (1000, 'deliver')) for i in range(5))
+        api = FakeApi(self.clock, ready_at)
+        tracker = self.make_tracker(api, batch_size=2)
+        for id_sms in sorted(ready_at):
+            tracker.register(id_sms)
+        self.clock.now += 5
+        # второй запрос оборвался: его пакет и следующий - снова в очереди
+        api.fail_calls = set([2])
+        self.assertRaises(IOError, tracker.poll)
+        self.assertEqual(len(tracker), 3)
+        self.assertEqual(tracker.next_check(), 1005)
+        # статусы первого пакета не теряются
+        self.assertEqual(sorted(tracker.poll()),
+                         sorted((i, 'deliver') for i in ready_at))
+        self.assertEqual(tracker.next_check(), None)
+
+    def test_failing_callback(self):
+        ready_at = dict(('id%d' % i, (1000, 'deliver')) for i in range(4))
+        api = FakeApi(self.clock, ready_at)
+        tracker = self.make_tracker(api)
+        called = []
+
+        def callback(id_sms, status):
+            called.append(id_sms)
+            raise ValueError(id_sms)
+
+        for id_sms in sorted(ready_at):
+            tracker.register(id_sms, callback if id_sms == 'id1' else None)
+        tracker.callback = lambda id_sms, status: called.append(id_sms)
+        logger = logging.getLogger('mobilvest.tracker')
+        logger.disabled = True
+        try:
+            results = list(tracker.results())
+        finally:
+            logger.disabled = False
+        self.assertEqual(sorted(results),
+                         sorted((i, 'deliver') for i in ready_at))
+        self.assertEqual(sorted(called), sorted(ready_at))
+        self.assertEqual(len(tracker), 0)
+
+    def test_max_age(self):
+        api = FakeApi(self.clock, {'id1': (10 ** 6, 'deliver'),
+                                   'id2': (10 ** 6, 'deliver')})
+        tracker = self.make_tracker(api, max_age=30)
+        tracker.register('id1')
+        self.assertEqual(list(tracker.results()), [('id1', None)])
+        # по умолчанию results() тоже завершается - через сутки
+        tracker = self.make_tracker(api)
+        tracker.register('id2')
+        self.assertEqual(list(tracker.results()), [('id2', None)])
+        self.assertGreaterEqual(self.clock.now, 1000 + 86400)
+
+    def test_register_send_result(self):
+        tracker = self.make_tracker(None)
+        tracker.register_send_result({
+            "79029134225": {"error": "0", "id_sms": "409211",
+                            "cost": "0.5", "count_sms": "1"},
+            "79029134226": {"error": "13"}})
+        self.assertEqual(len(tracker), 1)
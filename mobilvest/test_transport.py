@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import unittest
+import responses
+from .transport import HttpTransport
+
+
+class TestsHttpTransport(unittest.TestCase):
+
+    def test_pool_size(self):
+        transport = HttpTransport(pool_size=3)
+        adapter = transport.session.get_adapter('http://online.mobilvest.ru')
+        self.assertEqual(adapter._pool_maxsize, 3)
+        transport.close()
+
+    @responses.activate
+    def test_get(self):
+        responses.add(responses.GET,
+                      'http://online.mobilvest.ru/get/timestamp.php',
+                      body='1432359515')
+        with HttpTransport() as transport:
+            body = transport.get(
+                'http://online.mobilvest.ru/get/timestamp.php')
+            self.assertEqual(body, b'1432359515')
+        self.assertTrue(transport.closed)
+        self.assertRaises(RuntimeError, transport.get,
+                          'http://online.mobilvest.ru/get/timestamp.php')
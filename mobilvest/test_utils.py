@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# coding: UTF-8
+import threading
+import time
+import unittest
+from .utils import chunked, parallel_map, unique
+
+
+class TestsUtils(unittest.TestCase):
+
+    def test_unique(self):
+        self.assertEqual(list(unique(['1', 2, '2', '3', '1'])),
+                         ['1', 2, '3'])
+
+    def test_chunked(self):
+        self.assertEqual(list(chunked(range(5), 2)),
+                         [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked([], 2)), [])
+
+    def test_parallel_map_order(self):
+        def slow_square(x):
+            time.sleep(0.001 * (10 - x))
+            return x * x
+
+        result = list(parallel_map(slow_square, range(10), 4))
+        self.assertEqual(result, [x * x for x in range(10)])
+
+    def test_parallel_map_bounded(self):
+        """ Входной итератор не вычитывается дальше окна """
+        consumed = []
+        lock = threading.Lock()
+
+        def items():
+            for i in range(100):
+                with lock:
+                    consumed.append(i)
+                yield i
+
+        results = parallel_map(lambda x: x, items(), 2, window=3)
+        next(results)
+        self.assertLessEqual(len(consumed), 3)
+        results.close()
+
+    def test_parallel_map_exception(self):
+        def fail(x):
+            raise ValueError(x)
+
+        self.assertRaises(ValueError, list, parallel_map(fail, [1], 2))
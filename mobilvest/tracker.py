@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import heapq
+import logging
+import threading
+import time
+from .mobilvest import CantGetStatus
+
+logger = logging.getLogger(__name__)
+
+
+class StatusTracker(object):
+    """ Отслеживание статусов доставки отправленных СМС
+    Вместо опроса каждого id_sms отдельно трекер собирает
+    все сообщения, которым пора проверить статус, в пакеты и
+    запрашивает их одним вызовом get_status.
+    Интервал проверки растёт с возрастом сообщения:
+    interval = age * backoff, в пределах [min_interval, max_interval].
+    Ошибка 18 (CantGetStatus) означает, что статусы ещё не готовы:
+    весь пакет просто откладывается до следующей проверки.
+
+    api - MobilVestApi
+    batch_size - сколько id_sms запрашивать за один вызов get_status
+    callback - функция callback(id_sms, status), вызываемая при получении
+    окончательного статуса (можно задать и для отдельного сообщения);
+    исключение callback записывается в лог и не прерывает опрос
+    max_age - через сколько секунд перестать ждать окончательного статуса
+    (по умолчанию - сутки), в этом случае callback получает status=None;
+    с max_age=None сообщение без окончательного статуса опрашивается
+    бесконечно, и results() не завершается
+    """
+    TERMINAL_STATUSES = frozenset(['deliver', 'not_deliver', 'expired'])
+
+    def __init__(self, api, batch_size=100, min_interval=5,
+                 max_interval=600, backoff=0.5, max_age=86400,
+                 callback=None, clock=time.time, sleep=time.sleep):
+        self.api = api
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_age = max_age
+        self.callback = callback
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # очередь (время следующей проверки, id_sms)
+        self._queue = []
+        # id_sms -> (время регистрации, callback)
+        self._pending = {}
+        # окончательные статусы опроса, прерванного ошибкой: их вернёт
+        # следующий poll
+        self._finished = []
+
+    def __len__(self):
+        """ Количество сообщений, ожидающих окончательного статуса """
+        return len(self._pending)
+
+    def register(self, id_sms, callback=None, sent_at=None):
+        """ Добавление сообщения для отслеживания
+        sent_at - время отправки (по умолчанию - текущее)
+        """
+        if sent_at is None:
+            sent_at = self._clock()
+        id_sms = str(id_sms)
+        with self._lock:
+            self._pending[id_sms] = (sent_at, callback)
+            heapq.heappush(self._queue,
+                           (sent_at + self.min_interval, id_sms))
+
+    def register_send_result(self, response, callback=None):
+        """ Регистрация всех id_sms из ответа send_sms / send_bulk """
+        for item in (response or {}).values():
+            if isinstance(item, dict) and item.get('id_sms'):
+                self.register(item['id_sms'], callback)
+
+    def _interval(self, age):
+        return min(self.max_interval,
+                   max(self.min_interval, age * self.backoff))
+
+    def _reschedule(self, id_sms, now):
+        sent_at = self._pending[id_sms][0]
+        age = now - sent_at
+        if self.max_age is not None and age >= self.max_age:
+            return False
+        heapq.heappush(self._queue, (now + self._interval(age), id_sms))
+        return True
+
+    def _pop_due(self, now):
+        """ Извлечение из очереди сообщений, которым пора проверить
+        статус: список пар (время проверки, id_sms)
+        """
+        with self._lock:
+            due, seen = [], set()
+            while self._queue and self._queue[0][0] <= now:
+                check_at, id_sms = heapq.heappop(self._queue)
+                if id_sms in self._pending and id_sms not in seen:
+                    seen.add(id_sms)
+                    due.append((check_at, id_sms))
+            return due
+
+    def _push_back(self, due):
+        """ Возврат в очередь сообщений, проверка которых не состоялась """
+        with self._lock:
+            for item in due:
+                if item[1] in self._pending:
+                    heapq.heappush(self._queue, item)
+
+    def _finish(self, id_sms, status):
+        with self._lock:
+            callback = self._pending.pop(id_sms)[1] or self.callback
+        if callback is not None:
+            try:
+                callback(id_sms, status)
+            except Exception:
+                logger.exception('Status callback failed for %s', id_sms)
+        return id_sms, status
+
+    def poll(self):
+        """ Одна проверка всех сообщений, которым пора проверить статус
+        Возвращает список пар (id_sms, status) с окончательными статусами
+        При другой ошибке запроса (таймаут, обрыв связи) непроверенные
+        сообщения возвращаются в очередь, и исключение пробрасывается;
+        уже полученные статусы вернёт следующий вызов.
+        """
+        with self._lock:
+            finished, self._finished = self._finished, []
+        due = self._pop_due(self._clock())
+        for start in range(0, len(due), self.batch_size):
+            batch = [id_sms for _, id_sms in
+                     due[start:start + self.batch_size]]
+            try:
+                statuses = self.api.get_status(batch) or {}
+            except CantGetStatus:
+                statuses = {}
+            except Exception:
+                self._push_back(due[start:])
+                with self._lock:
+                    self._finished[:0] = finished
+                raise
+            now = self._clock()
+            for id_sms in batch:
+                status = statuses.get(id_sms)
+                if isinstance(status, dict):
+                    status = status.get('status')
+                if status in self.TERMINAL_STATUSES:
+                    finished.append(self._finish(id_sms, status))
+                    continue
+                with self._lock:
+                    rescheduled = self._reschedule(id_sms, now)
+                if not rescheduled:
+                    finished.append(self._finish(id_sms, None))
+        return finished
+
+    def next_check(self):
+        """ Время ближайшей проверки (None, если ждать нечего) """
+        with self._lock:
+            if self._finished:
+                return self._clock()
+            while self._queue and self._queue[0][1] not in self._pending:
+                heapq.heappop(self._queue)
+            if not self._queue:
+                return None
+            return self._queue[0][0]
+
+    def results(self):
+        """ Итератор по окончательным статусам (id_sms, status)
+        Опрашивает сервер, пока есть сообщения, ожидающие статуса,
+        и спит до времени ближайшей проверки
+        """
+        while True:
+            for item in self.poll():
+                yield item
+            next_check = self.next_check()
+            if next_check is None:
+                return
+            delay = next_check - self._clock()
+            if delay > 0:
+                self._sleep(delay)
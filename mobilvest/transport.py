@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HttpTransport(object):
+    """ HTTP-транспорт поверх requests.Session
+    Соединения с сервером переиспользуются (keep-alive) и берутся
+    из общего пула, поэтому один транспорт можно использовать
+    из нескольких потоков одновременно.
+    pool_size - максимальное число одновременно открытых соединений
+    timeout - таймаут запроса по умолчанию, в секундах
+    pool_block - ждать освобождения соединения, а не открывать новое,
+    если пул исчерпан
+    """
+
+    def __init__(self, pool_size=10, timeout=30, pool_block=True):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size,
+                              pool_block=pool_block)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        """ GET-запрос, возвращает тело ответа (bytes)
+        timeout - таймаут только для этого запроса
+        """
+        if self.closed:
+            raise RuntimeError('Transport is closed')
+        if timeout is None:
+            timeout = self.timeout
+        response = self.session.get(url, params=params, timeout=timeout)
+        return response.content
+
+    def close(self):
+        with self._lock:
+            if not self.closed:
+                self.closed = True
+                self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# coding: UTF-8
+
+import json
+from collections import deque
+from itertools import islice
+from multiprocessing.pool import ThreadPool
+
+# самый быстрый из установленных JSON-декодеров; все они возвращают
+# те же словари и строки, что и json.loads
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    try:
+        from ujson import loads as json_loads
+    except ImportError:
+        json_loads = json.loads
+
+
+def unique(items, key=str):
+    """ Элементы итератора без повторов, в исходном порядке """
+    seen = set()
+    for item in items:
+        k = key(item)
+        if k not in seen:
+            seen.add(k)
+            yield item
+
+
+def chunked(items, size):
+    """ Разбиение итератора на списки длиной не более size """
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parallel_map(func, items, concurrency, window=None):
+    """ Аналог map, выполняющий func в пуле из concurrency потоков
+    Результаты возвращаются в порядке входных данных.
+    Одновременно в работе не более window элементов (по умолчанию -
+    удвоенное число потоков), поэтому items может быть сколь угодно
+    длинным итератором: память не растёт вместе с ним.
+    Исключение из func пробрасывается при получении её результата.
+    """
+    if window is None:
+        window = concurrency * 2
+    window = max(window, 1)
+    pool = ThreadPool(concurrency)
+    try:
+        pending = deque()
+        for item in items:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= window:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
@@ -16,6 +16,8 @@ setup(
     packages=['mobilvest'],
     include_package_data=True,
     install_requires=['setuptools', 'requests'],
+    extras_require={'async': ['aiohttp']},
+    entry_points={'console_scripts': ['mobilvest = mobilvest.cli:main']},
     test_requires=['responses'],
     zip_safe=False,
     classifiers=[
@@ -24,5 +26,7 @@ setup(
         'License :: OSI Approved :: BSD License',
         'Operating System :: OS Independent',
         'Programming Language :: Python',
+        'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
     ],
 )